@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AdminManagementConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "admin_management"
+
+    def ready(self):
+        # Keeps the admin search index in sync
+        from . import search  # noqa: F401
@@ -0,0 +1,106 @@
+"""
+Bulk poll import. The whole batch is validated first, then polls and options
+go in with one bulk_create each inside a single transaction, so seeding
+thousands of polls costs a handful of queries instead of one per row.
+"""
+import json
+import time
+
+from django.db import transaction
+
+from polls.counters import record_polls
+from polls.models import Poll, PollOption
+from polls.stamps import POLLS, touch_on_commit
+from .search import index_polls
+from .serializers import PollImportSerializer
+
+BATCH_SIZE = 500
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def parse_records(text):
+    """Records from a JSON array, a {"polls": [...]} object or NDJSON"""
+    text = text.strip()
+    if not text:
+        return []
+    if text[0] in '[{':
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            data = None  # several objects, one per line
+        else:
+            if isinstance(data, dict):
+                data = data.get('polls', [data])
+            if not isinstance(data, list):
+                raise ImportFormatError("Expected a list of polls")
+            return data
+
+    records = []
+    for number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            raise ImportFormatError(f"Line {number}: {e.msg}")
+    return records
+
+
+def _option_text(option):
+    return option.get('option_text') if isinstance(option, dict) else option
+
+
+def validate_records(records):
+    """Return (validated data, per-record errors)"""
+    valid, errors = [], []
+    for index, record in enumerate(records):
+        if isinstance(record, dict) and isinstance(record.get('options'), list):
+            record = {**record, 'options': [_option_text(o) for o in record['options']]}
+        serializer = PollImportSerializer(data=record)
+        if serializer.is_valid():
+            valid.append(serializer.validated_data)
+        else:
+            errors.append({"index": index, "errors": serializer.errors})
+    return valid, errors
+
+
+def import_polls(records, created_by):
+    """
+    Validate and insert `records`. Nothing is written if any record is invalid.
+    Returns a report with the counts, per-record errors and throughput.
+    """
+    started = time.perf_counter()
+    valid, errors = validate_records(records)
+    report = {"received": len(records), "created": 0, "options_created": 0, "errors": errors}
+
+    if not errors and valid:
+        with transaction.atomic():
+            polls = Poll.objects.bulk_create(
+                [
+                    Poll(created_by=created_by, **{k: v for k, v in data.items() if k != 'options'})
+                    for data in valid
+                ],
+                batch_size=BATCH_SIZE,
+            )
+            options = PollOption.objects.bulk_create(
+                [
+                    PollOption(poll=poll, option_text=text)
+                    for poll, data in zip(polls, valid)
+                    for text in data['options']
+                ],
+                batch_size=BATCH_SIZE,
+            )
+            # bulk_create skips post_save, so the search index, list stamp and
+            # the creator's poll count are updated here
+            index_polls([poll.id for poll in polls])
+            record_polls(polls)
+            touch_on_commit(POLLS)
+        report.update(created=len(polls), options_created=len(options))
+
+    elapsed = time.perf_counter() - started
+    report["seconds"] = round(elapsed, 3)
+    report["polls_per_second"] = round(report["created"] / elapsed, 1) if elapsed else None
+    return report
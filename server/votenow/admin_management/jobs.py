@@ -0,0 +1,161 @@
+"""
+Background bulk deletes for users and polls.
+
+Deleting a popular poll through the ORM makes the cascade collector load
+every vote into memory first. Jobs instead delete the votes in chunks of
+DELETE_JOB_CHUNK_SIZE ids, one transaction per chunk, and only delete the
+parent rows once their votes are gone, so memory stays flat and progress is
+visible on the DeletionJob row while the job runs.
+
+Workers are threads of the web process, so a restart or crash leaves their
+job pending or running forever. Every chunk stamps heartbeat_at; a job that
+shows no progress for DELETE_JOB_STALE_AFTER seconds is reported as failed,
+and `manage.py resume_deletion_jobs` runs failed and stale jobs again. That
+is safe because every step only deletes what is still there.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from users.models import User
+from polls.cache import invalidate_results
+from polls.counters import discard_voters, discard_votes
+from polls.models import Poll, Vote
+from .models import DeletionJob
+
+logger = logging.getLogger(__name__)
+
+
+INTERRUPTED = "Interrupted, no progress for {} seconds. Run manage.py resume_deletion_jobs to finish it."
+
+
+def get_chunk_size():
+    return getattr(settings, 'DELETE_JOB_CHUNK_SIZE', 1000)
+
+
+def get_stale_after():
+    return getattr(settings, 'DELETE_JOB_STALE_AFTER', 300)
+
+
+def stale_jobs():
+    """Pending or running jobs whose worker has not shown progress in time"""
+    cutoff = timezone.now() - timedelta(seconds=get_stale_after())
+    return DeletionJob.objects.filter(status__in=[DeletionJob.PENDING, DeletionJob.RUNNING]).alias(
+        last_seen=Coalesce('heartbeat_at', 'created_at')
+    ).filter(last_seen__lt=cutoff)
+
+
+def fail_stale_jobs(jobs=None):
+    """Mark stale jobs (of the `jobs` queryset, or all) as failed, returns how many"""
+    stale = stale_jobs()
+    if jobs is not None:
+        stale = stale.filter(id__in=jobs.values('id'))
+    return stale.update(
+        status=DeletionJob.FAILED, error=INTERRUPTED.format(get_stale_after()), finished_at=timezone.now()
+    )
+
+
+def resumable_jobs():
+    """Failed jobs and stale ones, oldest first"""
+    fail_stale_jobs()
+    return DeletionJob.objects.filter(status=DeletionJob.FAILED).order_by('id')
+
+
+def enqueue(kind, ids, requested_by=None):
+    """Record a deletion job and start it once the surrounding transaction commits"""
+    job = DeletionJob.objects.create(kind=kind, target_ids=sorted(set(ids)), requested_by=requested_by)
+    transaction.on_commit(lambda: start_worker(job.id))
+    return job
+
+
+def start_worker(job_id):
+    threading.Thread(target=_run_and_close, args=(job_id,), name=f'deletion-job-{job_id}', daemon=True).start()
+
+
+def _run_and_close(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        connection.close()
+
+
+def _delete_votes_in_chunks(job, votes, keep_counters):
+    """
+    Delete `votes` a chunk at a time. With keep_counters the option/poll
+    counters and rollups are decremented first (not needed when the polls
+    themselves are about to go), the voters' counters always are.
+    """
+    chunk_size = get_chunk_size()
+    while True:
+        chunk = list(votes.order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not chunk:
+            return
+        with transaction.atomic():
+            batch = Vote.objects.filter(id__in=chunk)
+            if keep_counters:
+                discard_votes(batch)
+            else:
+                discard_voters(batch)
+            # Nothing hangs off Vote, so this is a single DELETE ... WHERE id IN
+            deleted = batch.delete()[0]
+            DeletionJob.objects.filter(id=job.id).update(
+                votes_deleted=F('votes_deleted') + deleted, heartbeat_at=timezone.now()
+            )
+
+
+def _delete_polls(job, poll_ids):
+    # Stop new votes from coming in while the old ones are removed
+    Poll.objects.filter(id__in=poll_ids).update(active=False)
+    _delete_votes_in_chunks(job, Vote.objects.filter(poll_id__in=poll_ids), keep_counters=False)
+    # The remaining cascade (options, rollups, banner) is small now
+    deleted = 0
+    for poll in Poll.objects.filter(id__in=poll_ids):
+        poll.delete()
+        invalidate_results(poll.id)
+        deleted += 1
+    return deleted
+
+
+def _delete_users(job, user_ids):
+    _delete_polls(job, list(Poll.objects.filter(created_by_id__in=user_ids).values_list('id', flat=True)))
+    # Their votes on other people's polls, those polls keep their counters right
+    _delete_votes_in_chunks(job, Vote.objects.filter(voted_by_id__in=user_ids), keep_counters=True)
+    return User.objects.filter(id__in=user_ids).delete()[1].get(User._meta.label, 0)
+
+
+def count_votes(kind, ids):
+    if kind == DeletionJob.POLLS:
+        return Vote.objects.filter(poll_id__in=ids).count()
+    return Vote.objects.filter(poll__created_by_id__in=ids).count() + Vote.objects.filter(
+        voted_by_id__in=ids
+    ).exclude(poll__created_by_id__in=ids).count()
+
+
+def run_job(job_id):
+    job = DeletionJob.objects.get(id=job_id)
+    ids = job.target_ids
+    # votes_deleted carries over when a failed or interrupted job is resumed
+    DeletionJob.objects.filter(id=job.id).update(
+        status=DeletionJob.RUNNING, votes_total=F('votes_deleted') + count_votes(job.kind, ids),
+        error='', finished_at=None, heartbeat_at=timezone.now(),
+    )
+    try:
+        if job.kind == DeletionJob.POLLS:
+            deleted = _delete_polls(job, ids)
+        else:
+            deleted = _delete_users(job, ids)
+    except Exception as e:
+        logger.exception("Deletion job %s failed", job.id)
+        DeletionJob.objects.filter(id=job.id).update(
+            status=DeletionJob.FAILED, error=str(e), finished_at=timezone.now()
+        )
+        return
+    DeletionJob.objects.filter(id=job.id).update(
+        status=DeletionJob.DONE, objects_deleted=deleted, finished_at=timezone.now()
+    )
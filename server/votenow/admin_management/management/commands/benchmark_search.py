@@ -0,0 +1,75 @@
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from admin_management.search import fts_available, index_users, search
+from users.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare admin user search latency of the FTS5 index against icontains. "
+        "Synthetic users are written inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            self.stderr.write("FTS5 search tables are not available on this database")
+            return
+        try:
+            with transaction.atomic():
+                self.run(options['users'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, n, repeat):
+        rng = random.Random(42)
+
+        def word():
+            return ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 9)))
+
+        start = time.perf_counter()
+        for offset in range(0, n, 10000):
+            User.objects.bulk_create(
+                User(username=f"bench{offset + i}_{word()}", email=f"{word()}@{word()}.com",
+                     first_name=word().title(), last_name=word().title(), password='!')
+                for i in range(min(10000, n - offset))
+            )
+        # bulk_create skips signals, index explicitly like any other bulk writer would
+        index_users(User.objects.filter(username__startswith='bench').values_list('id', flat=True))
+        self.stdout.write(f"Loaded and indexed {n:,} users in {time.perf_counter() - start:.1f}s")
+
+        probe = User.objects.filter(username__startswith='bench').order_by('?').first()
+        terms = [probe.last_name, probe.first_name[:4], probe.email.split('@')[0], 'zzzzq']
+
+        self.stdout.write(f"{'term':>12} {'hits':>8} {'icontains ms':>14} {'fts ms':>10}")
+        base = User.objects.order_by('-date_joined')
+        for term in terms:
+            slow = base.filter(Q(username__icontains=term) | Q(email__icontains=term) |
+                               Q(first_name__icontains=term) | Q(last_name__icontains=term))
+            fast = search(base, term, []).order_by('search_rank', '-id')
+            timings = {}
+            for label, qs in (('icontains', slow), ('fts', fast)):
+                best = float('inf')
+                for _ in range(repeat):
+                    t = time.perf_counter()
+                    hits = qs.count()
+                    list(qs[:10])
+                    best = min(best, time.perf_counter() - t)
+                timings[label] = (best * 1000, hits)
+            self.stdout.write(
+                f"{term:>12} {timings['fts'][1]:>8} {timings['icontains'][0]:>14.1f} {timings['fts'][0]:>10.1f}"
+            )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import User
+from admin_management.importer import ImportFormatError, import_polls, parse_records
+
+
+class Command(BaseCommand):
+    help = "Import polls with their options from a JSON or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File with a JSON array of polls or one poll per line")
+        parser.add_argument('--created-by', required=True, help="Username the polls are created by")
+
+    def handle(self, *args, **options):
+        try:
+            created_by = User.objects.get(username=options['created_by'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['created_by']}")
+
+        try:
+            with open(options['path'], encoding='utf-8') as f:
+                records = parse_records(f.read())
+        except (OSError, ImportFormatError) as e:
+            raise CommandError(str(e))
+
+        report = import_polls(records, created_by=created_by)
+        for error in report['errors']:
+            self.stderr.write(f"record {error['index']}: {error['errors']}")
+        if report['errors']:
+            raise CommandError(f"{len(report['errors'])} invalid record(s), nothing imported")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['created']} polls ({report['options_created']} options) "
+            f"in {report['seconds']}s, {report['polls_per_second']} polls/s"
+        ))
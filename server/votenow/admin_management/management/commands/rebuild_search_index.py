@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from admin_management.search import fts_available, index_polls, index_users
+
+
+class Command(BaseCommand):
+    help = "Rebuild the SQLite FTS5 index behind admin user/poll search"
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            raise CommandError("Full-text search tables are not available on this database")
+        with transaction.atomic():
+            index_users()
+            index_polls()
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt"))
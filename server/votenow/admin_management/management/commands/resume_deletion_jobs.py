@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from admin_management.jobs import resumable_jobs, run_job
+from admin_management.models import DeletionJob
+
+
+class Command(BaseCommand):
+    help = (
+        "Run failed bulk delete jobs, and pending/running ones whose worker stopped "
+        "making progress (e.g. the server restarted), to the end in this process"
+    )
+
+    def handle(self, *args, **options):
+        jobs = list(resumable_jobs())
+        if not jobs:
+            self.stdout.write("No deletion jobs to resume")
+            return
+        for job in jobs:
+            self.stdout.write(f"Resuming job {job.id}: {job}")
+            run_job(job.id)
+            job.refresh_from_db()
+            if job.status == DeletionJob.DONE:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Job {job.id} done, {job.objects_deleted} {job.kind} and {job.votes_deleted} votes deleted"
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f"Job {job.id} failed again: {job.error}"))
@@ -0,0 +1,43 @@
+from django.db import migrations
+
+# FTS5 mirrors of users and polls for admin search, see admin_management/search.py.
+# Only created on SQLite, other backends use the icontains fallback.
+TABLES = {
+    "search_user_fts": ("users_user", ("username", "email", "first_name", "last_name")),
+    "search_poll_fts": ("polls_poll", ("title", "description")),
+}
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table, (source, fields) in TABLES.items():
+            columns = ", ".join(fields)
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} "
+                f"USING fts5({columns}, tokenize='unicode61')"
+            )
+            cursor.execute(
+                f"INSERT INTO {table} (rowid, {columns}) SELECT id, {columns} FROM {source}"
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_admin_list_indexes"),
+        ("polls", "0006_vote_log_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,3 +1,32 @@
 from django.db import models
 
-# Create your models here.
+from users.models import User
+
+
+class DeletionJob(models.Model):
+    """A bulk delete running in the background, see admin_management.jobs"""
+    USERS = 'users'
+    POLLS = 'polls'
+    KIND_CHOICES = [(USERS, 'Users'), (POLLS, 'Polls')]
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    target_ids = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    votes_total = models.PositiveIntegerField(default=0)
+    votes_deleted = models.PositiveIntegerField(default=0)
+    objects_deleted = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(User, null=True, on_delete=models.SET_NULL, related_name='deletion_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Last sign of life of the worker, see jobs.stale_jobs()
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Delete {len(self.target_ids)} {self.kind} ({self.status})"
@@ -0,0 +1,134 @@
+"""
+Full-text search for the admin user and poll lists.
+
+On SQLite, users and polls are mirrored into FTS5 virtual tables (created by
+migrations/0001_search_index.py) and kept in sync by the signal receivers below.
+Searches are prefix matches on every word of the query, ranked with bm25.
+Other backends, or a SQLite build without FTS5, fall back to icontains.
+
+Writes that skip signals (bulk_create, queryset.update of indexed fields)
+must call index_users/index_polls themselves; `manage.py rebuild_search_index`
+rebuilds everything.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.models import User
+from polls.models import Poll
+
+USER_FIELDS = ('username', 'email', 'first_name', 'last_name')
+POLL_FIELDS = ('title', 'description')
+
+INDEXES = {
+    User: ('search_user_fts', USER_FIELDS),
+    Poll: ('search_poll_fts', POLL_FIELDS),
+}
+
+_available = None
+
+
+def fts_available():
+    """True when the FTS tables exist on the current database"""
+    global _available
+    if _available is None:
+        if connection.vendor != 'sqlite':
+            _available = False
+        else:
+            tables = set(connection.introspection.table_names())
+            _available = all(table in tables for table, _ in INDEXES.values())
+    return _available
+
+
+def _index(model, ids=None):
+    table, fields = INDEXES[model]
+    columns = ', '.join(fields)
+    with connection.cursor() as cursor:
+        if ids is None:
+            cursor.execute(f"DELETE FROM {table}")
+            cursor.execute(
+                f"INSERT INTO {table} (rowid, {columns}) SELECT id, {columns} FROM {model._meta.db_table}"
+            )
+            return
+        ids = list(ids)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            marks = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM {table} WHERE rowid IN ({marks})", chunk)
+            cursor.execute(
+                f"INSERT INTO {table} (rowid, {columns}) "
+                f"SELECT id, {columns} FROM {model._meta.db_table} WHERE id IN ({marks})",
+                chunk,
+            )
+
+
+def index_users(ids=None):
+    """(Re)index the given user ids, or every user"""
+    if fts_available():
+        _index(User, ids)
+
+
+def index_polls(ids=None):
+    """(Re)index the given poll ids, or every poll"""
+    if fts_available():
+        _index(Poll, ids)
+
+
+def to_match_query(text):
+    """Turn free text into an FTS5 query: every word must match as a prefix"""
+    words = re.findall(r'\w+', text)
+    return ' '.join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+
+def search(queryset, text, fallback_fields):
+    """
+    Filter `queryset` down to rows matching `text`. With FTS the rows carry a
+    `search_rank` (lower is better) to order by relevance.
+    """
+    model = queryset.model
+    match = to_match_query(text)
+    if not fts_available() or not match:
+        condition = Q()
+        for field in fallback_fields:
+            condition |= Q(**{f"{field}__icontains": text})
+        return queryset.filter(condition)
+
+    table, _ = INDEXES[model]
+    db_table = model._meta.db_table
+    # A plain join against the FTS table keeps it to one MATCH per query
+    return queryset.extra(
+        tables=[table],
+        where=[f"{table}.rowid = {db_table}.id", f"{table} MATCH %s"],
+        params=[match],
+        select={'search_rank': f"{table}.rank"},
+    )
+
+
+# ==================== SYNC ====================
+def _touches_index(fields, update_fields):
+    return update_fields is None or bool(set(update_fields) & set(fields))
+
+
+@receiver(post_save, sender=User, dispatch_uid='search-index-user-save')
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    # Logins save last_login only, no need to reindex for that
+    if _touches_index(USER_FIELDS, update_fields):
+        index_users([instance.pk])
+
+
+@receiver(post_save, sender=Poll, dispatch_uid='search-index-poll-save')
+def poll_saved(sender, instance, update_fields=None, **kwargs):
+    if _touches_index(POLL_FIELDS, update_fields):
+        index_polls([instance.pk])
+
+
+@receiver(post_delete, sender=User, dispatch_uid='search-index-user-delete')
+@receiver(post_delete, sender=Poll, dispatch_uid='search-index-poll-delete')
+def row_deleted(sender, instance, **kwargs):
+    if fts_available():
+        table, _ = INDEXES[sender]
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {table} WHERE rowid = %s", [instance.pk])
@@ -1,25 +1,20 @@
 from rest_framework import serializers
 from users.models import User
 from polls.models import Poll, PollOption, Vote
+from polls.cache import invalidate_results
+from polls.options import reconcile_options
 from banners.models import Banner
+from banners.variants import srcset
+from .models import DeletionJob
 
 
 # ==================== USER MANAGEMENT ====================
 class AdminUserListSerializer(serializers.ModelSerializer):
     """Serializer for listing users in admin panel"""
-    total_votes = serializers.SerializerMethodField()
-    polls_created = serializers.SerializerMethodField()
-    
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'role', 'is_active', 'date_joined', 
                   'last_login', 'total_votes', 'polls_created']
-    
-    def get_total_votes(self, obj):
-        return obj.votes.count()
-    
-    def get_polls_created(self, obj):
-        return obj.created_polls.count()
 
 
 class AdminUserDetailSerializer(serializers.ModelSerializer):
@@ -45,39 +40,28 @@ class AdminUserUpdateSerializer(serializers.ModelSerializer):
 
 # ==================== POLL MANAGEMENT ====================
 class AdminPollOptionSerializer(serializers.ModelSerializer):
-    votes_count = serializers.SerializerMethodField()
-    
     class Meta:
         model = PollOption
         fields = ['id', 'option_text', 'votes_count']
-    
-    def get_votes_count(self, obj):
-        return obj.votes.count()
+        read_only_fields = ['votes_count']
 
 
 class AdminPollListSerializer(serializers.ModelSerializer):
-    """List view for polls with basic stats"""
+    """List view for polls with basic stats (options_count is annotated by the view)"""
     created_by_username = serializers.CharField(source='created_by.username', read_only=True)
-    total_votes = serializers.SerializerMethodField()
-    options_count = serializers.SerializerMethodField()
+    options_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Poll
         fields = ['id', 'title', 'category', 'active', 'created_by_username', 
                   'created_at', 'total_votes', 'options_count']
-    
-    def get_total_votes(self, obj):
-        return obj.votes.count()
-    
-    def get_options_count(self, obj):
-        return obj.options.count()
+        read_only_fields = ['total_votes']
 
 
 class AdminPollDetailSerializer(serializers.ModelSerializer):
     """Detailed poll info with options"""
     options = AdminPollOptionSerializer(many=True, read_only=True)
     created_by_username = serializers.CharField(source='created_by.username', read_only=True)
-    total_votes = serializers.SerializerMethodField()
     winner_text = serializers.SerializerMethodField()
     
     class Meta:
@@ -85,10 +69,7 @@ class AdminPollDetailSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'description', 'category', 'active', 
                   'created_by', 'created_by_username', 'created_at', 
                   'winner', 'winner_text', 'options', 'total_votes']
-        read_only_fields = ['created_at']
-    
-    def get_total_votes(self, obj):
-        return obj.votes.count()
+        read_only_fields = ['created_at', 'total_votes']
     
     def get_winner_text(self, obj):
         return obj.winner.option_text if obj.winner else None
@@ -114,26 +95,39 @@ class AdminPollUpdateSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
         instance.save()
         
-        # Update options if provided
+        # Update options if provided, matched by text so unchanged ones keep their votes
         if options_data is not None:
-            # Delete existing options
-            instance.options.all().delete()
-            # Create new options
-            for option_text in options_data:
-                PollOption.objects.create(poll=instance, option_text=option_text)
+            reconcile_options(instance, [{'option_text': text} for text in options_data])
         
+        invalidate_results(instance.id)
         return instance
 
 
+class PollImportSerializer(serializers.ModelSerializer):
+    """One record of a bulk poll import, options given as plain labels"""
+    options = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        allow_empty=False
+    )
+    
+    class Meta:
+        model = Poll
+        fields = ['title', 'description', 'category', 'active', 'options']
+
+
 # ==================== BANNER MANAGEMENT ====================
 class AdminBannerListSerializer(serializers.ModelSerializer):
     poll_title = serializers.CharField(source='poll.title', read_only=True)
     poll_active = serializers.BooleanField(source='poll.active', read_only=True)
+    srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Banner
         fields = ['id', 'title', 'poll', 'poll_title', 'poll_active', 
-                  'image', 'created_at']
+                  'image', 'srcset', 'created_at']
+    
+    def get_srcset(self, obj):
+        return srcset(obj.image, self.context.get('request'))
 
 
 class AdminBannerDetailSerializer(serializers.ModelSerializer):
@@ -170,4 +164,11 @@ class BulkDeleteSerializer(serializers.Serializer):
     ids = serializers.ListField(
         child=serializers.IntegerField(),
         min_length=1
-    )
\ No newline at end of file
+    )
+
+class DeletionJobSerializer(serializers.ModelSerializer):
+    """Progress of a background bulk delete"""
+    class Meta:
+        model = DeletionJob
+        fields = ['id', 'kind', 'target_ids', 'status', 'votes_total', 'votes_deleted',
+                  'objects_deleted', 'error', 'created_at', 'finished_at']
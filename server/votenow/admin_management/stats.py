@@ -0,0 +1,77 @@
+"""
+Admin overview stats, served from a short-lived snapshot.
+
+The numbers come from one conditional aggregate per table. The snapshot lives
+in Django's cache so every worker shares it. Once it is older than
+ADMIN_STATS_TTL it is still served while a background thread refreshes it, up
+to ADMIN_STATS_MAX_STALE seconds, after which the request computes it inline.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Q, Sum
+
+from users.models import User
+from polls.models import Poll
+from banners.models import Banner
+
+SNAPSHOT_KEY = 'admin-stats:snapshot'
+REFRESH_LOCK_KEY = 'admin-stats:refreshing'
+
+
+def get_ttl():
+    return getattr(settings, 'ADMIN_STATS_TTL', 10)
+
+
+def get_max_stale():
+    return getattr(settings, 'ADMIN_STATS_MAX_STALE', 120)
+
+
+def compute_stats():
+    users = User.objects.aggregate(
+        total_users=Count('id'),
+        admin_users=Count('id', filter=Q(role='admin')),
+        regular_users=Count('id', filter=Q(role='user')),
+    )
+    polls = Poll.objects.aggregate(
+        total_polls=Count('id'),
+        active_polls=Count('id', filter=Q(active=True)),
+        inactive_polls=Count('id', filter=Q(active=False)),
+        # Sum of the denormalized counters instead of counting the vote table
+        total_votes=Sum('total_votes'),
+    )
+    polls['total_votes'] = polls['total_votes'] or 0
+    return {**users, **polls, "total_banners": Banner.objects.count()}
+
+
+def refresh_snapshot():
+    snapshot = {"stats": compute_stats(), "generated_at": time.time()}
+    cache.set(SNAPSHOT_KEY, snapshot, timeout=get_max_stale())
+    return snapshot
+
+
+def _refresh_and_release():
+    try:
+        refresh_snapshot()
+    finally:
+        cache.delete(REFRESH_LOCK_KEY)
+        connection.close()
+
+
+def refresh_in_background():
+    # Only one refresh at a time across workers sharing the cache
+    if cache.add(REFRESH_LOCK_KEY, True, timeout=30):
+        threading.Thread(target=_refresh_and_release, name='admin-stats-refresh', daemon=True).start()
+
+
+def get_snapshot(fresh=False):
+    """Return (stats, age in seconds)"""
+    snapshot = None if fresh else cache.get(SNAPSHOT_KEY)
+    if snapshot is None:
+        snapshot = refresh_snapshot()
+    elif time.time() - snapshot["generated_at"] > get_ttl():
+        refresh_in_background()
+    return snapshot["stats"], max(time.time() - snapshot["generated_at"], 0)
@@ -1,3 +1,444 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from users.models import User
+from polls.counters import record_polls, record_votes
+from polls.models import Poll, PollOption, Vote
+from .stats import SNAPSHOT_KEY
+from .search import fts_available
+from . import jobs
+from .jobs import run_job
+from .models import DeletionJob
+
+
+class AdminStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        User.objects.create_user(username='voter', password='pass', role='user')
+        Poll.objects.create(title='Open', description='', category='misc', created_by=self.admin, total_votes=4)
+        Poll.objects.create(title='Closed', description='', category='misc', created_by=self.admin, active=False)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.url = reverse('admin-stats')
+
+    def test_one_query_per_table(self):
+        # users, polls (with the vote total), banners
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['total_users'], 2)
+        self.assertEqual(response.data['admin_users'], 1)
+        self.assertEqual(response.data['regular_users'], 1)
+        self.assertEqual(response.data['active_polls'], 1)
+        self.assertEqual(response.data['inactive_polls'], 1)
+        self.assertEqual(response.data['total_votes'], 4)
+
+    def test_snapshot_is_reused(self):
+        self.client.get(self.url)
+        User.objects.create_user(username='late', password='pass', role='user')
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['total_users'], 2)
+        self.assertIn('snapshot_age_seconds', response.data)
+
+        response = self.client.get(self.url, {'fresh': 1})
+        self.assertEqual(response.data['total_users'], 3)
+
+    def test_stale_snapshot_refreshes_in_background(self):
+        self.client.get(self.url)
+        snapshot = cache.get(SNAPSHOT_KEY)
+        snapshot['generated_at'] = time.time() - 60
+        cache.set(SNAPSHOT_KEY, snapshot)
+
+        with mock.patch('admin_management.stats.refresh_in_background') as refresh:
+            response = self.client.get(self.url)
+        refresh.assert_called_once()
+        self.assertGreaterEqual(response.data['snapshot_age_seconds'], 60)
+        self.assertEqual(response['Age'], '60')
+
+
+class AdminListQueryBudgetTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+        users = User.objects.bulk_create(User(username=f'user{i}', role='user') for i in range(150))
+        polls = Poll.objects.bulk_create(
+            Poll(title=f'Poll {i}', description='', category='misc', created_by=self.admin) for i in range(120)
+        )
+        options = PollOption.objects.bulk_create(
+            PollOption(poll=poll, option_text=text) for poll in polls for text in ('Yes', 'No')
+        )
+        # user5 votes on three polls, user9 on one
+        record_votes(Vote.objects.bulk_create([
+            Vote(poll=polls[0], option=options[0], voted_by=users[5]),
+            Vote(poll=polls[1], option=options[2], voted_by=users[5]),
+            Vote(poll=polls[2], option=options[4], voted_by=users[5]),
+            Vote(poll=polls[0], option=options[1], voted_by=users[9]),
+        ]))
+        record_polls(polls)
+
+    def test_user_list_budget(self):
+        # count + page, regardless of page size
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('admin-user-list'), {'page_size': 100})
+        self.assertEqual(len(response.data['results']), 100)
+
+    def test_most_active_voters(self):
+        response = self.client.get(reverse('admin-user-list'), {'ordering': '-total_votes'})
+        top = response.data['results'][:2]
+        self.assertEqual([(u['username'], u['total_votes']) for u in top], [('user5', 3), ('user9', 1)])
+
+        response = self.client.get(reverse('admin-user-list'), {'ordering': '-polls_created'})
+        self.assertEqual(response.data['results'][0]['polls_created'], 120)
+
+    @skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN output is SQLite's")
+    def test_count_orderings_walk_an_index(self):
+        def capture(execute, sql, params, many, context):
+            statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        for ordering in ('-total_votes', '-polls_created'):
+            statements = []
+            with connection.execute_wrapper(capture):
+                self.client.get(reverse('admin-user-list'), {'ordering': ordering})
+            with connection.cursor() as cursor:
+                # The last statement is the page, the one before it the count
+                cursor.execute('EXPLAIN QUERY PLAN ' + statements[-1][0], statements[-1][1])
+                plan = ' | '.join(row[-1] for row in cursor.fetchall())
+            self.assertIn('USING INDEX user_' + ordering.lstrip('-'), plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_poll_list_budget(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('admin-poll-list'), {'page_size': 100})
+        first = response.data['results'][0]
+        self.assertEqual(first['options_count'], 2)
+        self.assertEqual(first['created_by_username'], 'admin')
+
+    def test_unknown_ordering_falls_back(self):
+        response = self.client.get(reverse('admin-poll-list'), {'ordering': 'description'})
+        self.assertEqual(response.status_code, 200)
+
+
+class VoteKeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+        users = User.objects.bulk_create(User(username=f'user{i}', role='user') for i in range(25))
+        self.poll = Poll.objects.create(title='Poll', description='', category='misc', created_by=self.admin)
+        option = PollOption.objects.create(poll=self.poll, option_text='Yes')
+        Vote.objects.bulk_create(Vote(poll=self.poll, option=option, voted_by=u) for u in users)
+        # Pairs of votes share a timestamp so the id tiebreak matters
+        now = timezone.now()
+        for i, vote in enumerate(Vote.objects.order_by('id')):
+            Vote.objects.filter(id=vote.id).update(voted_at=now - timedelta(seconds=i // 2))
+        self.expected = list(Vote.objects.order_by('-voted_at', '-id').values_list('id', flat=True))
+
+    def walk(self, params):
+        ids, url, pages = [], reverse('admin-vote-list'), 0
+        response = self.client.get(url, params)
+        while True:
+            pages += 1
+            ids += [v['id'] for v in response.data['results']]
+            if not response.data['next']:
+                return ids, pages, response
+            response = self.client.get(response.data['next'])
+
+    def test_walks_every_vote_once_in_order(self):
+        ids, pages, last = self.walk({'cursor': '', 'page_size': 10})
+        self.assertEqual(ids, self.expected)
+        self.assertEqual(pages, 3)
+        self.assertNotIn('count', last.data)
+
+        previous = self.client.get(last.data['previous'])
+        self.assertEqual([v['id'] for v in previous.data['results']], self.expected[10:20])
+
+    def test_filters_and_total(self):
+        response = self.client.get(reverse('admin-vote-list'), {
+            'pagination': 'cursor', 'poll_id': self.poll.id, 'include_total': 1,
+        })
+        self.assertEqual(response.data['count'], 25)
+
+    def test_page_is_a_single_query(self):
+        first = self.client.get(reverse('admin-vote-list'), {'cursor': ''})
+        with self.assertNumQueries(1):
+            self.client.get(first.data['next'])
+
+    @skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN output is SQLite's")
+    def test_page_seeks_the_index(self):
+        def capture(execute, sql, params, many, context):
+            # With the values inlined SQLite plans differently than with bound parameters
+            statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        first = self.client.get(reverse('admin-vote-list'), {'cursor': ''})
+        for url in (first.data['next'], self.client.get(first.data['next']).data['previous']):
+            statements = []
+            with connection.execute_wrapper(capture):
+                self.client.get(url)
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + statements[0][0], statements[0][1])
+                plan = [row[-1] for row in cursor.fetchall() if 'polls_vote' in row[-1]]
+            self.assertRegex(plan[0], r'^SEARCH .*\(voted_at[<>]\?\)')
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('admin-vote-list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_numbers_still_default(self):
+        response = self.client.get(reverse('admin-vote-list'))
+        self.assertEqual(response.data['count'], 25)
+
+
+class AdminSearchTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        User.objects.create_user(username='jsmith', email='john@example.com', first_name='John', last_name='Smith')
+        User.objects.create_user(username='smithers', email='waylon@plant.org', first_name='Waylon', last_name='Smithers')
+        User.objects.create_user(username='alice', email='alice@example.com', first_name='Alice', last_name='Jones')
+
+    def usernames(self, **params):
+        response = self.client.get(reverse('admin-user-list'), params)
+        return [u['username'] for u in response.data['results']]
+
+    def test_prefix_match_ranked(self):
+        self.assertTrue(fts_available())
+        found = self.usernames(search='smith')
+        self.assertEqual(set(found), {'jsmith', 'smithers'})
+        # smithers matches in two columns (username and last name), jsmith in one
+        self.assertEqual(found, ['smithers', 'jsmith'])
+        self.assertEqual(self.usernames(search='john smi'), ['jsmith'])
+
+    def test_index_follows_saves_and_deletes(self):
+        user = User.objects.get(username='alice')
+        user.last_name = 'Liddell'
+        user.save()
+        self.assertEqual(self.usernames(search='liddell'), ['alice'])
+        user.delete()
+        self.assertEqual(self.usernames(search='liddell'), [])
+
+    def test_poll_search(self):
+        Poll.objects.create(title='Favourite season', description='Summer or winter?', category='misc', created_by=self.admin)
+        Poll.objects.create(title='Best pizza', description='Toppings', category='food', created_by=self.admin)
+        response = self.client.get(reverse('admin-poll-list'), {'search': 'wint'})
+        self.assertEqual([p['title'] for p in response.data['results']], ['Favourite season'])
+
+    def test_fallback_without_fts(self):
+        with mock.patch('admin_management.search.fts_available', return_value=False), \
+                mock.patch('admin_management.views.fts_available', return_value=False):
+            self.assertEqual(set(self.usernames(search='mith')), {'jsmith', 'smithers'})
+
+
+class VoteExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+        users = User.objects.bulk_create(User(username=f'user{i}', role='user') for i in range(5))
+        self.polls = [
+            Poll.objects.create(title=f'Poll {i}', description='', category='misc', created_by=self.admin)
+            for i in range(2)
+        ]
+        for poll in self.polls:
+            option = PollOption.objects.create(poll=poll, option_text='Yes, "quoted"')
+            Vote.objects.bulk_create(Vote(poll=poll, option=option, voted_by=u) for u in users)
+        self.users = users
+
+    def body(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv_export_streams_every_vote(self):
+        response = self.client.get(reverse('admin-vote-export'))
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(io.StringIO(self.body(response).decode())))
+        self.assertEqual(rows[0][:3], ['id', 'poll_id', 'poll_title'])
+        self.assertEqual(len(rows), 11)
+        self.assertEqual(rows[1][4], 'Yes, "quoted"')
+
+    def test_ndjson_with_filters(self):
+        response = self.client.get(
+            reverse('admin-vote-export'),
+            {'type': 'ndjson', 'poll_id': self.polls[1].id, 'user_id': self.users[2].id},
+        )
+        lines = self.body(response).decode().splitlines()
+        self.assertEqual(len(lines), 1)
+        row = json.loads(lines[0])
+        self.assertEqual((row['poll_id'], row['username']), (self.polls[1].id, 'user2'))
+
+    def test_poll_export_gzip(self):
+        response = self.client.get(reverse('admin-poll-export', args=[self.polls[0].id]), {'gzip': 1})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('.csv.gz', response['Content-Disposition'])
+        rows = gzip.decompress(self.body(response)).decode().splitlines()
+        self.assertEqual(len(rows), 6)
+
+    def test_bad_type_and_missing_poll(self):
+        self.assertEqual(self.client.get(reverse('admin-vote-export'), {'type': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('admin-poll-export', args=[999])).status_code, 404)
+
+
+class PollImportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def records(self, n):
+        return [
+            {'title': f'Imported {i}', 'description': 'Seeded', 'category': 'misc', 'options': ['Yes', 'No']}
+            for i in range(n)
+        ]
+
+    def test_ndjson_import_uses_bulk_inserts(self):
+        body = '\n'.join(json.dumps(r) for r in self.records(50))
+        # savepoint, polls, options, search index (delete + insert), creator's poll count, release
+        with self.assertNumQueries(7 if fts_available() else 5):
+            response = self.client.post(reverse('admin-poll-import'), body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['options_created']), (50, 100))
+        self.assertEqual(PollOption.objects.filter(poll__title='Imported 7').count(), 2)
+        self.assertTrue(Poll.objects.filter(created_by=self.admin).exists())
+        if fts_available():
+            found = self.client.get(reverse('admin-poll-list'), {'search': 'imported'})
+            self.assertEqual(found.data['count'], 50)
+
+    def test_invalid_record_rejects_batch(self):
+        records = self.records(3)
+        records[1]['options'] = []
+        del records[2]['title']
+        response = self.client.post(reverse('admin-poll-import'), records, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e['index'] for e in response.data['errors']], [1, 2])
+        self.assertFalse(Poll.objects.exists())
+
+    def test_option_errors_keyed_by_index_render(self):
+        records = self.records(1)
+        records[0]['options'] = ['Fine', 'x' * 300]
+        response = self.client.post(reverse('admin-poll-import'), records, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('1', response.json()['errors'][0]['errors']['options'])
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as f:
+            f.write('\n'.join(json.dumps(r) for r in self.records(3)))
+        self.addCleanup(os.remove, f.name)
+        out = io.StringIO()
+        call_command('import_polls', f.name, created_by='admin', stdout=out)
+        self.assertIn('Imported 3 polls', out.getvalue())
+        self.assertEqual(Poll.objects.count(), 3)
+
+
+@override_settings(DELETE_JOB_CHUNK_SIZE=7)
+class DeletionJobTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+        self.author = User.objects.create_user(username='author', password='pass', role='user')
+        self.voters = User.objects.bulk_create(User(username=f'voter{i}', role='user') for i in range(20))
+        self.doomed = Poll.objects.create(title='Doomed', description='', category='misc', created_by=self.author)
+        self.kept = Poll.objects.create(title='Kept', description='', category='misc', created_by=self.admin)
+        for poll in (self.doomed, self.kept):
+            option = PollOption.objects.create(poll=poll, option_text='Yes')
+            Vote.objects.bulk_create(Vote(poll=poll, option=option, voted_by=u) for u in self.voters)
+            PollOption.objects.filter(id=option.id).update(votes_count=20)
+            Poll.objects.filter(id=poll.id).update(total_votes=20)
+        User.objects.filter(id__in=[u.id for u in self.voters]).update(total_votes=2)
+
+    def run_bulk_delete(self, url_name, ids):
+        with mock.patch('admin_management.jobs.start_worker', side_effect=run_job), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse(url_name), {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 202)
+        return self.client.get(response.data['status_url']).data
+
+    def test_poll_job_deletes_votes_in_chunks(self):
+        with mock.patch('admin_management.jobs.Vote.objects.filter', wraps=Vote.objects.filter) as vote_filter:
+            job = self.run_bulk_delete('admin-poll-bulk-delete', [self.doomed.id])
+        # 20 votes in chunks of 7 is 3 batched deletes
+        self.assertEqual(sum(1 for c in vote_filter.call_args_list if 'id__in' in c.kwargs), 3)
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual((job['votes_total'], job['votes_deleted'], job['objects_deleted']), (20, 20, 1))
+        self.assertFalse(Poll.objects.filter(id=self.doomed.id).exists())
+        self.assertEqual(Vote.objects.filter(poll=self.kept).count(), 20)
+        self.assertEqual(set(User.objects.filter(id__in=[u.id for u in self.voters]).values_list('total_votes', flat=True)), {1})
+
+    def test_user_job_keeps_other_counters(self):
+        ids = [self.author.id] + [u.id for u in self.voters[:5]]
+        job = self.run_bulk_delete('admin-user-bulk-delete', ids)
+        self.assertEqual(job['status'], 'done')
+        # 20 votes on the author's poll plus 5 on the kept one
+        self.assertEqual((job['votes_total'], job['votes_deleted'], job['objects_deleted']), (25, 25, 6))
+        self.kept.refresh_from_db()
+        self.assertEqual(self.kept.total_votes, 15)
+        self.assertEqual(self.kept.options.get().votes_count, 15)
+        self.assertFalse(Poll.objects.filter(id=self.doomed.id).exists())
+
+    def test_unknown_job(self):
+        self.assertEqual(self.client.get(reverse('admin-job-detail', args=[999])).status_code, 404)
+
+    def test_votes_while_the_poll_is_deleted_are_rejected(self):
+        late = User.objects.create_user(username='late', password='pass', role='user')
+        voter = APIClient()
+        voter.force_authenticate(late)
+        option = self.doomed.options.get()
+        statuses = []
+        delete_votes_in_chunks = jobs._delete_votes_in_chunks
+
+        def delete_votes(job, votes, keep_counters):
+            # The poll is closed by now, a late vote must not slip in
+            statuses.append(voter.post(reverse('poll-vote', args=[self.doomed.id]),
+                                       {'option': option.id, 'poll': self.doomed.id}).status_code)
+            delete_votes_in_chunks(job, votes, keep_counters)
+
+        with mock.patch('admin_management.jobs._delete_votes_in_chunks', side_effect=delete_votes):
+            job = self.run_bulk_delete('admin-poll-bulk-delete', [self.doomed.id])
+        self.assertEqual(statuses, [400])
+        self.assertEqual(job['status'], 'done')
+
+    def test_interrupted_job_fails_when_read_and_resumes(self):
+        # A worker that died after deleting 7 of the 20 votes
+        half_done = list(Vote.objects.filter(poll=self.doomed).values_list('id', flat=True)[:7])
+        Vote.objects.filter(id__in=half_done).delete()
+        stale = DeletionJob.objects.create(kind=DeletionJob.POLLS, target_ids=[self.doomed.id],
+                                           status=DeletionJob.RUNNING, votes_deleted=7)
+        DeletionJob.objects.filter(id=stale.id).update(heartbeat_at=timezone.now() - timedelta(seconds=301))
+        busy = DeletionJob.objects.create(kind=DeletionJob.POLLS, target_ids=[self.kept.id],
+                                          status=DeletionJob.RUNNING, heartbeat_at=timezone.now())
+
+        data = self.client.get(reverse('admin-job-detail', args=[stale.id])).data
+        self.assertEqual(data['status'], 'failed')
+        self.assertIn('resume_deletion_jobs', data['error'])
+        self.assertEqual(self.client.get(reverse('admin-job-detail', args=[busy.id])).data['status'], 'running')
+
+        call_command('resume_deletion_jobs', stdout=io.StringIO())
+        data = self.client.get(reverse('admin-job-detail', args=[stale.id])).data
+        self.assertEqual((data['status'], data['error']), ('done', ''))
+        self.assertEqual((data['votes_total'], data['votes_deleted'], data['objects_deleted']), (20, 20, 1))
+        self.assertFalse(Poll.objects.filter(id=self.doomed.id).exists())
+        self.assertTrue(Poll.objects.filter(id=self.kept.id).exists())
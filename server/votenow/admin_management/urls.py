@@ -9,6 +9,7 @@ from .views import (
     AdminPollListView,
     AdminPollDetailView,
     AdminPollBulkDeleteView,
+    AdminPollImportView,
     AdminPollToggleActiveView,
     
     # Banner Management
@@ -19,6 +20,11 @@ from .views import (
     # Vote Management
     AdminVoteListView,
     AdminVoteDeleteView,
+    AdminVoteExportView,
+    AdminPollExportView,
+    
+    # Jobs
+    AdminJobDetailView,
     
     # Statistics
     AdminStatsView,
@@ -34,6 +40,8 @@ urlpatterns = [
     path('polls/', AdminPollListView.as_view(), name='admin-poll-list'),
     path('polls/<int:poll_id>/', AdminPollDetailView.as_view(), name='admin-poll-detail'),
     path('polls/<int:poll_id>/toggle-active/', AdminPollToggleActiveView.as_view(), name='admin-poll-toggle'),
+    path('polls/<int:poll_id>/export/', AdminPollExportView.as_view(), name='admin-poll-export'),
+    path('polls/import/', AdminPollImportView.as_view(), name='admin-poll-import'),
     path('polls/bulk-delete/', AdminPollBulkDeleteView.as_view(), name='admin-poll-bulk-delete'),
     
     # ==================== BANNERS ====================
@@ -43,8 +51,12 @@ urlpatterns = [
     
     # ==================== VOTES ====================
     path('votes/', AdminVoteListView.as_view(), name='admin-vote-list'),
+    path('votes/export/', AdminVoteExportView.as_view(), name='admin-vote-export'),
     path('votes/<int:vote_id>/', AdminVoteDeleteView.as_view(), name='admin-vote-delete'),
     
+    # ==================== JOBS ====================
+    path('jobs/<int:job_id>/', AdminJobDetailView.as_view(), name='admin-job-detail'),
+    
     # ==================== STATISTICS ====================
     path('stats/', AdminStatsView.as_view(), name='admin-stats'),
 ]
\ No newline at end of file
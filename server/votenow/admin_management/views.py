@@ -1,19 +1,36 @@
+import base64
+import json
+from datetime import datetime
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework.pagination import PageNumberPagination
-from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param
+from django.db import transaction
+from django.urls import reverse
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 
 from users.models import User
 from polls.models import Poll, PollOption, Vote
+from polls.counters import discard_votes
+from polls.cache import invalidate_results
 from banners.models import Banner
 from users.permissions import IsAdmin
 
+from .stats import get_snapshot
+from .jobs import enqueue, fail_stale_jobs
+from .models import DeletionJob
+from .exports import FORMATS, export_votes, filtered_votes
+from .importer import ImportFormatError, import_polls, parse_records
+from .search import fts_available, search as search_index
 from .serializers import (
     AdminUserListSerializer, AdminUserDetailSerializer, AdminUserUpdateSerializer,
     AdminPollListSerializer, AdminPollDetailSerializer, AdminPollUpdateSerializer,
     AdminBannerListSerializer, AdminBannerDetailSerializer, AdminBannerUpdateSerializer,
-    AdminVoteSerializer, BulkDeleteSerializer
+    AdminVoteSerializer, BulkDeleteSerializer, DeletionJobSerializer
 )
 
 
@@ -23,11 +40,116 @@ class StandardResultsSetPagination(PageNumberPagination):
     max_page_size = 100
 
 
+class VoteKeysetPagination:
+    """
+    Keyset pagination over votes ordered newest first by (voted_at, id).
+    Every page is one index range scan, so deep pages cost the same as the
+    first one. The total count is skipped unless ?include_total=1.
+    """
+    page_size = 10
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.total = queryset.count() if request.query_params.get('include_total') in ('1', 'true') else None
+
+        position, reverse = self.decode_cursor(request)
+        if position is None:
+            page = list(queryset.order_by('-voted_at', '-id')[:self.page_size + 1])
+        elif reverse:
+            voted_at, pk = position
+            # The plain range bound lets the planner seek the index, it cannot
+            # use one for the OR on its own
+            page = list(
+                queryset.filter(voted_at__gte=voted_at)
+                .filter(Q(voted_at__gt=voted_at) | Q(voted_at=voted_at, id__gt=pk))
+                .order_by('voted_at', 'id')[:self.page_size + 1]
+            )
+        else:
+            voted_at, pk = position
+            page = list(
+                queryset.filter(voted_at__lte=voted_at)
+                .filter(Q(voted_at__lt=voted_at) | Q(voted_at=voted_at, id__lt=pk))
+                .order_by('-voted_at', '-id')[:self.page_size + 1]
+            )
+
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        if reverse:
+            page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.page = page
+        return page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get('page_size', self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            voted_at = datetime.fromisoformat(data['t'])
+            return (voted_at, int(data['i'])), bool(data.get('r'))
+        except (ValueError, KeyError, TypeError):
+            raise NotFound("Invalid cursor")
+
+    def encode_cursor(self, vote, reverse):
+        data = {"t": vote.voted_at.isoformat(), "i": vote.id, "r": int(reverse)}
+        encoded = base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_paginated_response(self, data):
+        payload = {
+            "next": self.encode_cursor(self.page[-1], False) if self.has_next and self.page else None,
+            "previous": self.encode_cursor(self.page[0], True) if self.has_previous and self.page else None,
+            "results": data,
+        }
+        if self.total is not None:
+            payload["count"] = self.total
+        return Response(payload)
+
+
+def count_of(model, fk):
+    """Correlated COUNT(*) subquery, answered from the index on `fk`"""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{fk: OuterRef('pk')})
+            .order_by()
+            .values(fk)
+            .annotate(c=Count('pk'))
+            .values('c')
+        ),
+        0
+    )
+
+
+def apply_ordering(queryset, request, allowed, default):
+    """Order by ?ordering= if it is one of `allowed` (a leading '-' for descending)"""
+    ordering = request.query_params.get('ordering', '') or default
+    if ordering.lstrip('-') not in allowed:
+        ordering = default
+    tiebreak = '-id' if ordering.startswith('-') else 'id'
+    return queryset.order_by(ordering, tiebreak)
+
+
 # ==================== USER MANAGEMENT ====================
 class AdminUserListView(APIView):
-    """List all users with search & filter"""
+    """List all users with search & filter, ?ordering=-total_votes for the most active voters"""
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
     pagination_class = StandardResultsSetPagination
+    ordering_fields = ['date_joined', 'username', 'total_votes', 'polls_created']
     
     def get(self, request):
         # Get query parameters
@@ -35,17 +157,14 @@ class AdminUserListView(APIView):
         role = request.query_params.get('role', '')
         is_active = request.query_params.get('is_active', '')
         
-        # Base queryset
-        users = User.objects.all().order_by('-date_joined')
+        # Base queryset, the per-user counts are denormalized (polls.counters) and indexed
+        users = apply_ordering(User.objects.all(), request, self.ordering_fields, '-date_joined')
         
-        # Apply filters
+        # Apply filters, search results come ranked unless ?ordering= is given
         if search:
-            users = users.filter(
-                Q(username__icontains=search) | 
-                Q(email__icontains=search) |
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search)
-            )
+            users = search_index(users, search, ['username', 'email', 'first_name', 'last_name'])
+            if fts_available() and not request.query_params.get('ordering'):
+                users = users.order_by('search_rank', '-id')
         
         if role:
             users = users.filter(role=role)
@@ -105,7 +224,12 @@ class AdminUserDetailView(APIView):
                 )
             
             username = user.username
-            user.delete()
+            with transaction.atomic():
+                # The user's votes cascade away, keep poll counters in step
+                discard_votes(user.votes.all())
+                for poll_id in user.created_polls.values_list('id', flat=True):
+                    invalidate_results(poll_id)
+                user.delete()
             return Response(
                 {"message": f"User '{username}' deleted successfully"},
                 status=status.HTTP_204_NO_CONTENT
@@ -115,8 +239,19 @@ class AdminUserDetailView(APIView):
             return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
+def job_accepted(request, job, what):
+    return Response(
+        {
+            "message": f"Deleting {len(job.target_ids)} {what} in the background",
+            "job": DeletionJobSerializer(job).data,
+            "status_url": request.build_absolute_uri(reverse('admin-job-detail', args=[job.id])),
+        },
+        status=status.HTTP_202_ACCEPTED
+    )
+
+
 class AdminUserBulkDeleteView(APIView):
-    """Bulk delete users"""
+    """Bulk delete users, as a background job (see AdminJobDetailView for progress)"""
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
     
     def post(self, request):
@@ -131,19 +266,18 @@ class AdminUserBulkDeleteView(APIView):
                     status=status.HTTP_403_FORBIDDEN
                 )
             
-            deleted_count = User.objects.filter(id__in=ids).delete()[0]
-            return Response({
-                "message": f"{deleted_count} users deleted successfully"
-            })
+            job = enqueue(DeletionJob.USERS, ids, requested_by=request.user)
+            return job_accepted(request, job, "users")
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 # ==================== POLL MANAGEMENT ====================
 class AdminPollListView(APIView):
-    """List all polls with search & filter"""
+    """List all polls with search & filter, ?ordering=-total_votes for the most voted"""
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
     pagination_class = StandardResultsSetPagination
+    ordering_fields = ['created_at', 'title', 'total_votes', 'options_count']
     
     def get(self, request):
         # Get query parameters
@@ -152,14 +286,16 @@ class AdminPollListView(APIView):
         active = request.query_params.get('active', '')
         
         # Base queryset
-        polls = Poll.objects.all().order_by('-created_at')
+        polls = Poll.objects.select_related('created_by').annotate(
+            options_count=count_of(PollOption, 'poll'),
+        )
+        polls = apply_ordering(polls, request, self.ordering_fields, '-created_at')
         
-        # Apply filters
+        # Apply filters, search results come ranked unless ?ordering= is given
         if search:
-            polls = polls.filter(
-                Q(title__icontains=search) | 
-                Q(description__icontains=search)
-            )
+            polls = search_index(polls, search, ['title', 'description'])
+            if fts_available() and not request.query_params.get('ordering'):
+                polls = polls.order_by('search_rank', '-id')
         
         if category:
             polls = polls.filter(category=category)
@@ -206,6 +342,7 @@ class AdminPollDetailView(APIView):
             poll = Poll.objects.get(id=poll_id)
             title = poll.title
             poll.delete()
+            invalidate_results(poll_id)
             return Response(
                 {"message": f"Poll '{title}' deleted successfully"},
                 status=status.HTTP_204_NO_CONTENT
@@ -214,18 +351,45 @@ class AdminPollDetailView(APIView):
             return Response({"error": "Poll not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
+class AdminPollImportView(APIView):
+    """
+    Import polls with their options from a JSON array or NDJSON, sent as the
+    request body or as a multipart `file`. All or nothing: any invalid record
+    rejects the whole batch.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    
+    def post(self, request):
+        if request.content_type.startswith('multipart/'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response({"error": "No file uploaded"}, status=status.HTTP_400_BAD_REQUEST)
+            raw = upload.read()
+        else:
+            raw = request.body
+        
+        try:
+            records = parse_records(raw.decode('utf-8'))
+        except (UnicodeDecodeError, ImportFormatError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not records:
+            return Response({"error": "No polls to import"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        report = import_polls(records, created_by=request.user)
+        if report["errors"]:
+            return Response(report, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_201_CREATED)
+
+
 class AdminPollBulkDeleteView(APIView):
-    """Bulk delete polls"""
+    """Bulk delete polls, as a background job"""
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
     
     def post(self, request):
         serializer = BulkDeleteSerializer(data=request.data)
         if serializer.is_valid():
-            ids = serializer.validated_data['ids']
-            deleted_count = Poll.objects.filter(id__in=ids).delete()[0]
-            return Response({
-                "message": f"{deleted_count} polls deleted successfully"
-            })
+            job = enqueue(DeletionJob.POLLS, serializer.validated_data['ids'], requested_by=request.user)
+            return job_accepted(request, job, "polls")
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -329,23 +493,22 @@ class AdminBannerBulkDeleteView(APIView):
 
 # ==================== VOTE MANAGEMENT ====================
 class AdminVoteListView(APIView):
-    """List all votes with filters"""
+    """
+    List all votes with filters. Page numbers by default; pass ?cursor= (empty
+    for the first page) or ?pagination=cursor for keyset pagination.
+    """
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
     pagination_class = StandardResultsSetPagination
+    cursor_pagination_class = VoteKeysetPagination
     
     def get(self, request):
-        poll_id = request.query_params.get('poll_id', '')
-        user_id = request.query_params.get('user_id', '')
-        
         votes = Vote.objects.all().select_related('poll', 'option', 'voted_by').order_by('-voted_at')
+        votes = filtered_votes(request.query_params, votes)
         
-        if poll_id:
-            votes = votes.filter(poll_id=poll_id)
-        
-        if user_id:
-            votes = votes.filter(voted_by_id=user_id)
-        
-        paginator = self.pagination_class()
+        if 'cursor' in request.query_params or request.query_params.get('pagination') == 'cursor':
+            paginator = self.cursor_pagination_class()
+        else:
+            paginator = self.pagination_class()
         paginated_votes = paginator.paginate_queryset(votes, request)
         
         serializer = AdminVoteSerializer(paginated_votes, many=True)
@@ -360,7 +523,9 @@ class AdminVoteDeleteView(APIView):
         try:
             vote = Vote.objects.get(id=vote_id)
             vote_info = f"{vote.voted_by.username}'s vote on {vote.poll.title}"
-            vote.delete()
+            with transaction.atomic():
+                discard_votes(Vote.objects.filter(id=vote.id))
+                vote.delete()
             return Response(
                 {"message": f"Deleted: {vote_info}"},
                 status=status.HTTP_204_NO_CONTENT
@@ -369,20 +534,60 @@ class AdminVoteDeleteView(APIView):
             return Response({"error": "Vote not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
+def export_response(request, votes, filename):
+    # ?type= rather than ?format=, which DRF keeps for renderer selection
+    fmt = request.query_params.get('type', 'csv')
+    if fmt not in FORMATS:
+        return Response(
+            {"error": f"type must be one of: {', '.join(FORMATS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    gzip = request.query_params.get('gzip', '') in ('1', 'true')
+    return export_votes(filtered_votes(request.query_params, votes), fmt, filename, gzip=gzip)
+
+
+class AdminVoteExportView(APIView):
+    """Stream every vote as CSV or NDJSON (?type=csv|ndjson, ?gzip=1), same filters as the vote list"""
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    
+    def get(self, request):
+        return export_response(request, Vote.objects.all(), 'votes')
+
+
+class AdminPollExportView(APIView):
+    """Stream the votes of one poll as CSV or NDJSON"""
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    
+    def get(self, request, poll_id):
+        if not Poll.objects.filter(id=poll_id).exists():
+            return Response({"error": "Poll not found"}, status=status.HTTP_404_NOT_FOUND)
+        return export_response(request, Vote.objects.filter(poll_id=poll_id), f'poll-{poll_id}-votes')
+
+
+# ==================== JOBS ====================
+class AdminJobDetailView(APIView):
+    """Progress of a background bulk delete"""
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    
+    def get(self, request, job_id):
+        # A worker that died with its process leaves the job running forever
+        fail_stale_jobs(DeletionJob.objects.filter(id=job_id))
+        try:
+            job = DeletionJob.objects.get(id=job_id)
+        except DeletionJob.DoesNotExist:
+            return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(DeletionJobSerializer(job).data)
+
+
 # ==================== STATISTICS ====================
 class AdminStatsView(APIView):
-    """Quick stats for admin overview"""
+    """Quick stats for admin overview (cached snapshot, ?fresh=1 to recompute)"""
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
     
     def get(self, request):
-        stats = {
-            "total_users": User.objects.count(),
-            "admin_users": User.objects.filter(role='admin').count(),
-            "regular_users": User.objects.filter(role='user').count(),
-            "total_polls": Poll.objects.count(),
-            "active_polls": Poll.objects.filter(active=True).count(),
-            "inactive_polls": Poll.objects.filter(active=False).count(),
-            "total_votes": Vote.objects.count(),
-            "total_banners": Banner.objects.count(),
-        }
-        return Response(stats)
\ No newline at end of file
+        fresh = request.query_params.get('fresh', '') in ('1', 'true')
+        stats, age = get_snapshot(fresh=fresh)
+        return Response(
+            {**stats, "snapshot_age_seconds": round(age, 1)},
+            headers={"Age": str(int(age))}
+        )
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BannersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "banners"
+
+    def ready(self):
+        # Generates resized variants of uploaded banners, keeps the list ETag current
+        from . import signals, variants  # noqa: F401
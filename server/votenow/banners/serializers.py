@@ -1,5 +1,6 @@
 from rest_framework import serializers 
 from .models import Banner 
+from .variants import srcset
 
 class BannerSerializer(serializers.ModelSerializer):
     class Meta:
@@ -7,9 +8,10 @@ class BannerSerializer(serializers.ModelSerializer):
         fields = ["id", "poll", "title", "image", "created_at"]
     
     def to_representation(self, instance):
-        """Convert image to absolute URL when reading"""
+        """Convert image to absolute URL when reading, plus the resized variants"""
         representation = super().to_representation(instance)
         request = self.context.get('request')
         if instance.image and request:
             representation['image'] = request.build_absolute_uri(instance.image.url)
+        representation['srcset'] = srcset(instance.image, request)
         return representation
\ No newline at end of file
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from polls.stamps import BANNERS, touch_on_commit
+from .models import Banner
+
+
+@receiver(post_save, sender=Banner, dispatch_uid='stamps-banner-save')
+@receiver(post_delete, sender=Banner, dispatch_uid='stamps-banner-delete')
+def banner_changed(sender, instance, **kwargs):
+    # The banner list ETag (polls/stamps.py)
+    touch_on_commit(BANNERS)
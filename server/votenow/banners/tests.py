@@ -1,3 +1,104 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APIClient
+
+from users.models import User
+from polls.models import Poll
+from .models import Banner
+from .variants import generate, variant_name, variant_names, variants_ready
+
+
+def png(width, height):
+    buffer = BytesIO()
+    Image.new('RGBA', (width, height), (200, 30, 30, 255)).save(buffer, 'PNG')
+    return SimpleUploadedFile('banner.png', buffer.getvalue(), content_type='image/png')
+
+
+class BannerVariantTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.poll = Poll.objects.create(title='Poll', description='', category='misc', created_by=self.admin)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def upload(self, image):
+        with mock.patch('banners.variants.start_worker', side_effect=generate), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('banner-create'), {'poll': self.poll.id, 'title': 'Vote now', 'image': image}, format='multipart'
+            )
+        self.assertEqual(response.status_code, 201)
+        return Banner.objects.get()
+
+    def test_upload_generates_variants(self):
+        banner = self.upload(png(1600, 800))
+        with default_storage.open(variant_name(banner.image.name, 640, 'webp')) as f:
+            self.assertEqual(Image.open(f).size, (640, 320))
+        with default_storage.open(variant_name(banner.image.name, 1280, 'jpeg')) as f:
+            self.assertEqual(Image.open(f).format, 'JPEG')
+
+        srcset = self.client.get(reverse('banner-list')).data[0]['srcset']
+        self.assertEqual(set(srcset), {'jpeg', 'webp'})
+        self.assertTrue(srcset['webp']['320w'].startswith('http://testserver/media/banners/variants/'))
+        admin_srcset = self.client.get(reverse('admin-banner-list')).data['results'][0]['srcset']
+        self.assertEqual(set(admin_srcset['jpeg']), {'320w', '640w', '1280w'})
+
+    def test_small_images_are_not_upscaled(self):
+        banner = self.upload(png(200, 100))
+        with default_storage.open(variant_name(banner.image.name, 1280, 'jpeg')) as f:
+            self.assertEqual(Image.open(f).size, (200, 100))
+
+    def test_missing_variants_are_regenerated(self):
+        banner = self.upload(png(800, 400))
+        default_storage.delete(variant_name(banner.image.name, 320, 'jpeg'))
+        cache.clear()
+        with mock.patch('banners.variants.start_worker') as start_worker, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(reverse('banner-list'))
+        self.assertEqual(response.data[0]['srcset'], {})
+        start_worker.assert_called_with(banner.image.name)
+
+    def test_variants_go_with_their_image(self):
+        banner = self.upload(png(800, 400))
+        old = banner.image.name
+        with mock.patch('banners.variants.start_worker', side_effect=generate), \
+                self.captureOnCommitCallbacks(execute=True):
+            banner.image = png(600, 300)
+            banner.save()
+        self.assertFalse(any(default_storage.exists(name) for name in variant_names(old)))
+        self.assertFalse(variants_ready(old))
+        self.assertTrue(all(default_storage.exists(name) for name in variant_names(banner.image.name)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('admin-banner-detail', args=[banner.id]))
+        self.assertFalse(any(default_storage.exists(name) for name in variant_names(banner.image.name)))
+
+    @override_settings(POLL_STAMPS_ALLOW_LOCAL_CACHE=True)
+    def test_list_revalidates_with_etag(self):
+        banner = self.upload(png(400, 200))
+        first = self.client.get(reverse('banner-list'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('banner-list'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            banner.title = 'Vote today'
+            banner.save()
+        response = self.client.get(reverse('banner-list'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
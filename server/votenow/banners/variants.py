@@ -0,0 +1,172 @@
+"""
+Resized banner variants for small screens.
+
+Every uploaded banner gets JPEG and WebP copies at up to 320, 640 and 1280 px
+wide (never upscaled), written next to the originals under banners/variants/.
+They are generated by a background thread after the upload commits, and again
+on demand whenever a serializer finds them missing. Until they exist the
+srcset map is empty and clients fall back to the original `image`. They are
+deleted along with their banner, or once its image is replaced.
+
+Whether they exist is cached for READY_TIMEOUT only: the cache is per process
+by default, so a worker that did not delete them itself would otherwise keep
+handing out URLs of missing files.
+"""
+import logging
+import posixpath
+import threading
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from PIL import Image, ImageOps
+
+from polls.stamps import BANNERS, touch
+from .models import Banner
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (320, 640, 1280)
+FORMATS = {
+    # name: (Pillow format, extension, save options)
+    'jpeg': ('JPEG', 'jpg', {'quality': 80, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+}
+READY_KEY = 'banner-variants:{}'
+READY_TIMEOUT = 5 * 60
+
+_in_flight = set()
+_lock = threading.Lock()
+
+
+def variant_name(image_name, width, fmt):
+    # Keep the original extension in the name, photo.png and photo.jpg may both exist
+    base = posixpath.basename(image_name).replace('.', '_')
+    return f"banners/variants/{base}-{width}w.{FORMATS[fmt][1]}"
+
+
+def variant_names(image_name):
+    return [variant_name(image_name, width, fmt) for width in WIDTHS for fmt in FORMATS]
+
+
+def _encode(image, fmt):
+    pillow_format, _, save_options = FORMATS[fmt]
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    mode = 'RGBA' if has_alpha and fmt == 'webp' else 'RGB'
+    buffer = BytesIO()
+    image.convert(mode).save(buffer, pillow_format, **save_options)
+    return buffer.getvalue()
+
+
+def generate(image_name):
+    """Write every variant of the stored image, replacing old ones"""
+    with default_storage.open(image_name) as f:
+        original = ImageOps.exif_transpose(Image.open(f))
+        original.load()
+
+    for width in WIDTHS:
+        image = original
+        if original.width > width:
+            height = max(1, round(original.height * width / original.width))
+            image = original.resize((width, height), Image.LANCZOS)
+        for fmt in FORMATS:
+            name = variant_name(image_name, width, fmt)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            default_storage.save(name, ContentFile(_encode(image, fmt)))
+    cache.set(READY_KEY.format(image_name), True, timeout=READY_TIMEOUT)
+    # The list now has a srcset for this banner
+    touch(BANNERS)
+
+
+def delete_variants(image_name):
+    """Remove the variants of an image that was deleted or replaced"""
+    cache.delete(READY_KEY.format(image_name))
+    for name in variant_names(image_name):
+        default_storage.delete(name)
+    touch(BANNERS)
+
+
+def _generate_and_release(image_name):
+    try:
+        generate(image_name)
+    except Exception:
+        logger.exception("Could not generate variants of %s", image_name)
+    finally:
+        with _lock:
+            _in_flight.discard(image_name)
+
+
+def start_worker(image_name):
+    # One generation per image at a time
+    with _lock:
+        if image_name in _in_flight:
+            return
+        _in_flight.add(image_name)
+    threading.Thread(target=_generate_and_release, args=(image_name,), name='banner-variants', daemon=True).start()
+
+
+def schedule(image_name):
+    """Generate the variants in the background once the current transaction commits"""
+    transaction.on_commit(lambda: start_worker(image_name))
+
+
+def variants_ready(image_name):
+    if cache.get(READY_KEY.format(image_name)):
+        return True
+    if all(default_storage.exists(name) for name in variant_names(image_name)):
+        cache.set(READY_KEY.format(image_name), True, timeout=READY_TIMEOUT)
+        return True
+    return False
+
+
+def srcset(image, request=None):
+    """
+    {"jpeg": {"320w": url, ...}, "webp": {...}} for a banner image, or {} while
+    the variants are missing (they are queued for generation then).
+    """
+    if not image:
+        return {}
+    if not variants_ready(image.name):
+        schedule(image.name)
+        return {}
+
+    def url(name):
+        url = default_storage.url(name)
+        return request.build_absolute_uri(url) if request else url
+
+    return {
+        fmt: {f"{width}w": url(variant_name(image.name, width, fmt)) for width in WIDTHS}
+        for fmt in FORMATS
+    }
+
+
+@receiver(pre_save, sender=Banner, dispatch_uid='banner-variants-pre-save')
+def banner_saving(sender, instance, update_fields=None, raw=False, **kwargs):
+    # Remember the image being replaced, its variants go once the save commits
+    instance._replaced_image = None
+    if instance.pk and not raw and (update_fields is None or 'image' in update_fields):
+        previous = Banner.objects.filter(pk=instance.pk).values_list('image', flat=True).first()
+        if previous and previous != instance.image.name:
+            instance._replaced_image = previous
+
+
+@receiver(post_save, sender=Banner, dispatch_uid='banner-variants-save')
+def banner_saved(sender, instance, update_fields=None, **kwargs):
+    replaced = getattr(instance, '_replaced_image', None)
+    if replaced:
+        transaction.on_commit(lambda: delete_variants(replaced))
+    if instance.image and (update_fields is None or 'image' in update_fields):
+        if not variants_ready(instance.image.name):
+            schedule(instance.image.name)
+
+
+@receiver(post_delete, sender=Banner, dispatch_uid='banner-variants-delete')
+def banner_deleted(sender, instance, **kwargs):
+    if instance.image:
+        name = instance.image.name
+        transaction.on_commit(lambda: delete_variants(name))
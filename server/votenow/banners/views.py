@@ -3,6 +3,8 @@ from rest_framework import generics, permissions, parsers
 from .models import Banner
 from .serializers import BannerSerializer
 from users.permissions import IsAdmin 
+from polls.stamps import BANNERS, stamp_condition
+from django.utils.decorators import method_decorator
 
 class BannerCreateAPIView(generics.CreateAPIView): 
     queryset = Banner.objects.all() 
@@ -13,6 +15,13 @@ class BannerCreateAPIView(generics.CreateAPIView):
     def get_serializer_context(self):
         return {'request': self.request}
 
+def banner_list_etag(request, name, stamp):
+    # Image URLs are absolute, so the host is part of the representation
+    return f"banners-{stamp}-{request.get_host()}"
+
+
+# 304 from the banners version stamp (polls/stamps.py) before anything is queried
+@method_decorator(stamp_condition(lambda request, *args, **kwargs: BANNERS, banner_list_etag), name='get')
 class BannerListAPIView(generics.ListAPIView):
     queryset = Banner.objects.all() 
     serializer_class = BannerSerializer 
@@ -3,6 +3,12 @@ ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+HTTP goes to Django as usual. Websocket connections are handed to the live
+poll results stream (polls.live), the only websocket endpoint we serve.
+Login and registration are async views (users/views.py) that only pay off
+when served from here: they wait on the password hashing pool without
+holding a worker.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -13,4 +19,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Import after Django is set up
+from polls.live import websocket_results  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        return await websocket_results(scope, receive, send)
+    return await django_application(scope, receive, send)
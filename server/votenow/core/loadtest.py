@@ -0,0 +1,284 @@
+"""
+HTTP load generator for `manage.py loadtest`.
+
+Plain asyncio, no client library: each virtual user keeps one HTTP/1.1
+keep-alive connection and sends its requests one after the other, like a
+browser tab would. Latencies are measured per endpoint from sending the
+request to reading the whole body and reported as p50/p95/p99.
+"""
+import asyncio
+import json
+import math
+import random
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+ENDPOINTS = ('register', 'login', 'vote', 'list', 'detail', 'results')
+TRAFFIC = ('vote', 'list', 'detail', 'results')
+DEFAULT_MIX = 'vote=1,list=4,detail=3,results=2'
+
+
+class LoadTestError(Exception):
+    pass
+
+
+def parse_mix(text):
+    """'vote=1,list=4' -> {'vote': 1.0, 'list': 4.0}"""
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(','))):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in TRAFFIC:
+            raise LoadTestError(f"Unknown endpoint {name!r} in mix, expected one of {', '.join(TRAFFIC)}")
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise LoadTestError(f"Weight of {name} must be a number, got {weight!r}")
+        if mix[name] < 0:
+            raise LoadTestError(f"Weight of {name} must not be negative")
+    if not any(mix.values()):
+        raise LoadTestError("The mix needs at least one endpoint with a positive weight")
+    return mix
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+        self.first = {}
+        self.last = {}
+        self.traffic_seconds = None
+        self.active_users = 0
+
+    def record(self, endpoint, started, status):
+        finished = time.perf_counter()
+        self.latencies[endpoint].append(finished - started)
+        self.statuses[endpoint][status] += 1
+        if status is None or status >= 400:
+            self.errors[endpoint] += 1
+        self.first.setdefault(endpoint, started)
+        self.last[endpoint] = finished
+
+    def summary(self, endpoint):
+        latencies = sorted(self.latencies[endpoint])
+        count = len(latencies)
+        elapsed = self.last[endpoint] - self.first[endpoint] if count else 0
+
+        def ms(value):
+            return None if value is None else round(value * 1000, 2)
+
+        return {
+            'requests': count,
+            'errors': self.errors[endpoint],
+            'status_codes': {str(code): n for code, n in sorted(self.statuses[endpoint].items(), key=str)},
+            'throughput_rps': round(count / elapsed, 2) if elapsed else None,
+            'latency_ms': {
+                'mean': ms(sum(latencies) / count) if count else None,
+                'p50': ms(percentile(latencies, 50)),
+                'p95': ms(percentile(latencies, 95)),
+                'p99': ms(percentile(latencies, 99)),
+                'max': ms(latencies[-1]) if count else None,
+            },
+        }
+
+    def report(self):
+        return {endpoint: self.summary(endpoint) for endpoint in ENDPOINTS if self.latencies[endpoint]}
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection, reopened when the server closes it"""
+
+    def __init__(self, base_url, timeout=30):
+        url = urlsplit(base_url)
+        if url.scheme != 'http':
+            raise LoadTestError(f"Only http:// targets are supported, got {base_url}")
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.prefix = url.path.rstrip('/')
+        self.timeout = timeout
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+    async def request(self, method, path, data=None, token=None):
+        """Returns (status, body bytes)"""
+        body = b'' if data is None else json.dumps(data).encode()
+        lines = [
+            f"{method} {self.prefix}{path} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            "Accept: application/json",
+            f"Content-Length: {len(body)}",
+        ]
+        if data is not None:
+            lines.append("Content-Type: application/json")
+        if token:
+            lines.append(f"Authorization: Bearer {token}")
+        payload = ('\r\n'.join(lines) + '\r\n\r\n').encode() + body
+
+        for attempt in (1, 2):
+            reused = self.writer is not None
+            if not reused:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                self.writer.write(payload)
+                await self.writer.drain()
+                return await asyncio.wait_for(self._read_response(), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                # A kept-alive connection may have been closed by the server meanwhile
+                if not reused or attempt == 2:
+                    raise
+
+    async def _read_response(self):
+        status_line = await self.reader.readuntil(b'\r\n')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in headers:
+            body = await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = await self._read_chunked()
+        else:
+            body = await self.reader.read()
+            headers['connection'] = 'close'
+        if headers.get('connection', '').lower() == 'close' or status_line.startswith(b'HTTP/1.0'):
+            await self.close()
+        return status, body
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            if size == 0:
+                await self.reader.readuntil(b'\r\n')
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+
+
+class VirtualUser:
+    def __init__(self, index, prefix, password, connection):
+        self.username = f"{prefix}-{index}"
+        self.password = password
+        self.connection = connection
+        self.token = None
+        self.voted = set()
+
+    async def call(self, stats, endpoint, method, path, data=None):
+        started = time.perf_counter()
+        try:
+            status, body = await self.connection.request(method, path, data, self.token)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            await self.connection.close()
+            stats.record(endpoint, started, None)
+            return None, None
+        stats.record(endpoint, started, status)
+        return status, body
+
+    async def call_with_retry(self, stats, endpoint, method, path, data, give_up_after=60):
+        # Registration and login answer 503 (Retry-After: 1) while the hashing pool is saturated
+        deadline = time.perf_counter() + give_up_after
+        while True:
+            status, body = await self.call(stats, endpoint, method, path, data)
+            if status != 503 or time.perf_counter() >= deadline:
+                return status, body
+            await asyncio.sleep(0.5 + random.random())
+
+    async def sign_up(self, stats):
+        status, _ = await self.call_with_retry(stats, 'register', 'POST', '/api/users/register/', {
+            'username': self.username, 'email': f"{self.username}@loadtest.invalid",
+            'password': self.password, 'role': 'user',
+        })
+        if status != 201:
+            return False
+        status, body = await self.call_with_retry(stats, 'login', 'POST', '/api/users/login/', {
+            'username': self.username, 'password': self.password,
+        })
+        if status != 200:
+            return False
+        self.token = json.loads(body)['access']
+        return True
+
+    async def step(self, stats, endpoint, polls):
+        poll_id = random.choice(list(polls))
+        if endpoint == 'vote':
+            remaining = [p for p in polls if p not in self.voted]
+            if not remaining:
+                # One vote per poll and user: once through them all, read instead
+                endpoint = 'results'
+            else:
+                poll_id = random.choice(remaining)
+                self.voted.add(poll_id)
+                await self.call(stats, 'vote', 'POST', f'/api/polls/{poll_id}/vote/',
+                                {'poll': poll_id, 'option': random.choice(polls[poll_id])})
+                return
+        if endpoint == 'list':
+            await self.call(stats, 'list', 'GET', '/api/polls/')
+        elif endpoint == 'detail':
+            await self.call(stats, 'detail', 'GET', f'/api/polls/{poll_id}/')
+        else:
+            await self.call(stats, 'results', 'GET', f'/api/polls/{poll_id}/results/')
+
+
+async def run(base_url, users, polls, mix, duration=None, requests=None, prefix='loadtest',
+              password='loadtest-password', stats=None):
+    """
+    Sign up `users` virtual users, then have all of them send traffic picked
+    from `mix` for `duration` seconds or until `requests` were sent in total.
+    `polls` maps poll ids to their option ids. Returns the Stats.
+    """
+    stats = stats or Stats()
+    everyone = [VirtualUser(i, prefix, password, Connection(base_url)) for i in range(users)]
+    try:
+        signed_up = await asyncio.gather(*(vuser.sign_up(stats) for vuser in everyone))
+        vusers = [vuser for vuser, ok in zip(everyone, signed_up) if ok]
+        if not vusers:
+            raise LoadTestError("No virtual user could register and log in, is the server up?")
+
+        endpoints, weights = zip(*mix.items())
+        deadline = time.perf_counter() + duration if duration else None
+        budget = [requests]
+
+        def more():
+            if deadline is not None and time.perf_counter() >= deadline:
+                return False
+            if budget[0] is not None:
+                if budget[0] <= 0:
+                    return False
+                budget[0] -= 1
+            return True
+
+        async def drive(vuser):
+            while more():
+                await vuser.step(stats, random.choices(endpoints, weights)[0], polls)
+
+        traffic_started = time.perf_counter()
+        await asyncio.gather(*(drive(vuser) for vuser in vusers))
+        stats.traffic_seconds = time.perf_counter() - traffic_started
+        stats.active_users = len(vusers)
+    finally:
+        await asyncio.gather(*(vuser.connection.close() for vuser in everyone))
+    return stats
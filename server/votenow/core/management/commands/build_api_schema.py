@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.schema import schema_dir, write_schema
+
+
+class Command(BaseCommand):
+    help = "Generate the OpenAPI document served at /swagger.json and /swagger.yaml"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-dir', help="Directory to write to (default: API_SCHEMA_DIR)")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        paths = write_schema(options['output_dir'] or schema_dir())
+        elapsed = time.perf_counter() - started
+        for path in paths:
+            self.stdout.write(f"{path} ({path.stat().st_size} bytes)")
+        self.stdout.write(self.style.SUCCESS(f"API schema built in {elapsed:.2f}s"))
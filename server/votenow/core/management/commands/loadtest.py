@@ -0,0 +1,136 @@
+import asyncio
+import json
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.loadtest import DEFAULT_MIX, LoadTestError, TRAFFIC, parse_mix, run
+from polls.counters import record_polls
+from polls.models import Poll, PollOption
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the API over HTTP: register and log in synthetic users, send a mix "
+        "of vote/list/detail/results requests and report throughput and p50/p95/p99 "
+        "latency per endpoint as JSON. Starts runserver on a free port unless --url is "
+        "given. Creates throwaway users and polls and removes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Server to test, e.g. http://127.0.0.1:8000 (default: start one)')
+        parser.add_argument('--users', type=int, default=20, help='Virtual users, each sends one request at a time')
+        parser.add_argument('--polls', type=int, default=10, help='Polls to vote on')
+        parser.add_argument('--options', type=int, default=4, help='Options per poll')
+        parser.add_argument('--duration', type=float, default=None, help='Seconds of traffic (default: 30 unless --requests)')
+        parser.add_argument('--requests', type=int, default=None, help='Stop after this many requests in total')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Relative weights of {", ".join(TRAFFIC)}')
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+        parser.add_argument('--seed', type=int, default=None, help='Seed for the traffic mix')
+        parser.add_argument('--keep', action='store_true', help='Keep the synthetic users and polls')
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'])
+        except LoadTestError as e:
+            raise CommandError(str(e))
+        if options['users'] < 1 or options['polls'] < 1 or options['options'] < 1:
+            raise CommandError("--users, --polls and --options must be at least 1")
+        duration, requests = options['duration'], options['requests']
+        if duration is None and requests is None:
+            duration = 30.0
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+
+        prefix = f"loadtest-{int(time.time())}"
+        polls = self.create_polls(prefix, options['polls'], options['options'])
+        server = None
+        try:
+            url = options['url']
+            if not url:
+                server, url = self.start_server()
+            started_at = datetime.now(timezone.utc)
+            stats = asyncio.run(run(url, options['users'], polls, mix, duration=duration,
+                                    requests=requests, prefix=prefix))
+        except LoadTestError as e:
+            raise CommandError(str(e))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+            if not options['keep']:
+                Poll.objects.filter(title__startswith=prefix).delete()
+                User.objects.filter(username__startswith=prefix).delete()
+
+        endpoints = stats.report()
+        traffic = [endpoints[name] for name in TRAFFIC if name in endpoints]
+        total = sum(e['requests'] for e in traffic)
+        report = {
+            'target': url,
+            'started_at': started_at.isoformat(),
+            'config': {
+                'users': options['users'], 'polls': options['polls'], 'options': options['options'],
+                'mix': mix, 'duration': duration, 'requests': requests,
+            },
+            'signed_up_users': stats.active_users,
+            'traffic_seconds': round(stats.traffic_seconds, 3),
+            'total': {
+                'requests': total,
+                'errors': sum(e['errors'] for e in traffic),
+                'throughput_rps': round(total / stats.traffic_seconds, 2) if stats.traffic_seconds else None,
+            },
+            'endpoints': endpoints,
+        }
+
+        text = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
+            self.stderr.write(f"Report written to {options['output']}")
+        else:
+            self.stdout.write(text)
+
+    def create_polls(self, prefix, count, options):
+        """{poll id: [option ids]} of fresh polls owned by a throwaway admin"""
+        admin = User.objects.create_user(username=f"{prefix}-admin", password=None, role='admin')
+        polls = Poll.objects.bulk_create(
+            Poll(title=f"{prefix} poll {i}", description='Load test poll', category='loadtest',
+                 created_by=admin)
+            for i in range(count)
+        )
+        PollOption.objects.bulk_create(
+            PollOption(poll=poll, option_text=f"Option {i}") for poll in polls for i in range(options)
+        )
+        # Deleting them afterwards takes them off the admin's count again
+        record_polls(polls)
+        return {
+            poll.id: list(PollOption.objects.filter(poll=poll).values_list('id', flat=True))
+            for poll in polls
+        }
+
+    def start_server(self, timeout=30):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        server = subprocess.Popen(
+            [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'runserver', '--noreload', f'127.0.0.1:{port}'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError("runserver exited before accepting connections")
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return server, f"http://127.0.0.1:{port}"
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f"runserver did not start listening on port {port} within {timeout}s")
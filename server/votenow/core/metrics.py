@@ -0,0 +1,117 @@
+"""
+Prometheus metrics, scraped from /metrics.
+
+- http_requests_total / http_request_duration_seconds: per URL name (the
+  `name=` of the route, e.g. "poll-list"), method and status. Requests that
+  match no route are counted as "<unmatched>" so random URLs cannot blow up
+  the number of series.
+- votes_accepted_total, votes_duplicate_rejected_total, logins_total: counted
+  by the vote and login views.
+- votes_ingest_dropped_total: queued votes the batched ingestion writer gave
+  up on (polls/ingest.py), they were answered with 202 but never stored.
+
+Needs prometheus_client; without it everything here is a no-op and /metrics
+answers 503. With several worker processes (gunicorn, uvicorn --workers) set
+the PROMETHEUS_MULTIPROC_DIR environment variable to an empty directory
+shared by the workers before they start: each one then writes its samples to
+memory-mapped files there and /metrics adds them up across processes. Empty
+the directory whenever the server restarts, or the counters carry on from the
+previous run's files.
+"""
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:  # optional, metrics are off without it
+    prometheus_client = None
+
+UNMATCHED = '<unmatched>'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+
+
+class _NoMetric:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, amount):
+        pass
+
+
+if prometheus_client is not None:
+    REQUESTS = prometheus_client.Counter(
+        'http_requests', 'HTTP requests by URL name, method and status', ['view', 'method', 'status'])
+    LATENCY = prometheus_client.Histogram(
+        'http_request_duration_seconds', 'Time to build the response, by URL name and method',
+        ['view', 'method'], buckets=LATENCY_BUCKETS)
+    VOTES_ACCEPTED = prometheus_client.Counter(
+        'votes_accepted', 'Votes accepted, stored right away or queued for batched ingestion', ['mode'])
+    VOTES_DUPLICATE = prometheus_client.Counter(
+        'votes_duplicate_rejected', 'Votes rejected because the user already voted on the poll')
+    LOGINS = prometheus_client.Counter('logins', 'Login attempts by result', ['result'])
+    VOTES_DROPPED = prometheus_client.Counter(
+        'votes_ingest_dropped', 'Queued votes dropped because their batch could not be written')
+else:
+    REQUESTS = LATENCY = VOTES_ACCEPTED = VOTES_DUPLICATE = LOGINS = VOTES_DROPPED = _NoMetric()
+
+
+def multiprocess_mode():
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    # view_name is the dotted path of the view for unnamed routes
+    return match.view_name if match is not None else UNMATCHED
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if prometheus_client is None:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, started)
+        return response
+
+    def observe(self, request, response, started):
+        view = _view_name(request)
+        LATENCY.labels(view, request.method).observe(time.perf_counter() - started)
+        REQUESTS.labels(view, request.method, str(response.status_code)).inc()
+
+
+def metrics_view(request):
+    if prometheus_client is None:
+        return HttpResponse("prometheus_client is not installed\n", status=503, content_type='text/plain')
+    if multiprocess_mode():
+        # Fresh registry per scrape, it reads every worker's files
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return HttpResponse(prometheus_client.generate_latest(registry),
+                        content_type=prometheus_client.CONTENT_TYPE_LATEST)
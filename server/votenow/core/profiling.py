@@ -0,0 +1,180 @@
+"""
+Per-request SQL and timing profile.
+
+When REQUEST_PROFILING is on, every request gets a RequestProfile with its
+query count, total SQL time and slowest statements. With
+REQUEST_PROFILING_SERVER_TIMING the figures also go out in a Server-Timing
+header (shown by the browser devtools; off by default, it tells any client
+how much SQL a request ran). Requests slower than
+REQUEST_PROFILING_SLOW_MS are logged as one JSON line on the
+"core.profiling" logger, and a statement run REQUEST_PROFILING_REPEAT_THRESHOLD
+times or more in one request is logged as a likely N+1 (a query per row in a
+loop; Django's SQL keeps the parameters out, so the same shape is the same
+string). Logged statements have their IN lists and multi-row VALUES
+collapsed and are cut at REQUEST_PROFILING_MAX_SQL characters.
+
+Cheap enough to leave on: the wrapper below is installed once per database
+connection and only adds a timer and a dict increment per query. The
+profile lives in a context variable so it follows async views into the
+threads their ORM calls run in.
+"""
+import contextvars
+import heapq
+import json
+import logging
+import re
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+_profile = contextvars.ContextVar('request_profile', default=None)
+
+_IN_LIST = re.compile(r'IN \((?:%s, )+%s\)')
+_VALUES_ROWS = re.compile(r'(\((?:%s, )*%s\))(?:, \((?:%s, )*%s\))+')
+
+
+class RequestProfile:
+    __slots__ = ('started', 'queries', 'sql_seconds', 'slowest', 'shapes', 'keep')
+
+    def __init__(self, keep=3):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.slowest = []  # min-heap of (seconds, sql, alias)
+        self.shapes = Counter()
+        self.keep = keep
+
+    def record(self, sql, seconds, alias):
+        self.queries += 1
+        self.sql_seconds += seconds
+        self.shapes[sql] += 1
+        if len(self.slowest) < self.keep:
+            heapq.heappush(self.slowest, (seconds, sql, alias))
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (seconds, sql, alias))
+
+    def repeated(self, threshold):
+        found = [(sql, n) for sql, n in self.shapes.items() if n >= threshold]
+        return sorted(found, key=lambda item: item[1], reverse=True)
+
+
+class QueryRecorder:
+    """Execute wrapper feeding the profile of the current request, if any"""
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def __call__(self, execute, sql, params, many, context):
+        profile = _profile.get()
+        if profile is None:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            profile.record(sql, time.perf_counter() - started, self.alias)
+
+
+@receiver(connection_created, dispatch_uid='profiling-install-recorder')
+def install_recorder(sender, connection, **kwargs):
+    # Fires again on every reconnect of the same wrapper
+    if not any(isinstance(w, QueryRecorder) for w in connection.execute_wrappers):
+        connection.execute_wrappers.append(QueryRecorder(connection.alias))
+
+
+def shorten(sql, limit):
+    """The statement as logged: IN (...), first VALUES row only, at most `limit` characters"""
+    sql = _VALUES_ROWS.sub(r'\1, ...', _IN_LIST.sub('IN (...)', sql))
+    return sql if len(sql) <= limit else sql[:limit] + '...'
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+    return match.view_name
+
+
+class RequestProfileMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'REQUEST_PROFILING_SLOW_MS', 1000)
+        self.repeat_threshold = getattr(settings, 'REQUEST_PROFILING_REPEAT_THRESHOLD', 5)
+        self.keep = getattr(settings, 'REQUEST_PROFILING_SLOWEST', 3)
+        self.max_sql = getattr(settings, 'REQUEST_PROFILING_MAX_SQL', 1000)
+        self.server_timing = getattr(settings, 'REQUEST_PROFILING_SERVER_TIMING', False)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = RequestProfile(self.keep)
+        token = _profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        profile = RequestProfile(self.keep)
+        token = _profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _profile.reset(token)
+        return self.finish(request, response, profile)
+
+    def finish(self, request, response, profile):
+        total = time.perf_counter() - profile.started
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'db;dur={_ms(profile.sql_seconds)};desc="{profile.queries} queries", '
+                f'app;dur={_ms(total - profile.sql_seconds)}, '
+                f'total;dur={_ms(total)}'
+            )
+
+        repeated = profile.repeated(self.repeat_threshold)
+        slow = total * 1000 >= self.slow_ms
+        if not (slow or repeated):
+            return response
+
+        record = {
+            'event': 'slow_request' if slow else 'repeated_queries',
+            'method': request.method,
+            'path': request.path,
+            'route': _route(request),
+            'status': response.status_code,
+            'total_ms': _ms(total),
+            'sql_ms': _ms(profile.sql_seconds),
+            'queries': profile.queries,
+            'slowest_queries': [
+                {'sql': shorten(sql, self.max_sql), 'ms': _ms(seconds), 'db': alias}
+                for seconds, sql, alias in sorted(profile.slowest, reverse=True)
+            ],
+            # Likely N+1: the same statement once per row of an earlier query
+            'repeated_queries': [{'sql': shorten(sql, self.max_sql), 'count': n} for sql, n in repeated],
+        }
+        logger.warning(json.dumps(record))
+        return response
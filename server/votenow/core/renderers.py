@@ -0,0 +1,71 @@
+"""
+JSON rendering/parsing and response compression.
+
+FastJSONRenderer and FastJSONParser are drop-in replacements for DRF's JSON
+renderer and parser that use orjson when it is installed (several times
+faster on big nested payloads such as the poll lists) and fall back to the
+stdlib otherwise, or when pretty printing is asked for (browsable API,
+`indent` in the Accept header).
+
+ThresholdGZipMiddleware only compresses responses of at least
+GZIP_MIN_LENGTH bytes; below that the CPU cost buys nothing.
+"""
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+_encoder = JSONEncoder()
+
+
+def _default(obj):
+    # Decimals, lazy strings, querysets... everything DRF's encoder knows
+    return _encoder.default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Dates go through DRF's encoder too, it writes UTC as "Z" where orjson writes "+00:00"
+        rendered = orjson.dumps(
+            data, default=_default,
+            # ListField/DictField errors are keyed by index, json writes those as "0"
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+        )
+        # Same as DRF: U+2028/2029 are valid JSON but not valid JavaScript
+        return rendered.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except (orjson.JSONDecodeError, UnicodeDecodeError) as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class ThresholdGZipMiddleware(GZipMiddleware):
+    """GZip for responses of at least GZIP_MIN_LENGTH bytes, never for streams"""
+
+    def process_response(self, request, response):
+        # Streams (SSE, exports) must not be buffered; exports compress themselves
+        if response.streaming:
+            return response
+        if len(response.content) < getattr(settings, 'GZIP_MIN_LENGTH', 1024):
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,166 @@
+"""
+Read/write splitting.
+
+While a request is being served, reads go to one of DATABASE_REPLICAS
+(aliases in DATABASES) and writes go to "default", the primary. The primary
+is used for every query when:
+
+- the request is not a GET/HEAD/OPTIONS, or it already wrote something,
+- the query runs inside a transaction on the primary (it must see its writes),
+- the authenticated user wrote less than DATABASE_PRIMARY_STICKY_SECONDS ago,
+  so they see their own vote or poll right away despite replication lag,
+- it runs outside a request (background workers, management commands, shell)
+  or inside `with primary():`. Reads whose result outlives the request (the
+  results cache, bodies sent out with a version stamp ETag) use that, or a
+  lagging replica's rows would be served to everyone under the new version.
+
+Pins are kept in the DATABASE_PRIMARY_PIN_CACHE cache, which must be shared
+by all workers: a pin only one worker knows about leaves the user reading
+from a replica on the others. While it is unset, requests of authenticated
+users read from the primary and only anonymous ones go to the replicas.
+
+With no replicas configured the router sends everything to "default".
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import SimpleLazyObject
+
+PIN_KEY = 'db-primary-pin:{}'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingState:
+    def __init__(self, request=None, pinned=False):
+        self.request = request
+        self.pinned = pinned
+        self.wrote = False
+        self.user_checked = False
+
+
+_state = contextvars.ContextVar('db_routing_state', default=None)
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def sticky_seconds():
+    return getattr(settings, 'DATABASE_PRIMARY_STICKY_SECONDS', 5)
+
+
+@contextmanager
+def primary():
+    """Send every query in the block to the primary"""
+    token = _state.set(RoutingState(pinned=True))
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+def pin_cache():
+    alias = getattr(settings, 'DATABASE_PRIMARY_PIN_CACHE', None)
+    return caches[alias] if alias else None
+
+
+def pin_user(user_id):
+    """Keep the user's reads on the primary for the sticky window"""
+    cache = pin_cache()
+    if cache is not None:
+        cache.set(PIN_KEY.format(user_id), True, timeout=sticky_seconds())
+
+
+def _pinned(user):
+    if not user.is_authenticated:
+        return False
+    cache = pin_cache()
+    # Without a shared pin cache there is no telling whether they just wrote
+    return cache is None or bool(cache.get(PIN_KEY.format(user.pk)))
+
+
+def _request_user(request):
+    # Django's lazy user would query the session to resolve itself, only look
+    # at the user once DRF authenticated the request and replaced it
+    user = request.__dict__.get('user')
+    if user is None or isinstance(user, SimpleLazyObject):
+        return None
+    return user
+
+
+def _use_primary(state):
+    if state is None or state.pinned or state.wrote:
+        return True
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return True
+    if not state.user_checked and state.request is not None:
+        user = _request_user(state.request)
+        if user is not None:
+            state.user_checked = True
+            state.pinned = _pinned(user)
+    return state.pinned
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if not replicas or _use_primary(_state.get()):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        aliases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class PrimaryPinMiddleware:
+    """Tracks per request whether the primary must be used and pins writers to it"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RoutingState(request, pinned=request.method not in SAFE_METHODS)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state = RoutingState(request, pinned=request.method not in SAFE_METHODS)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(request, response, state)
+
+    def finish(self, request, response, state):
+        wrote = state.wrote or (request.method not in SAFE_METHODS and response.status_code < 400)
+        user = _request_user(request)
+        if wrote and user is not None and user.is_authenticated and get_replicas():
+            pin_user(user.pk)
+        return response
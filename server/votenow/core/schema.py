@@ -0,0 +1,174 @@
+"""
+Prebuilt OpenAPI document.
+
+Walking every URL, serializer and inspector to build the schema is slow
+and pulls in the whole drf_yasg generator, so it is done once at
+build/deploy time:
+
+    python manage.py build_api_schema
+
+which writes API_SCHEMA_DIR/openapi.json and openapi.yaml. The views below
+serve those bytes as they are, with a strong ETag (sha256 of the file), and
+the Swagger/ReDoc pages only render their HTML shell pointing at them.
+Clients accepting gzip get a copy compressed once per file version, with
+its own strong ETag; GZipMiddleware leaves it alone (it would compress on
+every request and weaken the ETag, so If-None-Match could never match). The
+generator is only imported by build_schema(); if the files are missing (dev
+checkouts) the first request builds the document in memory instead.
+"""
+import gzip
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.middleware.gzip import re_accepts_gzip
+from django.views.decorators.http import condition, require_safe
+from django.views.decorators.vary import vary_on_headers
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    # name: (file name, content type)
+    'json': ('openapi.json', 'application/json'),
+    'yaml': ('openapi.yaml', 'application/yaml'),
+}
+
+INFO = dict(
+    title="Voting System API",
+    default_version='v1',
+    description="API documentation for the Polling System project.\n\n"
+                "This includes endpoints for user registration/login, polls, votes, "
+                "banners, and admin dashboard analytics.",
+    terms_of_service="https://www.example.com/terms/",
+    contact={'email': "contact@votenow.com"},
+    license={'name': "BSD License"},
+)
+
+_documents = {}
+_lock = threading.Lock()
+
+
+def get_info():
+    from drf_yasg import openapi
+
+    info = dict(INFO)
+    info['contact'] = openapi.Contact(**info['contact'])
+    info['license'] = openapi.License(**info['license'])
+    return openapi.Info(**info)
+
+
+def schema_dir():
+    return Path(getattr(settings, 'API_SCHEMA_DIR', settings.BASE_DIR / 'schema'))
+
+
+def build_schema():
+    """Generate the document, returns {format: bytes}"""
+    # The generator imports every inspector, keep it out of the request path
+    from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    generator = OpenAPISchemaGenerator(get_info(), version=INFO['default_version'])
+    schema = generator.get_schema(request=None, public=True)
+    return {
+        'json': OpenAPICodecJson(validators=[]).encode(schema),
+        'yaml': OpenAPICodecYaml(validators=[]).encode(schema),
+    }
+
+
+def write_schema(directory=None):
+    """Build the document and write it to disk, returns the written paths"""
+    directory = Path(directory or schema_dir())
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for fmt, content in build_schema().items():
+        path = directory / FORMATS[fmt][0]
+        # Write then rename so running servers never read half a file
+        tmp = path.with_suffix(path.suffix + '.tmp')
+        tmp.write_bytes(content)
+        tmp.replace(path)
+        paths.append(path)
+    return paths
+
+
+def _etag(content):
+    return '"%s"' % hashlib.sha256(content).hexdigest()[:32]
+
+
+def _representations(content):
+    # mtime=0 keeps the compressed bytes, and so the ETag, the same in every worker
+    compressed = gzip.compress(content, mtime=0)
+    return {
+        'identity': (content, _etag(content)),
+        'gzip': (compressed, _etag(compressed)),
+    }
+
+
+def load_document(fmt, encoding='identity'):
+    """(bytes, etag) of the prebuilt document, reread when the file changes"""
+    path = schema_dir() / FORMATS[fmt][0]
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+
+    with _lock:
+        cached = _documents.get(fmt)
+        if cached and cached[0] == (path, mtime):
+            return cached[1][encoding]
+
+        if mtime is not None:
+            content = path.read_bytes()
+        else:
+            logger.warning("%s is missing, building the API schema in process (run build_api_schema)", path)
+            built = build_schema()
+            content = built[fmt]
+        _documents[fmt] = ((path, mtime), _representations(content))
+        return _documents[fmt][1][encoding]
+
+
+def clear():
+    with _lock:
+        _documents.clear()
+
+
+def _encoding(request):
+    return 'gzip' if re_accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')) else 'identity'
+
+
+def schema_view(fmt):
+    content_type = FORMATS[fmt][1]
+
+    @require_safe
+    @vary_on_headers('Accept-Encoding')
+    @condition(etag_func=lambda request: load_document(fmt, _encoding(request))[1])
+    def view(request):
+        encoding = _encoding(request)
+        content, _ = load_document(fmt, encoding)
+        response = HttpResponse(content, content_type=content_type)
+        if encoding == 'gzip':
+            response['Content-Encoding'] = 'gzip'
+        # Clients may keep it but must revalidate, a deploy can change it any time
+        response['Cache-Control'] = 'public, no-cache'
+        return response
+
+    return view
+
+
+def docs_view(ui):
+    """Swagger UI or ReDoc page loading the prebuilt document"""
+
+    @require_safe
+    def view(request):
+        from drf_yasg import openapi
+        from drf_yasg.renderers import ReDocRenderer, SwaggerUIRenderer
+
+        renderer = SwaggerUIRenderer() if ui == 'swagger' else ReDocRenderer()
+        # Only the title and version are read from it, the page fetches SPEC_URL
+        shell = openapi.Swagger(info=get_info(), _prefix='/', paths=openapi.Paths(paths={}))
+        html = renderer.render(shell, renderer_context={'request': request})
+        return HttpResponse(html, content_type='text/html; charset=utf-8')
+
+    return view
@@ -29,12 +29,17 @@ INSTALLED_APPS = [
     "banners",
     "dashboard",
     "drf_yasg",
-    "admin_management"
+    "admin_management",
+    "core",  # management commands only
 ]
 
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",  # <-- Must be first
+    "core.metrics.MetricsMiddleware",
+    "core.profiling.RequestProfileMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "core.renderers.ThresholdGZipMiddleware",
+    "core.routers.PrimaryPinMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -45,6 +50,8 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = "core.urls"
 
+TEST_RUNNER = "core.test_runner.TestRunner"
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -62,15 +69,91 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "core.wsgi.application"
+ASGI_APPLICATION = "core.asgi.application"
 
 # Database
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+    },
+    # Local stand-in for a read replica: copy db.sqlite3 here and add "replica"
+    # to DATABASE_REPLICAS. Point it at a real replica in production.
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db.replica.sqlite3",
+    },
+}
+
+# Per-request SQL/timing profile, see core/profiling.py. Logs slow requests and
+# repeated statements (likely N+1) as JSON lines on the "core.profiling" logger
+# and, with REQUEST_PROFILING_SERVER_TIMING, adds a Server-Timing header.
+REQUEST_PROFILING = True
+REQUEST_PROFILING_SLOW_MS = 1000
+REQUEST_PROFILING_REPEAT_THRESHOLD = 5
+REQUEST_PROFILING_SLOWEST = 3
+REQUEST_PROFILING_MAX_SQL = 1000  # characters of a logged statement
+REQUEST_PROFILING_SERVER_TIMING = False  # exposes SQL counts/timings to clients
+
+# Read/write splitting, see core/routers.py. Reads made while serving a request
+# go to one of DATABASE_REPLICAS, everything else to "default". Users who just
+# wrote read from the primary for DATABASE_PRIMARY_STICKY_SECONDS.
+DATABASE_ROUTERS = ["core.routers.ReplicaRouter"]
+DATABASE_REPLICAS = []
+DATABASE_PRIMARY_STICKY_SECONDS = 5
+# Cache alias for those pins. Must be shared by all workers; while unset,
+# authenticated users always read from the primary.
+DATABASE_PRIMARY_PIN_CACHE = None
+
+# Cache (local memory by default, point at redis/memcached in production)
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "votenow",
     }
 }
 
+# Cache alias for JWT claim revocation markers, see users/authentication.py.
+# Must be shared by all workers and never evict entries (e.g. Redis with
+# maxmemory-policy noeviction); while unset every request loads the user row.
+AUTH_REVOCATION_CACHE = None
+
+# Poll results cache, see polls/cache.py
+POLL_RESULTS_CACHE_ALIAS = "default"
+POLL_RESULTS_CACHE_TIMEOUT = 300
+
+# ETag/Last-Modified version stamps live in the results cache, see
+# polls/stamps.py. They are only sent from a per-process LocMemCache when
+# this is on, i.e. when a single process serves every request.
+POLL_STAMPS_ALLOW_LOCAL_CACHE = False
+
+# Live results stream, see polls/live.py. Swap the broker for a shared one when
+# running more than one ASGI worker.
+POLL_LIVE_BROKER = "polls.live.LocalBroker"
+POLL_LIVE_TICK = 1.0  # seconds, at most one update per poll per tick
+
+# Admin overview stats snapshot, see admin_management/stats.py
+ADMIN_STATS_TTL = 10  # seconds before a background refresh kicks in
+ADMIN_STATS_MAX_STALE = 120  # seconds a snapshot may be served at all
+
+# Write-behind vote ingestion, see polls/ingest.py. When on, votes are answered
+# with 202 and inserted in micro-batches by a background writer.
+VOTE_INGEST_BATCHED = False
+VOTE_INGEST_QUEUE_SIZE = 10000
+VOTE_INGEST_BATCH_SIZE = 500
+VOTE_INGEST_FLUSH_INTERVAL = 0.05  # seconds to wait for a batch to fill up
+VOTE_INGEST_ENQUEUE_TIMEOUT = 0.5  # seconds to block on a full queue before answering 503
+
+# Async login/registration, see users/hashing.py. Password hashing runs in a
+# bounded thread pool; past AUTH_HASH_MAX_PENDING queued hashes the views answer 503.
+AUTH_ASYNC_VIEWS = True
+AUTH_HASH_WORKERS = None  # defaults to the number of cores
+AUTH_HASH_MAX_PENDING = None  # defaults to 4 per worker
+
+# Background bulk deletes, see admin_management/jobs.py
+DELETE_JOB_CHUNK_SIZE = 1000  # votes deleted per transaction
+DELETE_JOB_STALE_AFTER = 300  # seconds without progress before a job counts as interrupted
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",},
@@ -93,13 +176,32 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # DRF + JWT settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.RoleClaimsAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # orjson when installed, see core/renderers.py
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'core.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
+# Responses smaller than this are sent uncompressed (core/renderers.py)
+GZIP_MIN_LENGTH = 1024
+
+# Prebuilt OpenAPI document, see core/schema.py. Written by
+# `manage.py build_api_schema`; the docs pages load it instead of introspecting.
+API_SCHEMA_DIR = BASE_DIR / "schema"
+SWAGGER_SETTINGS = {'SPEC_URL': 'schema-json'}
+REDOC_SETTINGS = {'SPEC_URL': 'schema-json'}
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
@@ -0,0 +1,28 @@
+import logging
+
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Keeps the per-request profile lines (core/profiling.py) out of the test
+    output: fixtures and password hashing make plenty of requests "slow".
+    Same for the warning that openapi.yaml was not built (core/schema.py),
+    checkouts running the tests have not run build_api_schema.
+    Tests that check them use assertLogs, which lowers the level again.
+    """
+
+    quiet_loggers = ('core.profiling', 'core.schema')
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._levels = {}
+        for name in self.quiet_loggers:
+            logger = logging.getLogger(name)
+            self._levels[name] = logger.level
+            logger.setLevel(logging.ERROR)
+
+    def teardown_test_environment(self, **kwargs):
+        for name, level in self._levels.items():
+            logging.getLogger(name).setLevel(level)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,418 @@
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipIf
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache, caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import transaction
+from django.http import HttpResponse
+from django.core.management.base import CommandError
+from django.test import LiveServerTestCase, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from polls import stamps
+from polls.models import Poll, PollOption
+from users.models import User
+from . import metrics, routers, schema
+from .profiling import RequestProfileMiddleware, shorten
+from .loadtest import LoadTestError, parse_mix, percentile
+
+
+class PrebuiltSchemaTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.directory = Path(directory)
+        settings_override = override_settings(API_SCHEMA_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        schema.clear()
+        self.addCleanup(schema.clear)
+
+    def test_command_writes_json_and_yaml(self):
+        call_command('build_api_schema', stdout=StringIO())
+
+        document = json.loads((self.directory / 'openapi.json').read_bytes())
+        self.assertEqual(document['info']['title'], "Voting System API")
+        self.assertEqual(document['basePath'], '/api')
+        self.assertIn('/polls/', document['paths'])
+        self.assertTrue((self.directory / 'openapi.yaml').exists())
+
+    def test_serves_prebuilt_bytes_without_generating(self):
+        (self.directory / 'openapi.json').write_bytes(b'{"swagger": "2.0"}')
+
+        with mock.patch('core.schema.build_schema') as build:
+            response = self.client.get(reverse('schema-json'))
+
+        build.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'{"swagger": "2.0"}')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertFalse(response['ETag'].startswith('W/'))
+
+    def test_matching_etag_gets_304(self):
+        call_command('build_api_schema', stdout=StringIO())
+        etag = self.client.get(reverse('schema-json'))['ETag']
+
+        response = self.client.get(reverse('schema-json'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_gzip_keeps_a_strong_etag(self):
+        call_command('build_api_schema', stdout=StringIO())
+        plain = self.client.get(reverse('schema-json'))
+
+        response = self.client.get(reverse('schema-json'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertFalse(response['ETag'].startswith('W/'))
+        self.assertNotEqual(response['ETag'], plain['ETag'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        again = self.client.get(reverse('schema-json'), HTTP_ACCEPT_ENCODING='gzip, deflate',
+                                HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        # The compressed copy's tag does not validate the plain one
+        plain_again = self.client.get(reverse('schema-json'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(plain_again.status_code, 200)
+
+    def test_rebuilt_document_changes_etag(self):
+        path = self.directory / 'openapi.json'
+        path.write_bytes(b'{"v": 1}')
+        first = self.client.get(reverse('schema-json'))['ETag']
+
+        path.write_bytes(b'{"v": 22}')
+        response = self.client.get(reverse('schema-json'), HTTP_IF_NONE_MATCH=first)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first)
+
+    def test_missing_file_is_built_in_memory_once(self):
+        with mock.patch('core.schema.build_schema', wraps=schema.build_schema) as build:
+            self.client.get(reverse('schema-yaml'))
+            response = self.client.get(reverse('schema-yaml'))
+
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Voting System API', response.content)
+
+    def test_docs_pages_point_at_prebuilt_document(self):
+        with mock.patch('core.schema.build_schema') as build:
+            for name in ('schema-swagger-ui', 'schema-redoc'):
+                response = self.client.get(reverse(name))
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, reverse('schema-json'))
+        build.assert_not_called()
+
+
+PIN_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'votenow'},
+    'pins': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pins'},
+}
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], CACHES=PIN_CACHES, DATABASE_PRIMARY_PIN_CACHE='pins')
+class ReplicaRouterTests(TransactionTestCase):
+    # Two separate SQLite databases: rows written to the primary never show up
+    # on the "replica", so every read tells where it was routed. Not a TestCase,
+    # its transaction would keep every read on the primary.
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        caches['pins'].clear()
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.voter = User.objects.create_user(username='voter', password='pass', role='user')
+        self.poll = Poll.objects.create(title='Best fruit', description='Pick one', category='food', created_by=self.admin)
+        self.apple = PollOption.objects.create(poll=self.poll, option_text='Apple')
+        self.client = APIClient()
+        self.client.force_authenticate(self.voter)
+
+    def poll_titles(self, client=None):
+        response = (client or self.client).get(reverse('poll-list'))
+        self.assertEqual(response.status_code, 200)
+        return [poll['title'] for poll in response.json()]
+
+    def test_request_reads_go_to_replica(self):
+        self.assertEqual(self.poll_titles(), [])
+
+    def test_writer_sticks_to_primary(self):
+        response = self.client.post(reverse('poll-vote', args=[self.poll.id]), {'option': self.apple.id, 'poll': self.poll.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.poll_titles(), ['Best fruit'])
+
+        other = APIClient()
+        other.force_authenticate(self.admin)
+        self.assertEqual(self.poll_titles(other), [])
+
+    def test_pin_expires(self):
+        routers.pin_user(self.voter.pk)
+        self.assertEqual(self.poll_titles(), ['Best fruit'])
+
+        caches['pins'].delete(routers.PIN_KEY.format(self.voter.pk))
+        self.assertEqual(self.poll_titles(), [])
+
+    @override_settings(DATABASE_PRIMARY_PIN_CACHE=None)
+    def test_without_pin_cache_users_read_from_primary(self):
+        self.assertEqual(self.poll_titles(), ['Best fruit'])
+        self.assertEqual(self.poll_titles(APIClient()), [])
+
+    def test_results_cache_is_filled_from_primary(self):
+        response = self.client.post(reverse('poll-vote', args=[self.poll.id]), {'option': self.apple.id, 'poll': self.poll.id})
+        self.assertEqual(response.status_code, 201)
+        # Results skip authentication, so no pin applies; whoever fills the cache reads the primary
+        later = stamps._now() + 10_000_000
+        for client in (APIClient(), self.client):
+            # Past the sticky window, so only the results cache decides where it reads
+            with mock.patch('polls.stamps._now', return_value=later):
+                response = client.get(reverse('poll-results', args=[self.poll.id]))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['options'][0]['votes_count'], 1)
+
+    @override_settings(POLL_STAMPS_ALLOW_LOCAL_CACHE=True)
+    def test_stamped_bodies_right_after_a_change_come_from_primary(self):
+        anonymous = APIClient()
+        url = reverse('poll-detail', args=[self.poll.id])
+        # The poll was just created, its stamp is newer than the sticky window
+        self.assertEqual(anonymous.get(url).status_code, 200)
+
+        later = stamps.get_stamp(stamps.poll_key(self.poll.id)) + 10_000_000
+        with mock.patch('polls.stamps._now', return_value=later):
+            self.assertEqual(anonymous.get(url).status_code, 404)
+
+    def test_unsafe_requests_read_from_primary(self):
+        response = self.client.post(reverse('poll-vote', args=[self.poll.id]), {'option': self.apple.id, 'poll': self.poll.id})
+        # The poll and option were found, so they were read from the primary
+        self.assertEqual(response.status_code, 201)
+
+    def test_outside_requests_and_transactions_use_primary(self):
+        router = routers.ReplicaRouter()
+        self.assertEqual(router.db_for_read(Poll), 'default')
+
+        token = routers._state.set(routers.RoutingState())
+        try:
+            self.assertEqual(router.db_for_read(Poll), 'replica')
+            with routers.primary():
+                self.assertEqual(router.db_for_read(Poll), 'default')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Poll), 'default')
+            self.assertEqual(router.db_for_write(Poll), 'default')
+        finally:
+            routers._state.reset(token)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_means_primary(self):
+        self.assertEqual(self.poll_titles(), ['Best fruit'])
+
+
+class LoadTestHelperTests(SimpleTestCase):
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix('vote=1, list=4,results'), {'vote': 1.0, 'list': 4.0, 'results': 1.0})
+        for bad in ('banners=1', 'vote=x', 'vote=-1', 'vote=0'):
+            with self.assertRaises(LoadTestError):
+                parse_mix(bad)
+
+    def test_percentile_is_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertIsNone(percentile([], 50))
+
+
+class LoadTestCommandTests(LiveServerTestCase):
+    def test_reports_every_endpoint_and_cleans_up(self):
+        output = Path(tempfile.mkdtemp()) / 'report.json'
+        self.addCleanup(shutil.rmtree, output.parent, ignore_errors=True)
+
+        call_command('loadtest', url=self.live_server_url, users=2, polls=2, requests=40,
+                     mix='vote=1,list=1,detail=1,results=1', seed=1, output=str(output), stderr=StringIO())
+
+        report = json.loads(output.read_text())
+        self.assertEqual(report['signed_up_users'], 2)
+        self.assertEqual(report['total']['requests'], 40)
+        self.assertEqual(report['total']['errors'], 0)
+        for endpoint in ('register', 'login', 'vote', 'list', 'detail', 'results'):
+            self.assertIn(endpoint, report['endpoints'])
+            self.assertEqual(set(report['endpoints'][endpoint]['latency_ms']), {'mean', 'p50', 'p95', 'p99', 'max'})
+        self.assertFalse(User.objects.filter(username__startswith='loadtest-').exists())
+        self.assertFalse(Poll.objects.exists())
+
+    def test_rejects_unknown_mix(self):
+        with self.assertRaises(CommandError):
+            call_command('loadtest', url=self.live_server_url, mix='banners=1')
+
+
+class RequestProfileTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.polls = [
+            Poll.objects.create(title=f'Poll {i}', description='Pick one', category='food', created_by=self.admin)
+            for i in range(6)
+        ]
+        self.request = RequestFactory().get('/api/polls/')
+
+    @override_settings(REQUEST_PROFILING_SERVER_TIMING=True)
+    def test_server_timing_counts_queries(self):
+        response = self.client.get(reverse('poll-list'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", app;dur=[\d.]+, total;dur=[\d.]+$')
+
+        def view(request):
+            list(Poll.objects.all())
+            Poll.objects.count()
+            return HttpResponse()
+
+        response = RequestProfileMiddleware(view)(self.request)
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+
+    def test_server_timing_is_off_by_default(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('poll-list')))
+
+    def test_logged_sql_is_shortened(self):
+        ids = [poll.pk for poll in self.polls]
+        sql = Poll.objects.filter(pk__in=ids).values('pk').query.sql_with_params()[0]
+        self.assertIn('IN (...)', shorten(sql, 1000))
+        self.assertNotIn('%s, %s', shorten(sql, 1000))
+        self.assertEqual(shorten('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)', 1000),
+                         'INSERT INTO t (a, b) VALUES (%s, %s), ...')
+        self.assertEqual(shorten('SELECT ' + 'x' * 50, 20), 'SELECT xxxxxxxxxxxxx...')
+
+    def test_repeated_queries_are_flagged(self):
+        def view(request):
+            # One query per poll, the classic N+1
+            for poll in Poll.objects.all():
+                poll.options.count()
+            return HttpResponse()
+
+        with self.assertLogs('core.profiling', 'WARNING') as logs:
+            RequestProfileMiddleware(view)(self.request)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['event'], 'repeated_queries')
+        self.assertEqual(record['queries'], 7)
+        self.assertEqual(len(record['repeated_queries']), 1)
+        self.assertEqual(record['repeated_queries'][0]['count'], 6)
+        self.assertIn('polls_polloption', record['repeated_queries'][0]['sql'])
+
+    def test_fast_requests_are_not_logged(self):
+        def view(request):
+            list(Poll.objects.all())
+            return HttpResponse()
+
+        with mock.patch('core.profiling.logger') as logger:
+            RequestProfileMiddleware(view)(self.request)
+        logger.warning.assert_not_called()
+
+    @override_settings(REQUEST_PROFILING_SLOW_MS=0, REQUEST_PROFILING_SLOWEST=2)
+    def test_slow_requests_log_slowest_statements(self):
+        def view(request):
+            for poll in self.polls[:3]:
+                Poll.objects.filter(pk=poll.pk).exists()
+            return HttpResponse(status=201)
+
+        with self.assertLogs('core.profiling', 'WARNING') as logs:
+            RequestProfileMiddleware(view)(self.request)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['event'], 'slow_request')
+        self.assertEqual((record['path'], record['route'], record['status']), ('/api/polls/', 'poll-list', 201))
+        self.assertEqual(record['queries'], 3)
+        self.assertEqual(len(record['slowest_queries']), 2)
+        self.assertEqual(record['repeated_queries'], [])
+
+    @override_settings(REQUEST_PROFILING_SERVER_TIMING=True)
+    def test_async_views_are_profiled(self):
+        async def view(request):
+            await sync_to_async(lambda: list(Poll.objects.all()))()
+            await Poll.objects.acount()
+            return HttpResponse()
+
+        async def call():
+            return await RequestProfileMiddleware(view)(self.request)
+
+        response = async_to_sync(call)()
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+
+    @override_settings(REQUEST_PROFILING=False)
+    def test_can_be_turned_off(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            RequestProfileMiddleware(lambda request: HttpResponse())
+
+
+# Logins authenticate on the hashing pool's own db connections, which only see committed rows
+@skipIf(metrics.prometheus_client is None, 'prometheus_client is not installed')
+class MetricsTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.voter = User.objects.create_user(username='voter', password='pass', role='user')
+        self.poll = Poll.objects.create(title='Best fruit', description='Pick one', category='food', created_by=self.admin)
+        self.apple = PollOption.objects.create(poll=self.poll, option_text='Apple')
+
+    def sample(self, name, **labels):
+        return metrics.prometheus_client.REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requests_are_counted_per_url_name(self):
+        before = self.sample('http_requests_total', view='poll-list', method='GET', status='200')
+        observed = self.sample('http_request_duration_seconds_count', view='poll-list', method='GET')
+        unmatched = self.sample('http_requests_total', view='<unmatched>', method='GET', status='404')
+
+        self.client.get(reverse('poll-list'))
+        self.client.get('/no/such/page/')
+
+        self.assertEqual(self.sample('http_requests_total', view='poll-list', method='GET', status='200'), before + 1)
+        self.assertEqual(self.sample('http_request_duration_seconds_count', view='poll-list', method='GET'), observed + 1)
+        self.assertEqual(self.sample('http_requests_total', view='<unmatched>', method='GET', status='404'), unmatched + 1)
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertContains(response, 'http_request_duration_seconds_bucket{le="0.005",method="GET",view="poll-list"}')
+
+    def test_votes_are_counted(self):
+        accepted = self.sample('votes_accepted_total', mode='stored')
+        duplicates = self.sample('votes_duplicate_rejected_total')
+        client = APIClient()
+        client.force_authenticate(self.voter)
+
+        url = reverse('poll-vote', args=[self.poll.id])
+        self.assertEqual(client.post(url, {'option': self.apple.id, 'poll': self.poll.id}).status_code, 201)
+        self.assertEqual(client.post(url, {'option': self.apple.id, 'poll': self.poll.id}).status_code, 400)
+
+        self.assertEqual(self.sample('votes_accepted_total', mode='stored'), accepted + 1)
+        self.assertEqual(self.sample('votes_duplicate_rejected_total'), duplicates + 1)
+
+    def test_logins_are_counted(self):
+        success = self.sample('logins_total', result='success')
+        failure = self.sample('logins_total', result='failure')
+        url = reverse('login')
+
+        self.client.post(url, {'username': 'voter', 'password': 'pass'}, content_type='application/json')
+        self.client.post(url, {'username': 'voter', 'password': 'wrong'}, content_type='application/json')
+
+        self.assertEqual(self.sample('logins_total', result='success'), success + 1)
+        self.assertEqual(self.sample('logins_total', result='failure'), failure + 1)
+
+    def test_multiprocess_samples_are_added_up(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': directory, 'DJANGO_SETTINGS_MODULE': 'core.settings'}
+        for votes in (3, 4):
+            # Two "workers", each with its own files in the shared directory
+            subprocess.run(
+                [sys.executable, '-c',
+                 'import django; django.setup(); from core.metrics import VOTES_ACCEPTED; '
+                 f'VOTES_ACCEPTED.labels("queued").inc({votes})'],
+                env=env, cwd=str(Path(__file__).resolve().parent.parent), check=True,
+            )
+
+        with mock.patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': directory}):
+            response = self.client.get(reverse('metrics'))
+        self.assertContains(response, 'votes_accepted_total{mode="queued"} 7.0')
@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from dashboard.aggregation import poll_activity
+from polls import rollups
+from polls.models import Poll, PollOption, Vote
+from users.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Latency of the poll stats aggregation as options and votes scale. Synthetic "
+        "data is written inside a transaction that is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--options', default='2,10,50', help='Comma separated option counts')
+        parser.add_argument('--votes', default='1000,10000,50000', help='Comma separated vote counts')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per point')
+
+    def handle(self, *args, **options):
+        option_counts = [int(n) for n in options['options'].split(',')]
+        vote_counts = [int(n) for n in options['votes'].split(',')]
+
+        try:
+            with transaction.atomic():
+                self.run(option_counts, vote_counts, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, option_counts, vote_counts, repeat):
+        User.objects.bulk_create(
+            User(username=f"bench-stats-{i}", password='!', role='user') for i in range(max(vote_counts))
+        )
+        user_ids = list(User.objects.filter(username__startswith='bench-stats-').values_list('id', flat=True))
+        now = timezone.now()
+
+        self.stdout.write(f"{'options':>8} {'votes':>8} {'queries':>8} {'p50 ms':>8} {'max ms':>8}")
+        for n_options in option_counts:
+            for n_votes in vote_counts:
+                poll = Poll.objects.create(title='bench', description='', category='bench', created_by_id=user_ids[0])
+                option_ids = [o.id for o in PollOption.objects.bulk_create(
+                    PollOption(poll=poll, option_text=f"Option {i}") for i in range(n_options)
+                )]
+                Vote.objects.bulk_create(
+                    (Vote(poll=poll, option_id=option_ids[i % n_options], voted_by_id=user_ids[i])
+                     for i in range(n_votes)),
+                    batch_size=1000,
+                )
+                rollups.rebuild([poll.id])
+
+                timings = []
+                for _ in range(repeat):
+                    with CaptureQueriesContext(connection) as ctx:
+                        start = time.perf_counter()
+                        poll_activity(poll, now)
+                        timings.append((time.perf_counter() - start) * 1000)
+                timings.sort()
+                self.stdout.write(
+                    f"{n_options:>8} {n_votes:>8} {len(ctx.captured_queries):>8} "
+                    f"{timings[len(timings) // 2]:>8.2f} {timings[-1]:>8.2f}"
+                )
@@ -5,6 +5,12 @@ class OptionStatsSerializer(serializers.Serializer):
     option_id  = serializers.IntegerField()
     option_text = serializers.CharField() 
     votes_count = serializers.IntegerField() 
+    recent_votes = serializers.IntegerField()
+
+
+class BucketSerializer(serializers.Serializer):
+    start = serializers.DateTimeField()
+    votes = serializers.IntegerField()
 
 
 class PollStatsSerializer(serializers.Serializer) : 
@@ -12,7 +18,10 @@ class PollStatsSerializer(serializers.Serializer) :
     poll_title  = serializers.CharField() 
     total_votes = serializers.IntegerField() 
     options = OptionStatsSerializer(many = True) 
-    votes_last_3_hours = serializers.ListField(child= serializers.IntegerField())
+    granularity = serializers.CharField()
+    window = serializers.IntegerField()
+    buckets = BucketSerializer(many=True)
+    votes_last_3_hours = serializers.ListField(child= serializers.IntegerField(), required=False)
     predicted_winner = serializers.DictField(allow_null = True)
 
 
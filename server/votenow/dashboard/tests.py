@@ -1,3 +1,140 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from users.models import User
+from polls.counters import record_vote
+from polls.models import Poll, PollOption, Vote, VoteRollup
+from polls.rollups import bucket_start
+
+
+class VoteRollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.voters = [User.objects.create_user(username=f'voter{i}', password='pass', role='user') for i in range(3)]
+        self.poll = Poll.objects.create(title='Best fruit', description='', category='food', created_by=self.admin)
+        self.apple = PollOption.objects.create(poll=self.poll, option_text='Apple')
+        self.client = APIClient()
+
+    def vote(self, user):
+        self.client.force_authenticate(user)
+        return self.client.post(reverse('poll-vote', args=[self.poll.id]), {'option': self.apple.id, 'poll': self.poll.id})
+
+    def test_votes_are_rolled_up(self):
+        for voter in self.voters:
+            self.vote(voter)
+        hour = VoteRollup.objects.get(poll=self.poll, granularity=VoteRollup.HOUR)
+        day = VoteRollup.objects.get(poll=self.poll, granularity=VoteRollup.DAY)
+        self.assertEqual((hour.count, day.count), (3, 3))
+        self.assertEqual(hour.bucket_start.minute, 0)
+        self.assertEqual(day.bucket_start.hour, 0)
+
+    def test_deleted_votes_leave_rollups(self):
+        self.vote(self.voters[0])
+        self.client.force_authenticate(self.admin)
+        self.client.delete(reverse('admin-vote-delete', args=[Vote.objects.get().id]))
+        self.assertEqual(set(VoteRollup.objects.values_list('count', flat=True)), {0})
+
+    def test_dashboard_reads_backfilled_rollups(self):
+        now = timezone.now()
+        for days_ago, voter in zip((1, 1, 3), self.voters):
+            vote = Vote.objects.create(poll=self.poll, option=self.apple, voted_by=voter)
+            Vote.objects.filter(id=vote.id).update(voted_at=now - timedelta(days=days_ago))
+        call_command('backfill_vote_rollups', stdout=StringIO())
+
+        self.client.force_authenticate(self.admin)
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('admin-dashboard'))
+        self.assertEqual(response.data['votes_last_7_days'], [0, 0, 0, 0, 1, 0, 2])
+
+    def test_poll_stats_hourly_buckets(self):
+        self.vote(self.voters[0])
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse('pool-stats', args=[self.poll.id]))
+        self.assertEqual(response.data['votes_last_3_hours'], [0, 0, 1])
+
+
+class PollStatsAggregationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.poll = Poll.objects.create(title='Big poll', description='', category='misc', created_by=self.admin)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def make_options(self, n):
+        return PollOption.objects.bulk_create(
+            PollOption(poll=self.poll, option_text=f'Option {i}') for i in range(n)
+        )
+
+    def test_query_count_does_not_grow_with_options(self):
+        options = self.make_options(20)
+        voter = User.objects.create_user(username='voter', password='pass', role='user')
+        record_vote(Vote.objects.create(poll=self.poll, option=options[7], voted_by=voter))
+
+        # poll, options, recent votes per option, hourly rollups, sliding hours for votes_last_3_hours
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('pool-stats', args=[self.poll.id]))
+        self.assertEqual(len(response.data['options']), 20)
+        self.assertEqual(response.data['votes_last_3_hours'], [0, 0, 1])
+        self.assertEqual(response.data['predicted_winner']['option_id'], options[7].id)
+
+    def test_configurable_window(self):
+        options = self.make_options(2)
+        voter = User.objects.create_user(username='voter', password='pass', role='user')
+        record_vote(Vote.objects.create(poll=self.poll, option=options[1], voted_by=voter))
+
+        response = self.client.get(reverse('pool-stats', args=[self.poll.id]), {'granularity': 'minute', 'window': 30})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['buckets']), 30)
+        self.assertEqual(sum(b['votes'] for b in response.data['buckets']), 1)
+        self.assertEqual(response.data['options'][1]['recent_votes'], 1)
+        self.assertNotIn('votes_last_3_hours', response.data)
+
+    def test_hour_and_day_buckets_come_from_rollups(self):
+        self.make_options(2)
+        now = timezone.now()
+        # Older votes only exist as rollups, e.g. after an archive of the vote table
+        VoteRollup.objects.create(poll=self.poll, granularity=VoteRollup.HOUR,
+                                  bucket_start=bucket_start(now - timedelta(hours=2), VoteRollup.HOUR), count=5)
+        VoteRollup.objects.create(poll=self.poll, granularity=VoteRollup.DAY,
+                                  bucket_start=bucket_start(now - timedelta(days=1), VoteRollup.DAY), count=7)
+
+        url = reverse('pool-stats', args=[self.poll.id])
+        self.assertEqual([b['votes'] for b in self.client.get(url).data['buckets']], [5, 0, 0])
+        response = self.client.get(url, {'granularity': 'day', 'window': 2})
+        self.assertEqual([b['votes'] for b in response.data['buckets']], [7, 0])
+
+    def test_default_stats_use_sliding_hours(self):
+        options = self.make_options(2)
+        voters = [User.objects.create_user(username=f'voter{i}', password='pass', role='user') for i in range(3)]
+        now = timezone.now().replace(minute=5)
+        # 2h50m ago is in the last 3 hours but before the first clock-aligned bucket (2h05m ago)
+        for voter, option, age in ((voters[0], options[0], timedelta(minutes=170)),
+                                   (voters[1], options[0], timedelta(minutes=100)),
+                                   (voters[2], options[1], timedelta(minutes=10))):
+            vote = Vote.objects.create(poll=self.poll, option=option, voted_by=voter)
+            Vote.objects.filter(id=vote.id).update(voted_at=now - age)
+
+        url = reverse('pool-stats', args=[self.poll.id])
+        with mock.patch('dashboard.views.timezone.now', return_value=now):
+            data = self.client.get(url).data
+            other = self.client.get(url, {'window': 4}).data
+        self.assertEqual(data['votes_last_3_hours'], [1, 1, 1])
+        self.assertEqual(dict(data['predicted_winner']),
+                         {'option_id': options[0].id, 'option_text': 'Option 0', 'reason': 'highest votes in last 3 hours'})
+        self.assertEqual(other['predicted_winner']['reason'], 'highest votes in last 4 hour(s)')
 
-# Create your tests here.
+    def test_invalid_params(self):
+        url = reverse('pool-stats', args=[self.poll.id])
+        self.assertEqual(self.client.get(url, {'granularity': 'week'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'window': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'window': 0}).status_code, 400)
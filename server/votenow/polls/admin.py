@@ -1,6 +1,8 @@
 from django import forms
 from django.contrib import admin
+from django.db import transaction
 from .models import Poll, PollOption, Vote
+from .counters import record_vote, discard_votes
 
 # Inline options inside Poll for easy editing
 class PollOptionInline(admin.TabularInline):
@@ -40,6 +42,14 @@ class PollAdmin(admin.ModelAdmin):
             obj.created_by = request.user
         super().save_model(request, obj, form, change)
 
+    def save_formset(self, request, form, formset, change):
+        # Options deleted from the inline take their votes with them
+        removed = [f.instance.pk for f in formset.deleted_forms if f.instance.pk]
+        with transaction.atomic():
+            if formset.model is PollOption and removed:
+                discard_votes(Vote.objects.filter(option_id__in=removed))
+            super().save_formset(request, form, formset, change)
+
 # Custom form for Vote admin to filter options by poll
 class VoteAdminForm(forms.ModelForm):
     class Meta:
@@ -65,9 +75,37 @@ class PollOptionAdmin(admin.ModelAdmin):
     list_display = ("option_text", "poll")
     search_fields = ("option_text",)
 
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            discard_votes(Vote.objects.filter(option=obj))
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            discard_votes(Vote.objects.filter(option__in=queryset))
+            super().delete_queryset(request, queryset)
+
 @admin.register(Vote)
 class VoteAdmin(admin.ModelAdmin):
     form = VoteAdminForm
     list_display = ("voted_by", "poll", "option", "voted_at")
     list_filter = ("voted_at", "poll")
     search_fields = ("voted_by__username", "poll__title", "option__option_text")
+
+    # Keep the denormalized counters in sync with edits made from the admin site
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            if change:
+                discard_votes(Vote.objects.filter(pk=obj.pk))
+            super().save_model(request, obj, form, change)
+            record_vote(obj)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            discard_votes(Vote.objects.filter(pk=obj.pk))
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            discard_votes(queryset)
+            super().delete_queryset(request, queryset)
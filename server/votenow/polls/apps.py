@@ -5,4 +5,8 @@ class PollsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "polls"
 
-    
\ No newline at end of file
+    def ready(self):
+        # Version stamps behind the ETag/Last-Modified validators
+        from . import stamps  # noqa: F401
+        # Per-user vote and poll counters
+        from . import counters  # noqa: F401
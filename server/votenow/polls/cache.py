@@ -0,0 +1,124 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from core.routers import primary
+from .models import Poll, PollOption
+
+# Results entries are keyed by a per-poll version number. Anything that changes
+# the results bumps the version, so stale entries are simply never read again
+# and expire on their own.
+VERSION_KEY = 'poll:{poll_id}:results-version'
+RESULTS_KEY = 'poll:{poll_id}:results:v{version}'
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def get_cache():
+    return caches[getattr(settings, 'POLL_RESULTS_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'POLL_RESULTS_CACHE_TIMEOUT', 300)
+
+
+def _new_version():
+    # Used when the version key is missing (first use or evicted). A clock based
+    # value never collides with versions handed out before the eviction.
+    return time.time_ns() // 1000
+
+
+def get_results_version(poll_id):
+    cache = get_cache()
+    key = VERSION_KEY.format(poll_id=poll_id)
+    version = cache.get(key)
+    if version is None:
+        version = _new_version()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_results_version(poll_id):
+    """Invalidate the cached results of a poll"""
+    cache = get_cache()
+    key = VERSION_KEY.format(poll_id=poll_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), timeout=None)
+
+
+def results_changed(poll_id):
+    """Drop cached results, move the poll's version stamp and let live subscribers know (polls/live.py)"""
+    from .live import publish_results_changed
+    from .stamps import poll_changed
+
+    bump_results_version(poll_id)
+    poll_changed(poll_id)
+    publish_results_changed(poll_id)
+
+
+def invalidate_results(poll_id):
+    """Bump the results version once the current transaction commits"""
+    transaction.on_commit(lambda: results_changed(poll_id))
+
+
+def build_results(poll_id):
+    """Aggregate the results payload from the database, returns None for an unknown poll"""
+    title = Poll.objects.filter(id=poll_id).values_list('title', flat=True).first()
+    if title is None:
+        return None
+    options = PollOption.objects.filter(poll_id=poll_id).order_by('id').values_list('id', 'option_text', 'votes_count')
+    return {
+        "poll": title,
+        "options": [
+            {"id": option_id, "option_text": option_text, "votes_count": votes_count}
+            for option_id, option_text, votes_count in options
+        ],
+    }
+
+
+def get_results(poll_id):
+    """Return the results payload, from cache when possible"""
+    cache = get_cache()
+    key = RESULTS_KEY.format(poll_id=poll_id, version=get_results_version(poll_id))
+    data = cache.get(key)
+    if data is not None:
+        _record('hits')
+        return data
+
+    _record('misses')
+    # Cached under the current version for everyone, a lagging replica's rows must not end up there
+    with primary():
+        data = build_results(poll_id)
+    if data is not None:
+        cache.set(key, data, timeout=get_timeout())
+    return data
+
+
+def _record(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def cache_stats():
+    """Hit/miss counters of this process"""
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else None,
+    }
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats['hits'] = 0
+        _stats['misses'] = 0
@@ -0,0 +1,122 @@
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from users.models import User
+from .cache import invalidate_results
+from . import rollups
+from .models import Poll, PollOption, Vote
+
+
+def record_vote(vote):
+    """Bump the option and poll counters for a freshly saved vote"""
+    record_votes([vote])
+
+
+def record_votes(votes):
+    """Bump counters and rollups for a batch of freshly saved votes, one update per option and poll"""
+    per_option = Counter(vote.option_id for vote in votes)
+    per_poll = Counter(vote.poll_id for vote in votes)
+    for option_id, n in per_option.items():
+        PollOption.objects.filter(id=option_id).update(votes_count=F('votes_count') + n)
+    for poll_id, n in per_poll.items():
+        Poll.objects.filter(id=poll_id).update(total_votes=F('total_votes') + n)
+        invalidate_results(poll_id)
+    _bump_users('total_votes', Counter(vote.voted_by_id for vote in votes))
+    rollups.add_votes(votes)
+
+
+def record_polls(polls):
+    """Bump the creators' polls_created for polls saved without post_save (bulk_create)"""
+    _bump_users('polls_created', Counter(poll.created_by_id for poll in polls))
+
+
+def _bump_users(field, per_user, sign=1):
+    # Users mostly share the same count (one vote each), so one UPDATE per distinct count
+    by_count = defaultdict(list)
+    for user_id, n in per_user.items():
+        by_count[n].append(user_id)
+    for n, user_ids in by_count.items():
+        User.objects.filter(id__in=user_ids).update(**{field: F(field) + sign * n})
+
+
+def discard_votes(votes):
+    """
+    Decrement counters for every vote in the queryset.
+    Call this inside the same transaction, right before the votes are deleted.
+    """
+    rollups.remove_votes(votes)
+    discard_voters(votes)
+    per_option = votes.order_by().values('poll_id', 'option_id').annotate(n=Count('id'))
+    per_poll = {}
+    for row in per_option:
+        PollOption.objects.filter(id=row['option_id']).update(votes_count=F('votes_count') - row['n'])
+        per_poll[row['poll_id']] = per_poll.get(row['poll_id'], 0) + row['n']
+    for poll_id, n in per_poll.items():
+        Poll.objects.filter(id=poll_id).update(total_votes=F('total_votes') - n)
+        invalidate_results(poll_id)
+
+
+def discard_voters(votes):
+    """Decrement the voters' total_votes for every vote in the queryset"""
+    per_voter = votes.order_by().values_list('voted_by_id').annotate(n=Count('id'))
+    _bump_users('total_votes', dict(per_voter), -1)
+
+
+@receiver(post_save, sender=Poll, dispatch_uid='counters-poll-save')
+def poll_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record_polls([instance])
+
+
+@receiver(pre_delete, sender=Poll, dispatch_uid='counters-poll-delete')
+def poll_deleted(sender, instance, **kwargs):
+    # Its votes go with it in the cascade, without passing through discard_votes
+    discard_voters(Vote.objects.filter(poll=instance))
+    _bump_users('polls_created', {instance.created_by_id: 1}, -1)
+
+
+def find_drift(poll_ids=None):
+    """Compare stored counters with real vote counts, returns (polls, options) that are off"""
+    polls = Poll.objects.annotate(actual=Count('votes'))
+    options = PollOption.objects.annotate(actual=Count('votes'))
+    if poll_ids:
+        polls = polls.filter(id__in=poll_ids)
+        options = options.filter(poll_id__in=poll_ids)
+
+    bad_polls = [p for p in polls if p.total_votes != p.actual]
+    bad_options = [o for o in options if o.votes_count != o.actual]
+    return bad_polls, bad_options
+
+
+def repair(bad_polls, bad_options):
+    """Write the real counts back for the rows returned by find_drift"""
+    for poll in bad_polls:
+        poll.total_votes = poll.actual
+    for option in bad_options:
+        option.votes_count = option.actual
+    Poll.objects.bulk_update(bad_polls, ['total_votes'], batch_size=500)
+    PollOption.objects.bulk_update(bad_options, ['votes_count'], batch_size=500)
+
+
+def _count_of(model, fk):
+    return Coalesce(
+        Subquery(model.objects.filter(**{fk: OuterRef('pk')}).order_by().values(fk).annotate(c=Count('pk')).values('c')),
+        0,
+    )
+
+
+def find_user_drift():
+    """Users whose total_votes/polls_created are off, with the real counts as actual_votes/actual_polls"""
+    users = User.objects.annotate(actual_votes=_count_of(Vote, 'voted_by'), actual_polls=_count_of(Poll, 'created_by'))
+    return [u for u in users if (u.total_votes, u.polls_created) != (u.actual_votes, u.actual_polls)]
+
+
+def repair_users(bad_users):
+    """Write the real counts back for the users returned by find_user_drift"""
+    for user in bad_users:
+        user.total_votes, user.polls_created = user.actual_votes, user.actual_polls
+    User.objects.bulk_update(bad_users, ['total_votes', 'polls_created'], batch_size=500)
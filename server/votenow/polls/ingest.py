@@ -0,0 +1,244 @@
+"""
+Write-behind vote ingestion.
+
+With VOTE_INGEST_BATCHED on, VoteCreateAPIView validates the vote and hands it
+to a bounded in-process queue instead of inserting it. A single writer thread
+drains the queue and inserts micro-batches with one bulk_create per batch, so
+a burst of votes becomes a handful of short write transactions rather than one
+per request (which is what makes SQLite answer "database is locked").
+
+Duplicates are still rejected by unique_together('poll', 'voted_by'): the
+request checks the table and the not-yet-flushed votes, and the flush skips
+anything that made it into the table meanwhile. A vote another process
+inserts between that lookup and the insert fails the whole batch with an
+IntegrityError, which rolls it back and is retried with a fresh lookup, so
+the counters only ever see rows that were written.
+
+Votes whose option was deleted or whose poll was closed while they were queued
+are left out of the batch. A batch that keeps failing with an IntegrityError
+anyway (e.g. the voter was deleted) is written row by row, so only the rows
+that cannot be written are lost. Lost votes are logged and counted in
+votes_ingest_dropped_total.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, close_old_connections, connection, transaction
+
+from core.metrics import VOTES_DROPPED
+from .counters import record_votes
+from .models import PollOption, Vote
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class IngestQueueFull(Exception):
+    """The queue stayed full for longer than VOTE_INGEST_ENQUEUE_TIMEOUT"""
+
+
+class AlreadyQueued(Exception):
+    """A vote of this user for this poll is waiting to be flushed"""
+
+
+def ingest_enabled():
+    return getattr(settings, 'VOTE_INGEST_BATCHED', False)
+
+
+class VoteIngestor:
+    def __init__(self, queue_size=10000, batch_size=500, flush_interval=0.05, enqueue_timeout=0.5):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.flushed = 0
+        self.batches = 0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            queue_size=getattr(settings, 'VOTE_INGEST_QUEUE_SIZE', 10000),
+            batch_size=getattr(settings, 'VOTE_INGEST_BATCH_SIZE', 500),
+            flush_interval=getattr(settings, 'VOTE_INGEST_FLUSH_INTERVAL', 0.05),
+            enqueue_timeout=getattr(settings, 'VOTE_INGEST_ENQUEUE_TIMEOUT', 0.5),
+        )
+
+    def is_pending(self, poll_id, user_id):
+        with self._lock:
+            return (poll_id, user_id) in self._pending
+
+    def submit(self, vote):
+        """
+        Queue an unsaved Vote. Blocks while the queue is full (backpressure)
+        and raises IngestQueueFull if it does not drain in time.
+        """
+        key = (vote.poll_id, vote.voted_by_id)
+        with self._lock:
+            if key in self._pending:
+                raise AlreadyQueued
+            self._pending.add(key)
+        self.start()
+        try:
+            self.queue.put(vote, timeout=self.enqueue_timeout)
+        except queue.Full:
+            with self._lock:
+                self._pending.discard(key)
+            raise IngestQueueFull
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='vote-ingest', daemon=True)
+                    self._thread.start()
+
+    def stop(self, timeout=10):
+        """Flush everything queued so far and stop the writer"""
+        if self._thread is not None and self._thread.is_alive():
+            self.queue.put(_STOP)
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        try:
+            while True:
+                batch, stop = self._next_batch()
+                if batch:
+                    self._safe_flush(batch)
+                if stop:
+                    return
+        finally:
+            connection.close()
+
+    def _next_batch(self):
+        """Block for the first vote, then collect more for up to flush_interval"""
+        first = self.queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=max(remaining, 0)) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Whatever is still queued behind the sentinel was put there
+                # after stop(), flush it along with this batch
+                return batch + self._drain(), True
+            batch.append(item)
+        return batch, False
+
+    def _drain(self):
+        items = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                return items
+            if item is not _STOP:
+                items.append(item)
+
+    def _safe_flush(self, batch, attempts=3):
+        close_old_connections()
+        try:
+            for attempt in range(1, attempts + 1):
+                try:
+                    self.flush(batch)
+                    break
+                except IntegrityError:
+                    # Raced with a vote written elsewhere, the retry looks again
+                    if attempt == attempts:
+                        # Not a race then, but a row that can never be written
+                        self._flush_rows(batch)
+                        break
+                except OperationalError:
+                    # e.g. SQLite "database is locked" while another process writes
+                    if attempt == attempts:
+                        raise
+                    time.sleep(0.1 * attempt)
+        except Exception:
+            logger.exception("Dropped a batch of %d votes", len(batch))
+            VOTES_DROPPED.inc(len(batch))
+        finally:
+            with self._lock:
+                for vote in batch:
+                    self._pending.discard((vote.poll_id, vote.voted_by_id))
+
+    def _flush_rows(self, batch):
+        for vote in batch:
+            try:
+                self.flush([vote])
+            except Exception:
+                logger.exception("Dropped the vote of user %s for poll %s", vote.voted_by_id, vote.poll_id)
+                VOTES_DROPPED.inc()
+
+    def open_options(self, batch):
+        """(option_id, poll_id) pairs of the batch whose option exists and poll is active"""
+        return set(
+            PollOption.objects.filter(
+                id__in={v.option_id for v in batch},
+                poll__active=True,
+            ).values_list('id', 'poll_id')
+        )
+
+    def already_voted(self, batch):
+        """(poll_id, user_id) pairs of the batch that are in the table already"""
+        return set(
+            Vote.objects.filter(
+                poll_id__in={v.poll_id for v in batch},
+                voted_by_id__in={v.voted_by_id for v in batch},
+            ).values_list('poll_id', 'voted_by_id')
+        )
+
+    def flush(self, batch):
+        """Insert a batch of votes, returns the votes that were actually written"""
+        with transaction.atomic():
+            existing = self.already_voted(batch)
+            open_options = self.open_options(batch)
+            fresh = []
+            closed = 0
+            for vote in batch:
+                key = (vote.poll_id, vote.voted_by_id)
+                if (vote.option_id, vote.poll_id) not in open_options:
+                    closed += 1
+                elif key not in existing:
+                    existing.add(key)
+                    # An earlier, rolled back attempt may have set the id
+                    vote.pk = None
+                    fresh.append(vote)
+
+            # No ignore_conflicts: it would hide which rows were skipped and
+            # the counters would be bumped for votes that were never written
+            Vote.objects.bulk_create(fresh)
+            record_votes(fresh)
+
+        if closed:
+            logger.warning("Dropped %d votes for deleted options or closed polls", closed)
+            VOTES_DROPPED.inc(closed)
+
+        self.flushed += len(fresh)
+        self.batches += 1
+        return fresh
+
+
+_ingestor = None
+_ingestor_lock = threading.Lock()
+
+
+def get_ingestor():
+    global _ingestor
+    with _ingestor_lock:
+        if _ingestor is None:
+            _ingestor = VoteIngestor.from_settings()
+            atexit.register(_ingestor.stop)
+        return _ingestor
@@ -0,0 +1,324 @@
+"""
+Live poll results pushed to subscribers (SSE and WebSocket, see core/asgi.py).
+
+Vote writes publish a "poll changed" notification through a broker backend.
+Every event loop serving streams runs one ResultsHub, which coalesces those
+notifications per poll and broadcasts at most one update per tick to all of
+that poll's subscribers, instead of each client polling the results endpoint.
+A hub leaves the broker once its last subscriber is gone.
+
+The broker is pluggable through POLL_LIVE_BROKER. LocalBroker fans out inside
+the current process, which is enough for a single ASGI worker and for tests; a
+multi-process deployment needs a backend with the same publish/subscribe
+methods that goes through a shared broker (e.g. Redis pub/sub).
+"""
+import asyncio
+import contextvars
+import json
+import re
+import threading
+import weakref
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .cache import get_results
+
+STREAM_PATH = re.compile(r'^/api/polls/(?P<pk>\d+)/results/stream/$')
+
+
+class LocalBroker:
+    """In-process pub/sub fan-out"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listeners = set()
+
+    def publish(self, poll_id):
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(poll_id)
+
+    def subscribe(self, listener):
+        """Register a callable(poll_id), returns a function that removes it"""
+        with self._lock:
+            self._listeners.add(listener)
+
+        def unsubscribe():
+            with self._lock:
+                self._listeners.discard(listener)
+        return unsubscribe
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            path = getattr(settings, 'POLL_LIVE_BROKER', 'polls.live.LocalBroker')
+            _broker = import_string(path)()
+        return _broker
+
+
+def set_broker(broker):
+    """Swap the broker backend (tests, or wiring up a shared broker at startup)"""
+    global _broker
+    with _broker_lock:
+        _broker = broker
+
+
+def publish_results_changed(poll_id):
+    get_broker().publish(poll_id)
+
+
+def get_tick():
+    return getattr(settings, 'POLL_LIVE_TICK', 1.0)
+
+
+def make_delta(previous, current):
+    """
+    Build the message that turns `previous` results into `current`. A full
+    snapshot is sent when there is nothing to diff against or the option set changed.
+    """
+    if previous is None or [o['id'] for o in previous['options']] != [o['id'] for o in current['options']] \
+            or previous['poll'] != current['poll']:
+        return {"type": "snapshot", **current}
+
+    before = {o['id']: o['votes_count'] for o in previous['options']}
+    changed = {
+        o['id']: o['votes_count']
+        for o in current['options']
+        if before[o['id']] != o['votes_count']
+    }
+    if not changed:
+        return None
+    return {"type": "delta", "options": changed}
+
+
+class ResultsHub:
+    """Per event loop fan-out of coalesced result updates"""
+
+    queue_size = 16
+
+    def __init__(self, loop, broker):
+        # Weak: the hub is the value of _hubs, whose key is the loop
+        self._loop = weakref.ref(loop)
+        self.subscribers = defaultdict(set)
+        self.dirty = {}
+        self.tasks = {}
+        self.snapshots = {}
+        self.closed = False
+        self._unsubscribe = broker.subscribe(self._notify)
+
+    @property
+    def loop(self):
+        return self._loop()
+
+    def _notify(self, poll_id):
+        # Called from whichever thread committed the vote
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.mark_dirty, poll_id)
+
+    def close(self):
+        """Leave the broker, get_hub() makes a new hub for the next subscriber"""
+        if not self.closed:
+            self.closed = True
+            self._unsubscribe()
+
+    def mark_dirty(self, poll_id):
+        event = self.dirty.get(poll_id)
+        if event is not None:
+            event.set()
+
+    async def subscribe(self, poll_id):
+        if poll_id not in self.tasks:
+            self.dirty[poll_id] = asyncio.Event()
+            self.snapshots[poll_id] = self.loop.create_future()
+            # A fresh context: the task outlives the request that started it
+            # and must not keep that request's routing state (core/routers.py)
+            self.tasks[poll_id] = self.loop.create_task(self._run(poll_id), context=contextvars.Context())
+
+        snapshot = self.snapshots[poll_id]
+        if isinstance(snapshot, asyncio.Future):
+            try:
+                snapshot = await asyncio.shield(snapshot)
+            except BaseException:
+                self.unsubscribe(poll_id, None)
+                raise
+
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers[poll_id].add(queue)
+        queue.put_nowait({"type": "snapshot", **snapshot} if snapshot else {"type": "closed"})
+        return queue
+
+    def unsubscribe(self, poll_id, queue):
+        subscribers = self.subscribers.get(poll_id, set())
+        subscribers.discard(queue)
+        if not subscribers:
+            self.subscribers.pop(poll_id, None)
+            task = self.tasks.pop(poll_id, None)
+            if task:
+                task.cancel()
+            self.dirty.pop(poll_id, None)
+            self.snapshots.pop(poll_id, None)
+        if not self.tasks and not self.subscribers:
+            # Nobody listens on this loop any more, stop getting every vote
+            self.close()
+
+    async def _run(self, poll_id):
+        tick = get_tick()
+        event = self.dirty[poll_id]
+        pending = self.snapshots[poll_id]
+        try:
+            first = await sync_to_async(get_results)(poll_id)
+        except BaseException as exc:
+            if isinstance(exc, asyncio.CancelledError):
+                pending.cancel()
+            else:
+                pending.set_exception(exc)
+            raise
+        pending.set_result(first)
+        self.snapshots[poll_id] = first
+        while first is not None:
+            await event.wait()
+            event.clear()
+            current = await sync_to_async(get_results)(poll_id)
+            if current is None:
+                self.broadcast(poll_id, {"type": "closed"})
+                return
+            message = make_delta(self.snapshots[poll_id], current)
+            self.snapshots[poll_id] = current
+            if message is not None:
+                self.broadcast(poll_id, message, current)
+            # Anything that arrives meanwhile is folded into the next tick
+            await asyncio.sleep(tick)
+
+    def broadcast(self, poll_id, message, current=None):
+        for queue in list(self.subscribers.get(poll_id, ())):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Slow consumer: drop what it has not read, resync with a snapshot
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "snapshot", **current} if current else message)
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_hub():
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None or hub.closed:
+        hub = _hubs[loop] = ResultsHub(loop, get_broker())
+    return hub
+
+
+@asynccontextmanager
+async def subscription(poll_id):
+    """Queue of result messages for a poll, the first one is always a snapshot"""
+    hub = get_hub()
+    queue = await hub.subscribe(poll_id)
+    try:
+        yield queue
+    finally:
+        hub.unsubscribe(poll_id, queue)
+
+
+class ResultsEventStream:
+    """
+    Server-sent events body for the results stream.
+
+    Not an async generator: Django never closes those (it closes its own
+    wrapper around them), so the subscription would only end whenever the
+    garbage collector finalizes the generator. Django calls close() on the
+    response's content instead, from a worker thread, once the response is
+    over or the client went away.
+    """
+
+    def __init__(self, poll_id, keepalive=15):
+        self.poll_id = poll_id
+        self.keepalive = keepalive
+        self.hub = self.queue = None
+        self.finished = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.finished:
+            raise StopAsyncIteration
+        if self.queue is None:
+            self.hub = get_hub()
+            self.queue = await self.hub.subscribe(self.poll_id)
+        try:
+            message = await asyncio.wait_for(self.queue.get(), self.keepalive)
+        except asyncio.TimeoutError:
+            return ": keepalive\n\n"
+        if message['type'] == 'closed':
+            self.finished = True
+            self.close()
+        return f"event: {message['type']}\ndata: {json.dumps(message)}\n\n"
+
+    def close(self):
+        self.finished = True
+        hub, queue, self.queue = self.hub, self.queue, None
+        if queue is None:
+            return
+        loop = hub.loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            hub.unsubscribe(self.poll_id, queue)
+        else:
+            loop.call_soon_threadsafe(hub.unsubscribe, self.poll_id, queue)
+
+    async def aclose(self):
+        self.close()
+
+
+async def websocket_results(scope, receive, send):
+    """Raw ASGI websocket handler for /api/polls/<pk>/results/stream/"""
+    match = STREAM_PATH.match(scope['path'])
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if not match:
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    await send({'type': 'websocket.accept'})
+
+    async with subscription(int(match['pk'])) as queue:
+        next_result = asyncio.ensure_future(queue.get())
+        next_client = asyncio.ensure_future(receive())
+        try:
+            while True:
+                done, _ = await asyncio.wait({next_result, next_client}, return_when=asyncio.FIRST_COMPLETED)
+                if next_client in done:
+                    if next_client.result()['type'] == 'websocket.disconnect':
+                        return
+                    # Nothing is expected from the client on this socket, ignore it
+                    next_client = asyncio.ensure_future(receive())
+                if next_result in done:
+                    result = next_result.result()
+                    await send({'type': 'websocket.send', 'text': json.dumps(result)})
+                    if result['type'] == 'closed':
+                        await send({'type': 'websocket.close', 'code': 1000})
+                        return
+                    next_result = asyncio.ensure_future(queue.get())
+        finally:
+            next_result.cancel()
+            next_client.cancel()
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from polls.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the hourly/daily VoteRollup table from the vote table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll', type=int, action='append', dest='polls',
+                            help='Only rebuild this poll id (can be repeated)')
+
+    def handle(self, *args, **options):
+        written = rebuild(options['polls'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} rollup bucket(s)"))
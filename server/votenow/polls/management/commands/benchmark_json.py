@@ -0,0 +1,67 @@
+import gzip
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.renderers import FastJSONRenderer, orjson
+from polls.counters import record_polls
+from polls.models import Poll, PollOption
+from polls.views import AdminAllPollsAPIView, PollListAPIView
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Report render time and bytes on the wire (raw and gzipped) of the heaviest "
+        "poll endpoints with the stdlib and the fast JSON renderer. Creates throwaway "
+        "polls in the configured database and removes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--polls', type=int, default=2000, help='Synthetic polls to add')
+        parser.add_argument('--options', type=int, default=5, help='Options per poll')
+        parser.add_argument('--repeat', type=int, default=20, help='Renders per measurement')
+
+    def handle(self, *args, **options):
+        prefix = f"bench-{int(time.time())}"
+        admin = User.objects.create(username=prefix, password='!', role='admin')
+        try:
+            polls = Poll.objects.bulk_create(
+                Poll(title=f"{prefix} poll {i}", description="Synthetic poll " * 8, category='bench',
+                     created_by=admin)
+                for i in range(options['polls'])
+            )
+            PollOption.objects.bulk_create(
+                PollOption(poll=poll, option_text=f"Option {j} of {poll.title}")
+                for poll in polls for j in range(options['options'])
+            )
+            # Deleting them afterwards takes them off the admin's count again
+            record_polls(polls)
+            self.stdout.write(f"orjson {'installed' if orjson else 'not installed, fast renderer falls back'}")
+            for label, view in (('poll list', PollListAPIView), ('admin all polls', AdminAllPollsAPIView)):
+                self.measure(label, self.fetch(view, admin), options['repeat'])
+        finally:
+            Poll.objects.filter(created_by=admin).delete()
+            admin.delete()
+
+    def fetch(self, view, user):
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=user)
+        return view.as_view()(request).data
+
+    def measure(self, label, data, repeat):
+        for name, renderer in (('stdlib', JSONRenderer()), ('fast', FastJSONRenderer())):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                body = renderer.render(data, 'application/json', {})
+            render_ms = (time.perf_counter() - start) / repeat * 1000
+
+            start = time.perf_counter()
+            compressed = gzip.compress(body, compresslevel=6)
+            gzip_ms = (time.perf_counter() - start) * 1000
+            self.stdout.write(
+                f"{label:16} {name:6} render {render_ms:7.1f} ms   {len(body):>10,} bytes   "
+                f"gzip {len(compressed):>9,} bytes (+{gzip_ms:.1f} ms)"
+            )
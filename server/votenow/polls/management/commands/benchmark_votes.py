@@ -0,0 +1,96 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+
+from polls.counters import record_vote
+from polls.ingest import IngestQueueFull, VoteIngestor
+from polls.models import Poll, PollOption, Vote
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare votes/sec of the synchronous vote path against write-behind batched "
+        "ingestion. Creates a throwaway poll and users in the configured database "
+        "and removes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--votes', type=int, default=2000, help='Votes per run')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent request threads')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        n, workers = options['votes'], options['workers']
+        prefix = f"bench-{int(time.time())}"
+        User.objects.bulk_create(
+            User(username=f"{prefix}-{i}", password='!', role='user') for i in range(n)
+        )
+        user_ids = list(User.objects.filter(username__startswith=prefix).values_list('id', flat=True))
+
+        try:
+            for label, run in (('sync', self.run_sync), ('batched', self.run_batched)):
+                poll = Poll.objects.create(title=f"{prefix} {label}", description='', category='bench',
+                                           created_by_id=user_ids[0])
+                option_ids = [
+                    PollOption.objects.create(poll=poll, option_text=f"Option {i}").id for i in range(4)
+                ]
+                votes = [(user_ids[i], option_ids[i % len(option_ids)]) for i in range(n)]
+                errors, elapsed = run(poll.id, votes, workers, options)
+                stored = Vote.objects.filter(poll=poll).count()
+                self.stdout.write(
+                    f"{label:8} {stored} votes stored in {elapsed:.2f}s -> "
+                    f"{stored / elapsed:,.0f} votes/sec, {errors} errors"
+                )
+        finally:
+            Poll.objects.filter(title__startswith=prefix).delete()
+            User.objects.filter(username__startswith=prefix).delete()
+
+    def in_pool(self, workers, fn, items):
+        def call(item):
+            try:
+                return fn(item)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(workers) as pool:
+            return sum(pool.map(call, items))
+
+    def run_sync(self, poll_id, votes, workers, options):
+        def cast(vote):
+            user_id, option_id = vote
+            try:
+                if Vote.objects.filter(poll_id=poll_id, voted_by_id=user_id).exists():
+                    return 0
+                Poll.objects.get(id=poll_id)
+                with transaction.atomic():
+                    record_vote(Vote.objects.create(poll_id=poll_id, option_id=option_id, voted_by_id=user_id))
+                return 0
+            except OperationalError:
+                return 1
+
+        start = time.perf_counter()
+        errors = self.in_pool(workers, cast, votes)
+        return errors, time.perf_counter() - start
+
+    def run_batched(self, poll_id, votes, workers, options):
+        ingestor = VoteIngestor(batch_size=options['batch_size'])
+
+        def cast(vote):
+            user_id, option_id = vote
+            try:
+                if Vote.objects.filter(poll_id=poll_id, voted_by_id=user_id).exists():
+                    return 0
+                Poll.objects.get(id=poll_id)
+                ingestor.submit(Vote(poll_id=poll_id, option_id=option_id, voted_by_id=user_id))
+                return 0
+            except (OperationalError, IngestQueueFull):
+                return 1
+
+        start = time.perf_counter()
+        errors = self.in_pool(workers, cast, votes)
+        # Time until everything is on disk, not just queued
+        ingestor.stop()
+        return errors, time.perf_counter() - start
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from polls.counters import find_drift, find_user_drift, repair, repair_users
+
+
+class Command(BaseCommand):
+    help = "Verify the denormalized vote counters on polls/options/users and fix any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll', type=int, action='append', dest='polls',
+                            help='Only check this poll id (can be repeated)')
+        parser.add_argument('--check', action='store_true',
+                            help='Only report drift, do not write anything (exit code 1 if drift found)')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            bad_polls, bad_options = find_drift(options['polls'])
+            # Per-user counts span every poll, they are only checked on a full run
+            bad_users = [] if options['polls'] else find_user_drift()
+
+            for poll in bad_polls:
+                self.stdout.write(f"poll {poll.id}: stored {poll.total_votes}, actual {poll.actual}")
+            for option in bad_options:
+                self.stdout.write(f"option {option.id}: stored {option.votes_count}, actual {option.actual}")
+            for user in bad_users:
+                self.stdout.write(
+                    f"user {user.id}: stored {user.total_votes} votes/{user.polls_created} polls, "
+                    f"actual {user.actual_votes}/{user.actual_polls}"
+                )
+
+            if not bad_polls and not bad_options and not bad_users:
+                self.stdout.write(self.style.SUCCESS("Vote counters are in sync"))
+                return
+
+            if options['check']:
+                raise CommandError("Vote counters are out of sync")
+
+            repair(bad_polls, bad_options)
+            repair_users(bad_users)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Repaired {len(bad_polls)} poll(s), {len(bad_options)} option(s) and {len(bad_users)} user(s)"
+        ))
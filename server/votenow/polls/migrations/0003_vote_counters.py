@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:26
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Poll = apps.get_model("polls", "Poll")
+    PollOption = apps.get_model("polls", "PollOption")
+    Vote = apps.get_model("polls", "Vote")
+
+    def count_for(field):
+        return Coalesce(
+            Subquery(
+                Vote.objects.filter(**{field: OuterRef("pk")})
+                .order_by()
+                .values(field)
+                .annotate(c=Count("id"))
+                .values("c")
+            ),
+            Value(0),
+        )
+
+    PollOption.objects.update(votes_count=count_for("option"))
+    Poll.objects.update(total_votes=count_for("poll"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("polls", "0002_alter_poll_winner"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="poll",
+            name="total_votes",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="polloption",
+            name="votes_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("polls", "0004_voterollup"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="poll",
+            index=models.Index(fields=["-created_at"], name="poll_created_at_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="poll",
+            index=models.Index(
+                fields=["-total_votes", "-id"], name="poll_total_votes_idx"
+            ),
+        ),
+    ]
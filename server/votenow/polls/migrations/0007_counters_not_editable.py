@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("polls", "0006_vote_log_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="poll",
+            name="total_votes",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name="polloption",
+            name="votes_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
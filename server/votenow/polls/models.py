@@ -1,9 +1,10 @@
 from django.db import models
 
 # Create your models here.
-from users.models import User 
+from users.models import CounterFieldsMixin, User
 
-class Poll(models.Model) :
+
+class Poll(CounterFieldsMixin, models.Model) :
     title  = models.CharField(max_length=255)
     description = models.TextField() 
     category = models.CharField(max_length=50)
@@ -11,6 +12,16 @@ class Poll(models.Model) :
     created_at = models.DateTimeField(auto_now_add=True)
     active = models.BooleanField(default=True)
     winner = models.ForeignKey('PollOption', null=True, blank=True, on_delete=models.SET_NULL, related_name='winner_poll')
+    # Denormalized vote counter, kept in sync by polls.counters
+    total_votes = models.PositiveIntegerField(default=0, editable=False)
+    counter_fields = ('total_votes',)
+
+    class Meta:
+        indexes = [
+            # admin poll list orderings
+            models.Index(fields=['-created_at'], name='poll_created_at_idx'),
+            models.Index(fields=['-total_votes', '-id'], name='poll_total_votes_idx'),
+        ]
 
 
 
@@ -21,9 +32,12 @@ class Poll(models.Model) :
 
 
 
-class PollOption(models.Model) : 
+class PollOption(CounterFieldsMixin, models.Model) : 
     poll = models.ForeignKey(Poll, on_delete=models.CASCADE, related_name="options")
     option_text = models.CharField(max_length=255)
+    # Denormalized vote counter, kept in sync by polls.counters
+    votes_count = models.PositiveIntegerField(default=0, editable=False)
+    counter_fields = ('votes_count',)
 
 
     def __str__(self):
@@ -40,8 +54,37 @@ class Vote(models.Model) :
 
     class Meta:
         unique_together = ('poll', 'voted_by')
+        indexes = [
+            # keyset pagination of the admin vote log, newest first
+            models.Index(fields=['-voted_at', '-id'], name='vote_voted_at_idx'),
+            models.Index(fields=['poll', '-voted_at', '-id'], name='vote_poll_voted_at_idx'),
+            models.Index(fields=['voted_by', '-voted_at', '-id'], name='vote_user_voted_at_idx'),
+        ]
 
 
     def __str__(self):
         return f"{self.voted_by.username} voted {self.option.option_text}"
-    
\ No newline at end of file
+    
+
+class VoteRollup(models.Model) :
+    """Vote counts per poll and time bucket, maintained as votes come in (polls/rollups.py)"""
+    HOUR = 'hour'
+    DAY = 'day'
+    GRANULARITY_CHOICES = (
+        (HOUR, 'Hour'),
+        (DAY, 'Day'),
+    )
+
+    poll = models.ForeignKey(Poll, on_delete=models.CASCADE, related_name='rollups')
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('poll', 'granularity', 'bucket_start')
+        indexes = [
+            models.Index(fields=['granularity', 'bucket_start'], name='rollup_granularity_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.poll_id} {self.granularity} {self.bucket_start}: {self.count}"
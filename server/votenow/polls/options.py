@@ -0,0 +1,59 @@
+"""
+Reconcile a poll's options with an edited list, touching only what changed.
+
+Each incoming option is matched to an existing one by id, then by exact text.
+Matched options keep their row (and so their votes and counters), renamed ones
+are written with one bulk_update, new ones with one bulk_create, and only the
+options left unmatched are deleted along with their votes.
+"""
+from django.db import transaction
+
+from .counters import discard_votes
+from .models import PollOption, Vote
+
+
+def reconcile_options(poll, options):
+    """
+    `options` is a list of {'option_text': ..., 'id': optional}.
+    Returns (created, renamed, deleted) counts.
+    """
+    existing = {option.id: option for option in poll.options.all()}
+    claimed = {}  # index in `options` -> existing option
+    taken = set()
+
+    # Ids first, so a text match can't steal an option that is referenced by id
+    for index, data in enumerate(options):
+        option = existing.get(data.get('id'))
+        if option is not None and option.id not in taken:
+            claimed[index] = option
+            taken.add(option.id)
+
+    unclaimed_by_text = {}
+    for option in existing.values():
+        if option.id not in taken:
+            unclaimed_by_text.setdefault(option.option_text, []).append(option)
+    for index, data in enumerate(options):
+        if index not in claimed and unclaimed_by_text.get(data['option_text']):
+            claimed[index] = unclaimed_by_text[data['option_text']].pop(0)
+            taken.add(claimed[index].id)
+
+    renamed, new = [], []
+    for index, data in enumerate(options):
+        option = claimed.get(index)
+        if option is None:
+            new.append(PollOption(poll=poll, option_text=data['option_text']))
+        elif option.option_text != data['option_text']:
+            option.option_text = data['option_text']
+            renamed.append(option)
+
+    removed = [option_id for option_id in existing if option_id not in taken]
+
+    with transaction.atomic():
+        if removed:
+            discard_votes(Vote.objects.filter(option_id__in=removed))
+            PollOption.objects.filter(id__in=removed).delete()
+        if renamed:
+            PollOption.objects.bulk_update(renamed, ['option_text'])
+        if new:
+            PollOption.objects.bulk_create(new)
+    return len(new), len(renamed), len(removed)
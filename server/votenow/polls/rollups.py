@@ -0,0 +1,115 @@
+from collections import Counter
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDay, TruncHour
+
+from .models import Vote, VoteRollup
+
+TRUNCATE = {
+    VoteRollup.HOUR: TruncHour,
+    VoteRollup.DAY: TruncDay,
+}
+
+STEP = {
+    VoteRollup.HOUR: timedelta(hours=1),
+    VoteRollup.DAY: timedelta(days=1),
+}
+
+
+def bucket_start(moment, granularity):
+    """Start of the UTC hour/day bucket `moment` falls into"""
+    moment = moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if granularity == VoteRollup.DAY:
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def _bump(poll_id, granularity, start, n):
+    updated = VoteRollup.objects.filter(
+        poll_id=poll_id, granularity=granularity, bucket_start=start
+    ).update(count=F('count') + n)
+    if updated or n < 0:
+        return
+    try:
+        with transaction.atomic():
+            VoteRollup.objects.create(poll_id=poll_id, granularity=granularity, bucket_start=start, count=n)
+    except IntegrityError:
+        # Somebody else created the bucket first
+        VoteRollup.objects.filter(
+            poll_id=poll_id, granularity=granularity, bucket_start=start
+        ).update(count=F('count') + n)
+
+
+def add_votes(votes):
+    """Count freshly saved votes into their hour and day buckets"""
+    buckets = Counter(
+        (vote.poll_id, granularity, bucket_start(vote.voted_at, granularity))
+        for vote in votes
+        for granularity in TRUNCATE
+    )
+    for (poll_id, granularity, start), n in buckets.items():
+        _bump(poll_id, granularity, start, n)
+
+
+def remove_votes(votes):
+    """Take a queryset of votes that are about to be deleted out of their buckets"""
+    for granularity, trunc in TRUNCATE.items():
+        rows = (
+            votes.order_by()
+            .annotate(bucket=trunc('voted_at', tzinfo=dt_timezone.utc))
+            .values('poll_id', 'bucket')
+            .annotate(n=Count('id'))
+        )
+        for row in rows:
+            _bump(row['poll_id'], granularity, row['bucket'], -row['n'])
+
+
+def rebuild(poll_ids=None):
+    """Recompute rollups from the vote table, returns the number of buckets written"""
+    votes = Vote.objects.all()
+    rollups = VoteRollup.objects.all()
+    if poll_ids:
+        votes = votes.filter(poll_id__in=poll_ids)
+        rollups = rollups.filter(poll_id__in=poll_ids)
+
+    written = 0
+    with transaction.atomic():
+        rollups.delete()
+        for granularity, trunc in TRUNCATE.items():
+            rows = (
+                votes.order_by()
+                .annotate(bucket=trunc('voted_at', tzinfo=dt_timezone.utc))
+                .values('poll_id', 'bucket')
+                .annotate(n=Count('id'))
+            )
+            batch = [
+                VoteRollup(poll_id=row['poll_id'], granularity=granularity, bucket_start=row['bucket'], count=row['n'])
+                for row in rows.iterator()
+            ]
+            VoteRollup.objects.bulk_create(batch, batch_size=1000)
+            written += len(batch)
+    return written
+
+
+def daily_totals(first_day, days):
+    """Votes per UTC day across all polls, `days` values starting at `first_day`"""
+    return _totals(VoteRollup.objects.all(), VoteRollup.DAY, first_day, days)
+
+
+def poll_totals(poll_id, granularity, first, n):
+    """Votes per UTC hour/day for one poll, `n` values starting at `first`"""
+    return _totals(VoteRollup.objects.filter(poll_id=poll_id), granularity, first, n)
+
+
+def _totals(rollups, granularity, first, n):
+    step = STEP[granularity]
+    starts = [first + step * i for i in range(n)]
+    counts = dict(
+        rollups.filter(granularity=granularity, bucket_start__gte=starts[0], bucket_start__lte=starts[-1])
+        .values('bucket_start')
+        .annotate(total=Sum('count'))
+        .values_list('bucket_start', 'total')
+    )
+    return [counts.get(start, 0) for start in starts]
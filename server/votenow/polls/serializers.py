@@ -1,17 +1,26 @@
 from rest_framework import serializers
 from .models import Poll, PollOption, Vote
+from .cache import invalidate_results
+from .options import reconcile_options
 
 
 class PollOptionSerializer(serializers.ModelSerializer):
+    # Writable so poll updates can refer to existing options
+    id = serializers.IntegerField(required=False)
+    
     class Meta:
         model = PollOption
         fields = ['id', 'option_text']
+    
+    def create(self, validated_data):
+        validated_data.pop('id', None)
+        return super().create(validated_data)
 
 
 class PollSerializer(serializers.ModelSerializer):
     options = PollOptionSerializer(many=True, read_only=False, required=False)
     user_voted = serializers.SerializerMethodField()
-    total_votes = serializers.SerializerMethodField()
+    total_votes = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Poll
@@ -21,15 +30,15 @@ class PollSerializer(serializers.ModelSerializer):
     
     def get_user_voted(self, obj):
         """Check if the current user has voted on this poll"""
+        # Views resolve this for the whole page up front (see PollReadMixin)
+        voted_poll_ids = self.context.get('voted_poll_ids')
+        if voted_poll_ids is not None:
+            return obj.id in voted_poll_ids
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return Vote.objects.filter(poll=obj, voted_by=request.user).exists()
         return False
     
-    def get_total_votes(self, obj):
-        """Get total number of votes for this poll"""
-        return obj.votes.count()
-    
     def create(self, validated_data):
         # Extract options data before creating poll
         options_data = validated_data.pop('options', [])
@@ -37,9 +46,10 @@ class PollSerializer(serializers.ModelSerializer):
         # Create the poll
         poll = Poll.objects.create(**validated_data)
         
-        # Create each option for this poll
-        for option_data in options_data:
-            PollOption.objects.create(poll=poll, **option_data)
+        # Create the options in one insert
+        PollOption.objects.bulk_create(
+            PollOption(poll=poll, option_text=option_data['option_text']) for option_data in options_data
+        )
         
         return poll
     
@@ -52,13 +62,11 @@ class PollSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
         instance.save()
         
-        # Update options if provided
+        # Update options if provided, keeping the votes of unchanged ones
         if options_data is not None:
-            # Clear existing options and create new ones
-            instance.options.all().delete()
-            for option_data in options_data:
-                PollOption.objects.create(poll=instance, **option_data)
+            reconcile_options(instance, options_data)
         
+        invalidate_results(instance.id)
         return instance
 
 
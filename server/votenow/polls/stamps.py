@@ -0,0 +1,128 @@
+"""
+Version stamps for conditional GETs.
+
+A stamp is the time (in microseconds) something last changed: one per poll
+(`poll:<id>`, covering its fields, options and votes) and one per public
+collection (`polls`, `banners`). They live in the results cache next to the
+results versions and are turned into ETag/Last-Modified validators by the
+read views (stamp_condition), so a client that already has the current
+version gets a 304 without the view querying or serializing anything.
+
+Every worker must read the same stamps, or one that missed a write keeps
+answering 304 to clients holding the old tag. So the results cache must be
+shared (Redis, Memcached); with a per-process LocMemCache no validators are
+sent unless POLL_STAMPS_ALLOW_LOCAL_CACHE says there is only one process.
+
+Model saves and deletes touch the stamps through the receivers below; vote
+counts and option edits go through polls.cache.results_changed, which
+touches them too. Writes that skip both (bulk_create, queryset.update) must
+call touch_on_commit themselves.
+"""
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from core.routers import primary, sticky_seconds
+
+from .cache import get_cache
+from .models import Poll, PollOption
+
+STAMP_KEY = 'stamp:{}'
+POLLS = 'polls'
+BANNERS = 'banners'
+
+
+def poll_key(poll_id):
+    return f'poll:{poll_id}'
+
+
+def _now():
+    return time.time_ns() // 1000
+
+
+def get_stamp(name):
+    cache = get_cache()
+    key = STAMP_KEY.format(name)
+    stamp = cache.get(key)
+    if stamp is None:
+        # Never set or evicted: start over from now, which no client has seen
+        stamp = _now()
+        if not cache.add(key, stamp, timeout=None):
+            stamp = cache.get(key, stamp)
+    return stamp
+
+
+def touch(*names):
+    now = _now()
+    get_cache().set_many({STAMP_KEY.format(name): now for name in names}, timeout=None)
+
+
+def touch_on_commit(*names):
+    transaction.on_commit(lambda: touch(*names))
+
+
+def poll_changed(poll_id):
+    touch(poll_key(poll_id), POLLS)
+
+
+def validators_enabled():
+    if getattr(settings, 'POLL_STAMPS_ALLOW_LOCAL_CACHE', False):
+        return True
+    return not isinstance(get_cache(), LocMemCache)
+
+
+def stamp_condition(stamp_name, tag=None):
+    """
+    Like django's condition(), with both validators taken from the stamp
+    `stamp_name(request, *args, **kwargs)` names. The ETag is
+    `tag(request, name, stamp)`, "<name>-<stamp>" by default.
+
+    Last-Modified has one second resolution and goes out rounded down, while
+    If-Modified-Since is checked against the stamp rounded up: a change later
+    in the second the client names is never answered with a 304.
+
+    The body goes out with the current stamp and is confirmed by 304s from
+    then on, so within DATABASE_PRIMARY_STICKY_SECONDS of a change (the
+    replication lag the router allows for) it is read from the primary.
+    """
+    def decorator(view):
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            if not validators_enabled():
+                return view(request, *args, **kwargs)
+            name = stamp_name(request, *args, **kwargs)
+            stamp = get_stamp(name)
+            etag = quote_etag(tag(request, name, stamp) if tag else f"{name}-{stamp}")
+            response = get_conditional_response(request, etag=etag, last_modified=-(-stamp // 1_000_000))
+            if response is None:
+                fresh = _now() - stamp < sticky_seconds() * 1_000_000
+                with primary() if fresh else nullcontext():
+                    response = view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                response.headers.setdefault('ETag', etag)
+                response.headers.setdefault('Last-Modified', http_date(stamp // 1_000_000))
+            return response
+
+        return inner
+
+    return decorator
+
+
+@receiver(post_save, sender=Poll, dispatch_uid='stamps-poll-save')
+@receiver(post_delete, sender=Poll, dispatch_uid='stamps-poll-delete')
+def poll_saved(sender, instance, **kwargs):
+    touch_on_commit(poll_key(instance.pk), POLLS)
+
+
+@receiver(post_save, sender=PollOption, dispatch_uid='stamps-option-save')
+@receiver(post_delete, sender=PollOption, dispatch_uid='stamps-option-delete')
+def option_saved(sender, instance, **kwargs):
+    touch_on_commit(poll_key(instance.poll_id), POLLS)
@@ -1,3 +1,646 @@
-from django.test import TestCase
+import asyncio
+import gc
+import gzip
+import json
+import weakref
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipIf
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.contrib import admin
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core import metrics, routers
+from core.renderers import FastJSONRenderer
+from users.models import User
+from admin_management.jobs import run_job
+from users.admin import UserAdmin
+from .admin import PollOptionAdmin
+from .models import Poll, PollOption, Vote
+from . import stamps
+from .counters import record_vote
+from .cache import cache_stats, reset_cache_stats, results_changed
+from .live import LocalBroker, ResultsHub, make_delta, set_broker, subscription, websocket_results
+from .ingest import VoteIngestor
+from .serializers import PollSerializer
+
+
+class VoteCounterTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.voter = User.objects.create_user(username='voter', password='pass', role='user')
+        self.poll = Poll.objects.create(title='Best fruit', description='', category='food', created_by=self.admin)
+        self.apple = PollOption.objects.create(poll=self.poll, option_text='Apple')
+        self.pear = PollOption.objects.create(poll=self.poll, option_text='Pear')
+        self.client = APIClient()
+        cache.clear()
+
+    def vote(self, user, option):
+        self.client.force_authenticate(user)
+        return self.client.post(reverse('poll-vote', args=[self.poll.id]), {'option': option.id, 'poll': self.poll.id})
+
+    def test_vote_increments_counters(self):
+        self.assertEqual(self.vote(self.voter, self.apple).status_code, 201)
+        self.apple.refresh_from_db()
+        self.poll.refresh_from_db()
+        self.assertEqual(self.apple.votes_count, 1)
+        self.assertEqual(self.poll.total_votes, 1)
+
+    def test_duplicate_vote_does_not_increment(self):
+        self.vote(self.voter, self.apple)
+        self.assertEqual(self.vote(self.voter, self.pear).status_code, 400)
+        self.poll.refresh_from_db()
+        self.pear.refresh_from_db()
+        self.assertEqual(self.poll.total_votes, 1)
+        self.assertEqual(self.pear.votes_count, 0)
+
+    def test_results_read_counters(self):
+        self.vote(self.voter, self.apple)
+        response = self.client.get(reverse('poll-results', args=[self.poll.id]))
+        counts = {o['option_text']: o['votes_count'] for o in response.data['options']}
+        self.assertEqual(counts, {'Apple': 1, 'Pear': 0})
+
+    def test_admin_vote_delete_decrements(self):
+        self.vote(self.voter, self.apple)
+        vote = Vote.objects.get()
+        self.client.force_authenticate(self.admin)
+        response = self.client.delete(reverse('admin-vote-delete', args=[vote.id]))
+        self.assertEqual(response.status_code, 204)
+        self.apple.refresh_from_db()
+        self.poll.refresh_from_db()
+        self.assertEqual((self.apple.votes_count, self.poll.total_votes), (0, 0))
+
+    def test_user_bulk_delete_decrements(self):
+        self.vote(self.voter, self.pear)
+        self.client.force_authenticate(self.admin)
+        # Bulk deletes run as a job, run it inline here
+        with mock.patch('admin_management.jobs.start_worker', side_effect=run_job), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin-user-bulk-delete'), {'ids': [self.voter.id]}, format='json')
+        self.pear.refresh_from_db()
+        self.poll.refresh_from_db()
+        self.assertEqual((self.pear.votes_count, self.poll.total_votes), (0, 0))
+
+    def test_full_save_keeps_concurrent_votes(self):
+        stale = Poll.objects.get(id=self.poll.id)
+        stale_option = PollOption.objects.get(id=self.apple.id)
+        self.vote(self.voter, self.apple)
+
+        stale.active = False
+        stale.save()
+        stale_option.option_text = 'Green apple'
+        stale_option.save()
+        self.poll.refresh_from_db()
+        self.apple.refresh_from_db()
+        self.assertEqual((self.poll.total_votes, self.poll.active), (1, False))
+        self.assertEqual((self.apple.votes_count, self.apple.option_text), (1, 'Green apple'))
+
+    def test_admin_site_deletes_decrement(self):
+        other = User.objects.create_user(username='other', password='pass', role='user')
+        self.vote(self.voter, self.apple)
+        self.vote(other, self.pear)
+        request = RequestFactory().post('/')
+        request.user = self.admin
+
+        UserAdmin(User, admin.site).delete_model(request, self.voter)
+        PollOptionAdmin(PollOption, admin.site).delete_queryset(request, PollOption.objects.filter(id=self.pear.id))
+        self.poll.refresh_from_db()
+        self.apple.refresh_from_db()
+        self.assertEqual((self.poll.total_votes, self.apple.votes_count), (0, 0))
+
+    def test_admin_inline_option_delete_decrements(self):
+        self.vote(self.voter, self.pear)
+        staff = User.objects.create_superuser(username='staff', password='pass', email='s@example.com')
+        self.client = Client()
+        self.client.force_login(staff)
+        response = self.client.post(reverse('admin:polls_poll_change', args=[self.poll.id]), {
+            'title': 'Best fruit', 'description': 'Pick one', 'category': 'food',
+            'created_by': self.admin.id, 'active': 'on', 'winner': '',
+            'options-TOTAL_FORMS': '2', 'options-INITIAL_FORMS': '2',
+            'options-MIN_NUM_FORMS': '0', 'options-MAX_NUM_FORMS': '1000',
+            'options-0-id': self.apple.id, 'options-0-poll': self.poll.id, 'options-0-option_text': 'Apple',
+            'options-1-id': self.pear.id, 'options-1-poll': self.poll.id, 'options-1-option_text': 'Pear',
+            'options-1-DELETE': 'on',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.poll.refresh_from_db()
+        self.assertEqual(self.poll.total_votes, 0)
+        self.assertFalse(PollOption.objects.filter(id=self.pear.id).exists())
+
+    def test_user_counters_follow_votes_and_polls(self):
+        self.vote(self.voter, self.apple)
+        self.voter.refresh_from_db()
+        self.admin.refresh_from_db()
+        self.assertEqual((self.voter.total_votes, self.admin.polls_created), (1, 1))
+
+        # A full save of a stale instance leaves them alone
+        stale = User.objects.get(id=self.voter.id)
+        stale.total_votes = 0
+        stale.first_name = 'Vera'
+        stale.save()
+
+        # The votes go with the poll without passing discard_votes
+        self.client.force_authenticate(self.admin)
+        self.client.delete(reverse('admin-poll-detail', args=[self.poll.id]))
+        self.voter.refresh_from_db()
+        self.admin.refresh_from_db()
+        self.assertEqual((self.voter.total_votes, self.voter.first_name), (0, 'Vera'))
+        self.assertEqual(self.admin.polls_created, 0)
+
+    def test_repair_command_fixes_drift(self):
+        Vote.objects.create(poll=self.poll, option=self.apple, voted_by=self.voter)
+        call_command('repair_vote_counters', stdout=StringIO())
+        self.apple.refresh_from_db()
+        self.poll.refresh_from_db()
+        self.voter.refresh_from_db()
+        self.assertEqual((self.apple.votes_count, self.poll.total_votes, self.voter.total_votes), (1, 1, 1))
+
+
+class PollListQueryCountTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.voter = User.objects.create_user(username='voter', password='pass', role='user')
+        self.client = APIClient()
+
+    def make_polls(self, n):
+        polls = Poll.objects.bulk_create(
+            Poll(title=f'Poll {i}', description='', category='misc', created_by=self.admin)
+            for i in range(Poll.objects.count(), Poll.objects.count() + n)
+        )
+        options = PollOption.objects.bulk_create(
+            PollOption(poll=poll, option_text=text) for poll in polls for text in ('Yes', 'No')
+        )
+        Vote.objects.create(poll=polls[0], option=options[0], voted_by=self.voter)
+        return polls
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('poll-list'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_list_query_count_is_constant(self):
+        self.client.force_authenticate(self.voter)
+        self.make_polls(10)
+        small, response = self.count_list_queries()
+        self.assertEqual(sum(p['user_voted'] for p in response.data), 1)
+
+        self.make_polls(10000)
+        large, response = self.count_list_queries()
+        self.assertEqual(len(response.data), 10010)
+        self.assertEqual(sum(p['user_voted'] for p in response.data), 2)
+        self.assertEqual(small, large)
+        # polls, options prefetch, voted set
+        self.assertEqual(large, 3)
+
+    def test_anonymous_list_skips_voted_lookup(self):
+        self.make_polls(10)
+        queries, response = self.count_list_queries()
+        self.assertEqual(queries, 2)
+        self.assertFalse(any(p['user_voted'] for p in response.data))
+
+    def test_detail_query_count(self):
+        poll = self.make_polls(1)[0]
+        self.client.force_authenticate(self.voter)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('poll-detail', args=[poll.id]))
+        self.assertTrue(response.data['user_voted'])
+        self.assertEqual(len(response.data['options']), 2)
+
+
+class ResultsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_cache_stats()
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.voter = User.objects.create_user(username='voter', password='pass', role='user')
+        self.poll = Poll.objects.create(title='Best fruit', description='', category='food', created_by=self.admin)
+        self.apple = PollOption.objects.create(poll=self.poll, option_text='Apple')
+        self.url = reverse('poll-results', args=[self.poll.id])
+        self.client = APIClient()
+
+    def test_hit_skips_database(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['options'], [{'id': self.apple.id, 'option_text': 'Apple', 'votes_count': 0}])
+        self.assertEqual(cache_stats()['hits'], 1)
+        self.assertEqual(cache_stats()['misses'], 1)
+
+    def test_vote_invalidates(self):
+        self.client.get(self.url)
+        self.client.force_authenticate(self.voter)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('poll-vote', args=[self.poll.id]), {'option': self.apple.id, 'poll': self.poll.id})
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['options'][0]['votes_count'], 1)
+
+    def test_option_rewrite_invalidates(self):
+        self.client.get(self.url)
+        self.client.force_authenticate(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(reverse('admin-poll-detail', args=[self.poll.id]), {'options': ['Kiwi', 'Mango']}, format='json')
+        response = self.client.get(self.url)
+        self.assertEqual([o['option_text'] for o in response.data['options']], ['Kiwi', 'Mango'])
+
+    def test_unknown_poll_is_404(self):
+        response = self.client.get(reverse('poll-results', args=[self.poll.id + 1]))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(POLL_LIVE_TICK=0.05)
+class LiveResultsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.poll = Poll.objects.create(title='Best fruit', description='', category='food', created_by=self.admin)
+        self.apple = PollOption.objects.create(poll=self.poll, option_text='Apple')
+        self.pear = PollOption.objects.create(poll=self.poll, option_text='Pear')
+
+    def add_votes(self, option, n):
+        PollOption.objects.filter(id=option.id).update(votes_count=n)
+        results_changed(self.poll.id)
+
+    def test_make_delta(self):
+        before = {'poll': 'p', 'options': [{'id': 1, 'option_text': 'a', 'votes_count': 0}]}
+        after = {'poll': 'p', 'options': [{'id': 1, 'option_text': 'a', 'votes_count': 3}]}
+        self.assertEqual(make_delta(before, after), {'type': 'delta', 'options': {1: 3}})
+        self.assertIsNone(make_delta(after, after))
+        self.assertEqual(make_delta(None, after)['type'], 'snapshot')
+
+    async def test_updates_are_coalesced_per_tick(self):
+        async with subscription(self.poll.id) as first, subscription(self.poll.id) as second:
+            snapshot = await first.get()
+            self.assertEqual(snapshot['type'], 'snapshot')
+            self.assertEqual((await second.get())['type'], 'snapshot')
+
+            for n in range(1, 6):
+                await sync_to_async(self.add_votes)(self.apple, n)
+            # Five changes inside one tick reach subscribers as at most two
+            # broadcasts: the leading edge and one for the rest of the burst
+            received = {}
+            for name, queue in (('first', first), ('second', second)):
+                received[name] = [await asyncio.wait_for(queue.get(), 1)]
+                while received[name][-1]['options'][self.apple.id] != 5:
+                    received[name].append(await asyncio.wait_for(queue.get(), 1))
+            self.assertLessEqual(len(received['first']), 2)
+            self.assertEqual(received['first'], received['second'])
+
+            await asyncio.sleep(0.2)
+            self.assertTrue(first.empty())
+
+    async def test_sse_stream_starts_with_snapshot(self):
+        broker = LocalBroker()
+        set_broker(broker)
+        self.addCleanup(set_broker, None)
+
+        response = await self.async_client.get(reverse('poll-results-stream', args=[self.poll.id]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = response.streaming_content
+        chunk = await anext(body)
+        self.assertTrue(chunk.startswith(b'event: snapshot\ndata: '))
+        self.assertEqual(len(broker._listeners), 1)
+
+        # What the ASGI handler does once the client is gone
+        await sync_to_async(response.close)()
+        await asyncio.sleep(0)
+        self.assertEqual(broker._listeners, set())
+
+    async def test_hub_task_does_not_inherit_request_routing(self):
+        seen = []
+
+        def results(poll_id):
+            seen.append(routers._state.get())
+            return None
+
+        token = routers._state.set(routers.RoutingState())
+        try:
+            with mock.patch('polls.live.get_results', side_effect=results):
+                async with subscription(self.poll.id) as queue:
+                    await queue.get()
+        finally:
+            routers._state.reset(token)
+        self.assertEqual(seen, [None])
+
+    def test_idle_hub_lets_go_of_broker_and_loop(self):
+        broker = LocalBroker()
+        set_broker(broker)
+        self.addCleanup(set_broker, None)
+
+        async def listen():
+            async with subscription(self.poll.id) as queue:
+                await queue.get()
+                self.assertEqual(len(broker._listeners), 1)
+
+        with mock.patch('polls.live.get_results', return_value=None):
+            asyncio.run(listen())
+        self.assertEqual(broker._listeners, set())
+
+        # The hub is the value of a WeakKeyDictionary keyed by its loop
+        loop = asyncio.new_event_loop()
+        hub = ResultsHub(loop, broker)
+        loop_ref = weakref.ref(loop)
+        loop.close()
+        del loop
+        gc.collect()
+        self.assertIsNone(loop_ref())
+        hub.close()
+
+    async def test_sse_unknown_poll(self):
+        response = await self.async_client.get(reverse('poll-results-stream', args=[self.poll.id + 1]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_websocket_stream(self):
+        incoming = asyncio.Queue()
+        sent = asyncio.Queue()
+        await incoming.put({'type': 'websocket.connect'})
+        scope = {'type': 'websocket', 'path': f'/api/polls/{self.poll.id}/results/stream/'}
+        task = asyncio.ensure_future(websocket_results(scope, incoming.get, sent.put))
+
+        self.assertEqual((await sent.get())['type'], 'websocket.accept')
+        snapshot = json.loads((await sent.get())['text'])
+        self.assertEqual([o['option_text'] for o in snapshot['options']], ['Apple', 'Pear'])
+
+        await sync_to_async(self.add_votes)(self.pear, 2)
+        delta = json.loads((await asyncio.wait_for(sent.get(), 1))['text'])
+        self.assertEqual(delta, {'type': 'delta', 'options': {str(self.pear.id): 2}})
+
+        await incoming.put({'type': 'websocket.disconnect'})
+        await asyncio.wait_for(task, 1)
+
+
+class OptionReconcileTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.voters = [User.objects.create_user(username=f'voter{i}', password='pass', role='user') for i in range(3)]
+        self.poll = Poll.objects.create(title='Best fruit', description='', category='food', created_by=self.admin)
+        self.apple, self.pear, self.plum = PollOption.objects.bulk_create(
+            PollOption(poll=self.poll, option_text=text) for text in ('Apple', 'Pear', 'Plum')
+        )
+        for voter, option in zip(self.voters, (self.apple, self.apple, self.plum)):
+            Vote.objects.create(poll=self.poll, option=option, voted_by=voter)
+        PollOption.objects.filter(id=self.apple.id).update(votes_count=2)
+        PollOption.objects.filter(id=self.plum.id).update(votes_count=1)
+        Poll.objects.filter(id=self.poll.id).update(total_votes=3)
+        User.objects.filter(id__in=[voter.id for voter in self.voters]).update(total_votes=1)
+        self.poll.refresh_from_db()
+
+    def update(self, options):
+        serializer = PollSerializer(self.poll, data={'options': options}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+
+    def test_rename_by_id_keeps_votes(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.update([
+                {'id': self.apple.id, 'option_text': 'Green apple'},
+                {'id': self.pear.id, 'option_text': 'Pear'},
+                {'id': self.plum.id, 'option_text': 'Plum'},
+            ])
+        option_writes = [q['sql'] for q in ctx.captured_queries if 'polls_polloption' in q['sql'] and not q['sql'].startswith('SELECT')]
+        self.assertEqual(len(option_writes), 1)
+        self.assertTrue(option_writes[0].startswith('UPDATE'))
+        self.apple.refresh_from_db()
+        self.assertEqual((self.apple.option_text, self.apple.votes_count), ('Green apple', 2))
+        self.assertEqual(Vote.objects.count(), 3)
+
+    def test_only_removed_options_lose_votes(self):
+        self.update([{'option_text': 'Apple'}, {'option_text': 'Pear'}, {'option_text': 'Kiwi'}])
+        texts = dict(PollOption.objects.filter(poll=self.poll).values_list('option_text', 'votes_count'))
+        self.assertEqual(texts, {'Apple': 2, 'Pear': 0, 'Kiwi': 0})
+        self.assertFalse(PollOption.objects.filter(id=self.plum.id).exists())
+        self.assertEqual(PollOption.objects.filter(id__in=[self.apple.id, self.pear.id]).count(), 2)
+        self.poll.refresh_from_db()
+        self.assertEqual((self.poll.total_votes, Vote.objects.count()), (2, 2))
+
+    def test_admin_update_matches_by_text(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.put(
+            reverse('admin-poll-detail', args=[self.poll.id]), {'options': ['Plum', 'Apple']}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            set(PollOption.objects.values_list('id', 'votes_count')), {(self.apple.id, 2), (self.plum.id, 1)}
+        )
+        self.poll.refresh_from_db()
+        self.assertEqual(self.poll.total_votes, 3)
+
+
+@override_settings(POLL_STAMPS_ALLOW_LOCAL_CACHE=True)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.voter = User.objects.create_user(username='voter', password='pass', role='user')
+        self.poll = Poll.objects.create(title='Best fruit', description='', category='food', created_by=self.admin)
+        self.apple = PollOption.objects.create(poll=self.poll, option_text='Apple')
+        self.client = APIClient()
+        self.client.force_authenticate(self.voter)
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_resources_answer_304_without_queries(self):
+        for url in (reverse('poll-list'), reverse('poll-detail', args=[self.poll.id]),
+                    reverse('poll-results', args=[self.poll.id])):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            self.assertIn('Last-Modified', first)
+            with self.assertNumQueries(0):
+                self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+    def test_votes_and_edits_change_the_tags(self):
+        urls = [reverse('poll-list'), reverse('poll-detail', args=[self.poll.id]),
+                reverse('poll-results', args=[self.poll.id])]
+        before = [self.client.get(url) for url in urls]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('poll-vote', args=[self.poll.id]), {'option': self.apple.id, 'poll': self.poll.id})
+        for url, response in zip(urls, before):
+            self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+        detail = self.client.get(urls[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.apple.option_text = 'Green apple'
+            self.apple.save()
+        self.assertEqual(self.revalidate(urls[1], detail).status_code, 200)
+
+    def test_tags_are_per_user(self):
+        url = reverse('poll-detail', args=[self.poll.id])
+        mine = self.client.get(url)
+        self.assertIn('Authorization', mine['Vary'])
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.revalidate(url, mine).status_code, 200)
+
+    def test_if_modified_since_in_the_same_second(self):
+        url = reverse('poll-results', args=[self.poll.id])
+        with mock.patch('polls.stamps._now', return_value=1_700_000_000_200_000):
+            stamps.poll_changed(self.poll.id)
+        first = self.client.get(url)
+
+        # Changed again 0.5s later: same second as the Last-Modified sent
+        with mock.patch('polls.stamps._now', return_value=1_700_000_000_700_000):
+            stamps.poll_changed(self.poll.id)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+
+        later = self.client.get(url, HTTP_IF_MODIFIED_SINCE='Tue, 14 Nov 2023 22:13:21 GMT')
+        self.assertEqual(later.status_code, 304)
+
+    @override_settings(POLL_STAMPS_ALLOW_LOCAL_CACHE=False)
+    def test_no_validators_from_a_per_process_cache(self):
+        response = self.client.get(reverse('poll-detail', args=[self.poll.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+
+
+class JSONRenderingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.client = APIClient()
+
+    def test_fast_renderer_matches_stdlib(self):
+        data = {'title': 'caf\u00e9 \u2028', 'amount': Decimal('1.50'), 'when': timezone.now(), 'items': [1, None]}
+        fast = FastJSONRenderer().render(data, 'application/json', {})
+        self.assertEqual(json.loads(fast), json.loads(JSONRenderer().render(data, 'application/json', {})))
+        self.assertNotIn('\u2028'.encode(), fast)
+
+    def test_list_field_errors_render(self):
+        field = serializers.ListField(child=serializers.CharField(max_length=3))
+        with self.assertRaises(serializers.ValidationError) as raised:
+            field.run_validation(['ok', 'too long'])
+        detail = raised.exception.detail
+        rendered = FastJSONRenderer().render({'options': detail}, 'application/json', {})
+        self.assertEqual(json.loads(rendered), json.loads(JSONRenderer().render({'options': detail}, 'application/json', {})))
+        self.assertIn('1', json.loads(rendered)['options'])
+
+    def test_bad_json_is_a_400(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(reverse('poll-create'), '{"title": ', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_gzip_above_threshold_only(self):
+        polls = Poll.objects.bulk_create(
+            Poll(title=f'Poll {i}', description='Long enough to matter', category='misc', created_by=self.admin)
+            for i in range(30)
+        )
+        big = self.client.get(reverse('poll-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(big['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(big.content))), 30)
+
+        small = self.client.get(reverse('poll-results', args=[polls[0].id]), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(small.has_header('Content-Encoding'))
+
+
+@override_settings(VOTE_INGEST_BATCHED=True)
+class BatchedIngestTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.voters = [User.objects.create_user(username=f'voter{i}', password='pass', role='user') for i in range(3)]
+        self.poll = Poll.objects.create(title='Best fruit', description='', category='food', created_by=self.admin)
+        self.apple = PollOption.objects.create(poll=self.poll, option_text='Apple')
+        self.ingestor = VoteIngestor(batch_size=10, flush_interval=0.01, enqueue_timeout=0.01)
+        patcher = mock.patch('polls.views.get_ingestor', return_value=self.ingestor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.ingestor.stop)
+        self.client = APIClient()
+
+    def vote(self, user):
+        self.client.force_authenticate(user)
+        return self.client.post(reverse('poll-vote', args=[self.poll.id]), {'option': self.apple.id, 'poll': self.poll.id})
+
+    def test_votes_are_flushed_in_batches(self):
+        # Hold the writer back until every vote is queued: the shared-cache
+        # in-memory test database raises "table is locked" instead of waiting
+        start, self.ingestor.start = self.ingestor.start, lambda: None
+        for voter in self.voters:
+            self.assertEqual(self.vote(voter).status_code, 202)
+        start()
+        self.ingestor.stop()
+        self.assertEqual(Vote.objects.filter(poll=self.poll).count(), 3)
+        self.apple.refresh_from_db()
+        self.poll.refresh_from_db()
+        self.assertEqual((self.apple.votes_count, self.poll.total_votes), (3, 3))
+
+    def test_duplicates_are_rejected(self):
+        self.ingestor.start = lambda: None  # keep the vote queued
+        self.assertEqual(self.vote(self.voters[0]).status_code, 202)
+        self.assertEqual(self.vote(self.voters[0]).status_code, 400)
+
+        # Already in the table by the time the batch is written
+        queued = self.ingestor.queue.get_nowait()
+        Vote.objects.create(poll=self.poll, option=self.apple, voted_by=self.voters[0])
+        self.assertEqual(self.ingestor.flush([queued]), [])
+        self.assertEqual(Vote.objects.filter(poll=self.poll).count(), 1)
+
+    def test_race_with_another_writer_counts_written_rows_only(self):
+        record_vote(Vote.objects.create(poll=self.poll, option=self.apple, voted_by=self.voters[0]))
+        batch = [Vote(poll=self.poll, option=self.apple, voted_by=voter) for voter in self.voters[:2]]
+        # The first lookup misses voters[0]'s vote, as if it landed right after it
+        lookup = self.ingestor.already_voted
+        with mock.patch.object(self.ingestor, 'already_voted', side_effect=[set(), lookup(batch)]):
+            self.ingestor._safe_flush(batch)
+
+        self.assertEqual(self.ingestor.flushed, 1)
+        self.apple.refresh_from_db()
+        self.poll.refresh_from_db()
+        self.assertEqual((self.apple.votes_count, self.poll.total_votes), (2, 2))
+        self.assertEqual(Vote.objects.filter(poll=self.poll).count(), 2)
+
+    def test_vote_for_a_deleted_option_does_not_drop_the_batch(self):
+        banana = PollOption.objects.create(poll=self.poll, option_text='Banana')
+        batch = [Vote(poll=self.poll, option=banana, voted_by=self.voters[0]),
+                 Vote(poll=self.poll, option=self.apple, voted_by=self.voters[1])]
+        banana.delete()
+        with self.assertLogs('polls.ingest', 'WARNING'):
+            self.ingestor._safe_flush(batch)
+
+        self.assertEqual(list(Vote.objects.values_list('voted_by', flat=True)), [self.voters[1].id])
+        self.poll.refresh_from_db()
+        self.assertEqual(self.poll.total_votes, 1)
+
+    def test_unwritable_row_is_dropped_alone(self):
+        batch = [Vote(poll=self.poll, option=self.apple, voted_by=voter) for voter in self.voters[:2]]
+        User.objects.filter(pk=self.voters[0].pk).delete()
+        with self.assertLogs('polls.ingest', 'ERROR'):
+            self.ingestor._safe_flush(batch)
+
+        self.assertEqual(list(Vote.objects.values_list('voted_by', flat=True)), [self.voters[1].id])
+        self.apple.refresh_from_db()
+        self.assertEqual(self.apple.votes_count, 1)
+
+    @skipIf(metrics.prometheus_client is None, 'prometheus_client is not installed')
+    def test_dropped_batch_is_counted(self):
+        def dropped():
+            return metrics.prometheus_client.REGISTRY.get_sample_value('votes_ingest_dropped_total') or 0
+
+        before = dropped()
+        batch = [Vote(poll=self.poll, option=self.apple, voted_by=voter) for voter in self.voters]
+        with mock.patch.object(self.ingestor, 'flush', side_effect=ValueError('boom')), \
+                self.assertLogs('polls.ingest', 'ERROR'):
+            self.ingestor._safe_flush(batch)
+        self.assertEqual(dropped() - before, 3)
+
+    def test_full_queue_answers_503(self):
+        self.ingestor.start = lambda: None
+        self.ingestor.queue.maxsize = 1
+        self.assertEqual(self.vote(self.voters[0]).status_code, 202)
+        response = self.vote(self.voters[1])
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
@@ -1,5 +1,5 @@
 from django.urls import path 
-from .views import PollCreateAPIView, PollListAPIView, PollDetailAPIView, VoteCreateAPIView, PollResultAPIView,PollOptionBulkCreateAPIView,AdminAllPollsAPIView
+from .views import PollCreateAPIView, PollListAPIView, PollDetailAPIView, VoteCreateAPIView, PollResultAPIView,PollOptionBulkCreateAPIView,AdminAllPollsAPIView, ResultsCacheStatsAPIView, poll_results_stream
 
 
 urlpatterns= [
@@ -12,8 +12,10 @@ path('<int:pk>/', PollDetailAPIView.as_view() ,name='poll-detail'),
 
 path('<int:pk>/vote/', VoteCreateAPIView.as_view(), name='poll-vote' ) , 
 path('<int:pk>/results/', PollResultAPIView.as_view() , name='poll-results'),
+path('<int:pk>/results/stream/', poll_results_stream, name='poll-results-stream'),
 path('<int:poll_id>/options/create/', PollOptionBulkCreateAPIView.as_view(), name='poll-option-create'),
 path('admin/all/', AdminAllPollsAPIView.as_view(), name='admin-all-polls'),
+path('admin/results-cache/', ResultsCacheStatsAPIView.as_view(), name='results-cache-stats'),
 
 ]
 
@@ -7,7 +7,19 @@ from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from .models import Poll, PollOption, Vote
 from .serializers import PollSerializer, PollOptionSerializer, VoteSerializer
+from .counters import record_vote
+from .cache import get_results, invalidate_results, cache_stats
+from .live import ResultsEventStream
+from .ingest import AlreadyQueued, IngestQueueFull, get_ingestor, ingest_enabled
+from rest_framework.exceptions import ValidationError
+from django.http import Http404, StreamingHttpResponse
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.utils.decorators import method_decorator
+from django.views.decorators.vary import vary_on_headers
 from users.permissions import IsAdmin, IsUser
+from .stamps import POLLS, poll_key, stamp_condition
+from core.metrics import VOTES_ACCEPTED, VOTES_DUPLICATE
 
 
 
@@ -21,16 +33,69 @@ class PollCreateAPIView(generics.CreateAPIView)  :
 
 
 
+class PollReadMixin:
+    """
+    Serializes polls without per-row queries: options are prefetched and
+    "user_voted" is resolved for every poll in one query, handed to the
+    serializer as a set in its context.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().prefetch_related('options')
+
+    def get_serializer(self, *args, **kwargs):
+        if args and 'context' not in kwargs:
+            if kwargs.get('many'):
+                polls = list(args[0])
+                args = (polls,) + args[1:]
+            else:
+                polls = [args[0]]
+
+            kwargs['context'] = self.get_serializer_context()
+            kwargs['context']['voted_poll_ids'] = self.get_voted_poll_ids(polls)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_voted_poll_ids(self, polls):
+        user = self.request.user
+        if not user.is_authenticated or not polls:
+            return set()
+        return set(
+            Vote.objects.filter(voted_by=user, poll_id__in=[p.id for p in polls])
+            .values_list('poll_id', flat=True)
+        )
+
+
+# ==================== CONDITIONAL GET ====================
+# ETag/Last-Modified come from version stamps (polls/stamps.py), so a client
+# with the current version gets a 304 before any query or serializer runs.
+# user_voted differs per user, hence the user in the tag and Vary.
+
+def _viewer(request):
+    return f"u{request.user.pk}" if request.user.is_authenticated else "anon"
+
+
+def stamp_conditions(stamp_name, per_user):
+    def tag(request, name, stamp):
+        return f"{name}-{stamp}-{_viewer(request)}" if per_user else f"{name}-{stamp}"
+
+    decorators = [stamp_condition(lambda request, *args, **kwargs: stamp_name(**kwargs), tag)]
+    if per_user:
+        decorators.insert(0, vary_on_headers('Authorization'))
+    return method_decorator(decorators, name='get')
+
+
 #3list al active pools
 
-class PollListAPIView(generics.ListAPIView) :
+@stamp_conditions(lambda **kwargs: POLLS, per_user=True)
+class PollListAPIView(PollReadMixin, generics.ListAPIView) :
     queryset = Poll.objects.filter(active = True)
     serializer_class = PollSerializer
     permission_classes =[permissions.AllowAny] 
 
 
 ##poll details with Options
-class PollDetailAPIView(generics.RetrieveAPIView):
+@stamp_conditions(lambda pk, **kwargs: poll_key(pk), per_user=True)
+class PollDetailAPIView(PollReadMixin, generics.RetrieveAPIView):
     queryset = Poll.objects.all() 
     serializer_class = PollSerializer
     permission_classes = [permissions.AllowAny] 
@@ -43,41 +108,87 @@ class VoteCreateAPIView(generics.CreateAPIView):
     serializer_class = VoteSerializer 
     permission_classes = [permissions.IsAuthenticated, IsUser]
 
-    def perform_create(self, serializer):
+    def get_poll_for_vote(self):
         poll_id = self.kwargs.get("pk") or self.request.data.get("poll")
         poll = generics.get_object_or_404(Poll, id=poll_id)
         user = self.request.user
 
+        # Closed, or being deleted by a background job (admin_management/jobs.py)
+        if not poll.active:
+            raise ValidationError("This poll is closed")
+
         # Check if the user already voted
         if Vote.objects.filter(poll=poll, voted_by=user).exists():
+            VOTES_DUPLICATE.inc()
             # Raise a DRF exception that returns 400 instead of crashing
-            from rest_framework.exceptions import ValidationError
             raise ValidationError("You have already voted on this poll")
+        return poll
+
+    def create(self, request, *args, **kwargs):
+        if not ingest_enabled():
+            return super().create(request, *args, **kwargs)
+
+        # Write-behind mode: validate now, insert later in a batch (polls/ingest.py)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        poll = self.get_poll_for_vote()
+        vote = Vote(poll=poll, option=serializer.validated_data['option'], voted_by=request.user)
+        try:
+            get_ingestor().submit(vote)
+        except AlreadyQueued:
+            VOTES_DUPLICATE.inc()
+            raise ValidationError("You have already voted on this poll")
+        except IngestQueueFull:
+            return Response(
+                {"detail": "Too many votes right now, please retry shortly."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "1"},
+            )
+        VOTES_ACCEPTED.labels('queued').inc()
+        return Response(
+            {"poll": poll.id, "option": vote.option_id, "voted_by": request.user.id, "status": "queued"},
+            status=status.HTTP_202_ACCEPTED,
+        )
 
-        serializer.save(voted_by=user, poll=poll)
+    def perform_create(self, serializer):
+        poll = self.get_poll_for_vote()
+        with transaction.atomic():
+            vote = serializer.save(voted_by=self.request.user, poll=poll)
+            record_vote(vote)
+        VOTES_ACCEPTED.labels('stored').inc()
 
 
 
 
+@stamp_conditions(lambda pk, **kwargs: poll_key(pk), per_user=False)
 class PollResultAPIView(generics.RetrieveAPIView):
     queryset = Poll.objects.all() 
     serializer_class = PollSerializer
     permission_classes = [permissions.AllowAny ]
+    # Results are public, skip the JWT user lookup so cache hits never touch the db
+    authentication_classes = []
 
 
     def get(self, request, *args,**kwargs):
-        poll = self.get_object() 
-        data =  {
-            "poll" :poll.title , 
-            "options" : [{
-                "option_text": option.option_text,
-                "votes_count" :option.votes.count()
-
-        } for option in poll.options.all()]
-        }
+        data = get_results(kwargs['pk'])
+        if data is None:
+            raise Http404
 
         return Response(data)
     
+async def poll_results_stream(request, pk):
+    """
+    Live results as server-sent events: a snapshot first, then coalesced deltas.
+    Needs to be served through core/asgi.py, websocket clients use the same path.
+    """
+    if await sync_to_async(get_results)(pk) is None:
+        raise Http404
+    response = StreamingHttpResponse(ResultsEventStream(pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 class PollOptionBulkCreateAPIView(APIView):
     permission_classes = [IsAuthenticated, IsAdmin]
 
@@ -88,11 +199,20 @@ class PollOptionBulkCreateAPIView(APIView):
         
         if serializer.is_valid():
             serializer.save(poll=poll)
+            invalidate_results(poll.id)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class AdminAllPollsAPIView(generics.ListAPIView):
+class AdminAllPollsAPIView(PollReadMixin, generics.ListAPIView):
     queryset = Poll.objects.all()  # No filter - returns everything
     serializer_class = PollSerializer
-    permission_classes = [permissions.IsAuthenticated, IsAdmin]
\ No newline at end of file
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+
+
+class ResultsCacheStatsAPIView(APIView):
+    """Hit/miss counters of the poll results cache (per worker process)"""
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    def get(self, request):
+        return Response(cache_stats())
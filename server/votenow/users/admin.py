@@ -1,5 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db import transaction
+from polls.counters import discard_votes
+from polls.models import Vote
 from .models import User
 
 class UserAdmin(BaseUserAdmin):
@@ -18,4 +21,15 @@ class UserAdmin(BaseUserAdmin):
         ),
     )
 
+    # Deleting users cascades to their votes, take them off the polls' counters first
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            discard_votes(Vote.objects.filter(voted_by=obj))
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            discard_votes(Vote.objects.filter(voted_by__in=queryset))
+            super().delete_queryset(request, queryset)
+
 admin.site.register(User, UserAdmin)
@@ -0,0 +1,97 @@
+"""
+JWT authentication that trusts the role/username claims minted at login.
+
+JWTAuthentication loads the user row on every request just so IsAdmin/IsUser
+can read `role`. Tokens from LoginAPIView carry `role` and `username`, and
+RoleClaimsAuthentication builds a User instance from them with every other
+field deferred; the row is loaded (all at once, see User.refresh_from_db)
+only when a view touches one of those fields.
+
+When a user's role, username or active flag changes, or the user is deleted,
+their id is recorded in the AUTH_REVOCATION_CACHE cache with the time of the
+change. Tokens issued before that go back to the database lookup, which
+rejects inactive or deleted users and reads the current role. A lost marker
+means a demoted or deactivated user keeps their old rights until the token
+expires, so that cache must be shared by all workers and must never evict
+(e.g. a Redis with maxmemory-policy noeviction, not LocMemCache). With
+AUTH_REVOCATION_CACHE unset the claims are not trusted and every request
+loads the user row, like JWTAuthentication.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import User
+
+CLAIM_FIELDS = ('role', 'username')
+REVOKED_KEY = 'auth:claims-revoked:{}'
+
+
+def tokens_for(user):
+    """Refresh token (and, through it, access token) carrying the role claims"""
+    refresh = RefreshToken.for_user(user)
+    for field in CLAIM_FIELDS:
+        refresh[field] = getattr(user, field)
+    return refresh
+
+
+def revocation_cache():
+    """The cache holding revocation markers, None when claims are not trusted"""
+    alias = getattr(settings, 'AUTH_REVOCATION_CACHE', None)
+    return caches[alias] if alias else None
+
+
+def revoke_claims(user_id):
+    cache = revocation_cache()
+    if cache is None:
+        return
+    timeout = int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+    cache.set(REVOKED_KEY.format(user_id), time.time(), timeout=timeout)
+
+
+def claims_revoked(user_id, issued_at):
+    cache = revocation_cache()
+    if cache is None:
+        return True
+    revoked_at = cache.get(REVOKED_KEY.format(user_id))
+    # iat has one second resolution, a token from the same second is not trusted
+    return revoked_at is not None and issued_at <= revoked_at
+
+
+def token_user(user_id, claims):
+    """A User with only id and the claim fields loaded"""
+    loaded = {'id': user_id, **claims}
+    # from_db wants the values in model field order
+    names = [f.attname for f in User._meta.concrete_fields if f.attname in loaded]
+    return User.from_db(router.db_for_read(User), names, [loaded[name] for name in names])
+
+
+class RoleClaimsAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        claims = {field: validated_token.get(field) for field in CLAIM_FIELDS}
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if None in claims.values() or user_id is None or claims_revoked(user_id, validated_token.get('iat', 0)):
+            # Tokens minted before the claims were added, stale ones, or no
+            # revocation cache to tell which are stale
+            return super().get_user(validated_token)
+        return token_user(int(user_id), claims)
+
+
+@receiver(post_save, sender=User, dispatch_uid='auth-claims-user-save')
+def user_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    if created:
+        return
+    if update_fields is None or set(update_fields) & {*CLAIM_FIELDS, 'is_active'}:
+        revoke_claims(instance.pk)
+
+
+@receiver(post_delete, sender=User, dispatch_uid='auth-claims-user-delete')
+def user_deleted(sender, instance, **kwargs):
+    revoke_claims(instance.pk)
@@ -0,0 +1,65 @@
+"""
+Bounded pool for password hashing.
+
+PBKDF2 takes tens of milliseconds of CPU per call. The async login and
+registration views hand it to a small thread pool (hashlib releases the GIL
+while hashing, so threads use every core) instead of blocking the worker.
+At most AUTH_HASH_MAX_PENDING hashes may be queued or running; past that
+callers get PoolSaturated right away and the views answer 503.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+class PoolSaturated(Exception):
+    pass
+
+
+class HashingPool:
+    def __init__(self, workers, max_pending):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='auth-hash')
+        self.max_pending = max_pending
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        return self._pending
+
+    async def run(self, fn, *args):
+        """Run fn(*args) in the pool, raises PoolSaturated if too many are waiting"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise PoolSaturated()
+            self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = getattr(settings, 'AUTH_HASH_WORKERS', None) or os.cpu_count() or 1
+            max_pending = getattr(settings, 'AUTH_HASH_MAX_PENDING', None) or workers * 4
+            _pool = HashingPool(workers, max_pending)
+        return _pool
+
+
+def set_pool(pool):
+    """Swap the pool (benchmarks, tests), returns the previous one"""
+    global _pool
+    with _pool_lock:
+        previous, _pool = _pool, pool
+    return previous
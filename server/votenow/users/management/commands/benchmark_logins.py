@@ -0,0 +1,92 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncRequestFactory, RequestFactory
+
+from users.hashing import HashingPool, set_pool
+from users.models import User
+from users.views import LoginAPIView, login_view
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare logins/sec of the synchronous LoginAPIView against the async login "
+        "view with pooled hashing. Creates throwaway users in the configured database "
+        "and removes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=100, help='Logins per run')
+        parser.add_argument('--concurrency', type=int, default=32, help='Requests in flight')
+        parser.add_argument('--workers', type=int, default=None, help='Hashing threads (default: cores)')
+        parser.add_argument('--max-pending', type=int, default=None, help='Hashing queue limit (default: 4 per worker)')
+
+    def handle(self, *args, **options):
+        n, concurrency = options['logins'], options['concurrency']
+        cores = os.cpu_count() or 1
+        workers = options['workers'] or cores
+        pool = HashingPool(workers, options['max_pending'] or workers * 4)
+
+        prefix = f"bench-{int(time.time())}"
+        password = 'bench-password'
+        hashed = make_password(password)  # hash once, every user shares it
+        User.objects.bulk_create(
+            User(username=f"{prefix}-{i}", password=hashed, role='user') for i in range(n)
+        )
+        bodies = [json.dumps({'username': f"{prefix}-{i}", 'password': password}) for i in range(n)]
+
+        try:
+            self.report('sync', *self.run_sync(bodies, concurrency), cores)
+            self.report('async', *asyncio.run(self.run_async(bodies, concurrency, pool)), cores)
+        finally:
+            User.objects.filter(username__startswith=prefix).delete()
+            pool.executor.shutdown()
+        self.stdout.write(f"{cores} cores, {workers} hashing threads, concurrency {concurrency}")
+
+    def report(self, label, statuses, elapsed, cores):
+        ok = statuses.count(200)
+        busy = statuses.count(503)
+        self.stdout.write(
+            f"{label:6} {ok} logins in {elapsed:.2f}s -> {ok / elapsed:,.1f} logins/sec, "
+            f"{ok / elapsed / cores:,.1f} per core, {busy} answered 503"
+        )
+
+    def run_sync(self, bodies, concurrency):
+        factory = RequestFactory()
+        view = LoginAPIView.as_view()
+
+        def login(body):
+            try:
+                request = factory.post('/api/users/login/', body, content_type='application/json')
+                return view(request).status_code
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as threads:
+            statuses = list(threads.map(login, bodies))
+        return statuses, time.perf_counter() - start
+
+    async def run_async(self, bodies, concurrency, pool):
+        factory = AsyncRequestFactory()
+        gate = asyncio.Semaphore(concurrency)
+
+        async def login(body):
+            async with gate:
+                request = factory.post('/api/users/login/', body, content_type='application/json')
+                response = await login_view(request)
+                return response.status_code
+
+        previous = set_pool(pool)
+        start = time.perf_counter()
+        try:
+            statuses = await asyncio.gather(*(login(body) for body in bodies))
+        finally:
+            set_pool(previous)
+        return list(statuses), time.perf_counter() - start
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:59
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    User = apps.get_model("users", "User")
+    Poll = apps.get_model("polls", "Poll")
+    Vote = apps.get_model("polls", "Vote")
+
+    def count_of(model, field):
+        return Coalesce(
+            Subquery(
+                model.objects.filter(**{field: OuterRef("pk")})
+                .order_by()
+                .values(field)
+                .annotate(c=Count("id"))
+                .values("c")
+            ),
+            Value(0),
+        )
+
+    User.objects.update(
+        total_votes=count_of(Vote, "voted_by"),
+        polls_created=count_of(Poll, "created_by"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("users", "0002_admin_list_indexes"),
+        ("polls", "0007_counters_not_editable"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="polls_created",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="total_votes",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                fields=["-total_votes", "-id"], name="user_total_votes_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                fields=["-polls_created", "-id"], name="user_polls_created_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -1,13 +1,54 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 
-class User(AbstractUser):
+
+class CounterFieldsMixin:
+    """
+    Leaves the denormalized counters out of saves of existing rows. They only
+    move through F() updates (polls.counters); a full save of an instance
+    loaded earlier would write its stale count over the votes cast since.
+    """
+    counter_fields = ()
+
+    def save(self, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            skip = {*self.counter_fields, *self.get_deferred_fields()}
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in skip and f.attname not in skip
+            ]
+        super().save(**kwargs)
+
+
+class User(CounterFieldsMixin, AbstractUser):
     ROLE_CHOICES = (
         ('admin', 'Admin'),
         ('user', 'User')
     )
 
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='user')
+    # Denormalized counters for the admin user list, kept in sync by polls.counters
+    total_votes = models.PositiveIntegerField(default=0, editable=False)
+    polls_created = models.PositiveIntegerField(default=0, editable=False)
+    counter_fields = ('total_votes', 'polls_created')
+
+    class Meta(AbstractUser.Meta):
+        swappable = 'AUTH_USER_MODEL'
+        indexes = [
+            # admin user list default ordering
+            models.Index(fields=['-date_joined'], name='user_date_joined_idx'),
+            # ?ordering=-total_votes / -polls_created
+            models.Index(fields=['-total_votes', '-id'], name='user_total_votes_idx'),
+            models.Index(fields=['-polls_created', '-id'], name='user_polls_created_idx'),
+        ]
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # Token users (users/authentication.py) come with most fields deferred,
+        # load them all on first use instead of one query per field
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            fields = deferred
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
 
     def save(self, *args, **kwargs):
         # If user is superuser, set role to admin automatically
@@ -17,6 +17,18 @@ class RegistrationSerializer(serializers.ModelSerializer):
 
 
     def create( self, validated_data) :
+        # The async registration view hashes off the request thread and passes the hash
+        password_hash = validated_data.pop('password_hash', None)
+        if password_hash is not None:
+            user = User(
+                username=User.normalize_username(validated_data['username']),
+                email=User.objects.normalize_email(validated_data['email']),
+                password=password_hash,
+                role=validated_data.get('role', 'user')
+            )
+            user.save()
+            return user
+
         user = User.objects.create_user(
             username=validated_data['username'] , 
             email=validated_data['email'] , 
@@ -27,11 +39,12 @@ class RegistrationSerializer(serializers.ModelSerializer):
         return user
 
 
-class LoginSerializer(serializers.Serializer) :
+class LoginCredentialsSerializer(serializers.Serializer) :
     username = serializers.CharField()
     password = serializers.CharField(write_only = True) 
 
 
+class LoginSerializer(LoginCredentialsSerializer) :
     def validate(self, data):
         user= authenticate(username= data['username'], password=data['password'])
         if user and user.is_active:
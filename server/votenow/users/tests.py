@@ -1,3 +1,157 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from .models import User
+from .hashing import HashingPool
+from polls.models import Poll, PollOption, Vote
+
+
+REVOCATION_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'votenow'},
+    'revocation': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'revocation'},
+}
+
+
+# Logins authenticate on the hashing pool's own db connections, which only see committed rows
+@override_settings(CACHES=REVOCATION_CACHES, AUTH_REVOCATION_CACHE='revocation')
+class RoleClaimsAuthenticationTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        caches['revocation'].clear()
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin', email='a@example.com')
+        self.voter = User.objects.create_user(username='voter', password='pass', role='user', email='v@example.com')
+        self.client = APIClient()
+
+    def login(self, username):
+        response = self.client.post(reverse('login'), {'username': username, 'password': 'pass'})
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+        return client
+
+    def user_queries(self, ctx):
+        # Lookups only, bumping the voter's counter is not loading them
+        return [q['sql'] for q in ctx.captured_queries if 'users_user' in q['sql'] and q['sql'].startswith('SELECT')]
+
+    def test_vote_without_user_lookup(self):
+        poll = Poll.objects.create(title='Poll', description='', category='misc', created_by=self.admin)
+        option = PollOption.objects.create(poll=poll, option_text='Yes')
+        client = self.login('voter')
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.post(reverse('poll-vote', args=[poll.id]), {'option': option.id, 'poll': poll.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.user_queries(ctx), [])
+        self.assertEqual(Vote.objects.get().voted_by, self.voter)
+
+    def test_admin_check_uses_claims(self):
+        client = self.login('admin')
+        client.get(reverse('admin-stats'))  # warm the stats snapshot
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(client.get(reverse('admin-stats')).status_code, 200)
+        self.assertEqual(self.user_queries(ctx), [])
+        self.assertEqual(self.login('voter').get(reverse('admin-stats')).status_code, 403)
+
+    def test_other_fields_load_in_one_query(self):
+        client = self.login('voter')
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(reverse('profile'))
+        self.assertEqual(response.data['email'], 'v@example.com')
+        self.assertEqual(len(self.user_queries(ctx)), 1)
+
+    def test_deactivated_and_demoted_users(self):
+        voter_client, admin_client = self.login('voter'), self.login('admin')
+        self.voter.is_active = False
+        self.voter.save()
+        self.assertEqual(voter_client.get(reverse('profile')).status_code, 401)
+
+        self.admin.role = 'user'
+        self.admin.save(update_fields=['role'])
+        self.assertEqual(admin_client.get(reverse('admin-stats')).status_code, 403)
+
+    def test_markers_ignore_default_cache(self):
+        voter_client = self.login('voter')
+        self.voter.role = 'admin'
+        self.voter.save(update_fields=['role'])
+        cache.clear()  # evicting the default cache must not resurrect the token
+        self.assertEqual(voter_client.get(reverse('admin-stats')).status_code, 200)
+
+    @override_settings(AUTH_REVOCATION_CACHE=None)
+    def test_without_revocation_cache_user_is_loaded(self):
+        client = self.login('voter')
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(client.get(reverse('profile')).status_code, 200)
+        self.assertEqual(len(self.user_queries(ctx)), 1)
+
+        self.voter.is_active = False
+        self.voter.save()
+        self.assertEqual(client.get(reverse('profile')).status_code, 401)
+
+
+# Logins authenticate on the hashing pool's own db connections, which only see committed rows
+class AsyncAuthViewTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def register(self, username='newbie'):
+        return self.client.post(
+            reverse('register'),
+            {'username': username, 'email': f'{username}@example.com', 'password': 's3cret-pass'},
+            format='json',
+        )
+
+    def test_register_then_login(self):
+        response = self.register()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['role'], 'user')
+        self.assertTrue(User.objects.get(username='newbie').check_password('s3cret-pass'))
+
+        response = self.client.post(reverse('login'), {'username': 'newbie', 'password': 's3cret-pass'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['username'], 'newbie')
+        self.assertIn('access', response.json())
+
+    def test_invalid_input(self):
+        self.register()
+        self.assertEqual(self.register().status_code, 400)  # username taken
+        wrong = self.client.post(reverse('login'), {'username': 'newbie', 'password': 'nope'}, format='json')
+        self.assertEqual(wrong.json(), {'non_field_errors': ['Invalid Credentials']})
+        unknown = self.client.post(reverse('login'), {'username': 'ghost', 'password': 'nope'}, format='json')
+        self.assertEqual(unknown.status_code, 400)
+        self.assertEqual(self.client.get(reverse('login')).status_code, 405)
+
+    @override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher', 'django.contrib.auth.hashers.MD5PasswordHasher',
+    ])
+    def test_login_goes_through_the_backends(self):
+        user = User.objects.create(username='old', password=make_password('s3cret-pass', hasher='md5'))
+        failed = mock.Mock()
+        user_login_failed.connect(failed)
+        self.addCleanup(user_login_failed.disconnect, failed)
+
+        wrong = self.client.post(reverse('login'), {'username': 'old', 'password': 'nope'}, format='json')
+        self.assertEqual(wrong.status_code, 400)
+        self.assertEqual(failed.call_count, 1)
+
+        response = self.client.post(reverse('login'), {'username': 'old', 'password': 's3cret-pass'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+
+        User.objects.filter(id=user.id).update(is_active=False)
+        response = self.client.post(reverse('login'), {'username': 'old', 'password': 's3cret-pass'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_saturated_pool_answers_503(self):
+        with mock.patch('users.views.get_pool', return_value=HashingPool(workers=1, max_pending=0)):
+            response = self.register()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(User.objects.filter(username='newbie').exists())
@@ -1,12 +1,19 @@
+from django.conf import settings
 from django.urls import path
-from .views import LoginAPIView, RegistrationAPIView, UserProfileAPIView
+from .views import LoginAPIView, RegistrationAPIView, UserProfileAPIView, login_view, register_view
 
 
+if getattr(settings, 'AUTH_ASYNC_VIEWS', False):
+    # Hashing in a bounded pool, see users/hashing.py
+    login, register = login_view, register_view
+else:
+    login, register = LoginAPIView.as_view(), RegistrationAPIView.as_view()
+
 
 urlpatterns= [
 
-    path('register/', RegistrationAPIView.as_view(), name='register') , 
-    path('login/', LoginAPIView.as_view() , name='login'),
+    path('register/', register, name='register') , 
+    path('login/', login , name='login'),
     path('profile/', UserProfileAPIView.as_view(), name='profile')
 
 ]
\ No newline at end of file
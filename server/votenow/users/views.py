@@ -1,12 +1,23 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.db import close_old_connections
+from django.http import JsonResponse
 from django.shortcuts import render
-from .serializers import LoginSerializer, UserSerializer, RegistrationSerializer
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from .serializers import LoginSerializer, UserSerializer, RegistrationSerializer, LoginCredentialsSerializer
+from .hashing import PoolSaturated, get_pool
 from .models import User 
 from rest_framework.response import Response
 from .permissions import IsAdmin, IsUser 
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework import status 
-from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import tokens_for
+from core.metrics import LOGINS
 
 class RegistrationAPIView(APIView):
     permission_classes = [AllowAny]
@@ -26,9 +37,13 @@ class LoginAPIView(APIView):
 
     def post(self, request) :
         serializer = LoginSerializer(data = request.data)
-        serializer.is_valid(raise_exception=True)
+        if not serializer.is_valid():
+            LOGINS.labels('failure').inc()
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         user= serializer.validated_data
-        refresh = RefreshToken.for_user(user)
+        LOGINS.labels('success').inc()
+        # role/username claims let requests skip the user lookup
+        refresh = tokens_for(user)
         return Response({
             'refresh': str(refresh), 
             'access' : str(refresh.access_token) ,
@@ -40,5 +55,88 @@ class UserProfileAPIView(APIView) :
     def get(self, request) :
         serializer = UserSerializer(request.user)
         return Response(serializer.data)
- 
-    
\ No newline at end of file
+
+
+# ==================== ASYNC LOGIN / REGISTRATION ====================
+# Same contract as the two views above, but password hashing runs in a bounded
+# pool (users/hashing.py) so a rush of logins can't tie up every worker.
+# Wired up in urls.py when AUTH_ASYNC_VIEWS is on; run under ASGI (core/asgi.py).
+
+def _request_data(request):
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+    return request.POST
+
+
+def _bad_json():
+    return JsonResponse({"detail": "JSON parse error"}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _busy():
+    return JsonResponse(
+        {"detail": "Too many sign-ins right now, please retry shortly."},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": "1"},
+    )
+
+
+def _authenticate(request, username, password):
+    # On a hashing pool thread, which keeps its own db connection. The
+    # backends check is_active, hash unknown usernames too (same timing as a
+    # wrong password), send user_login_failed and upgrade outdated hashes.
+    close_old_connections()
+    try:
+        return authenticate(request, username=username, password=password)
+    finally:
+        close_old_connections()
+
+
+@csrf_exempt
+@require_POST
+async def login_view(request):
+    data = _request_data(request)
+    if data is None:
+        return _bad_json()
+    serializer = LoginCredentialsSerializer(data=data)
+    if not serializer.is_valid():
+        LOGINS.labels('failure').inc()
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    username, password = serializer.validated_data['username'], serializer.validated_data['password']
+
+    try:
+        user = await get_pool().run(_authenticate, request, username, password)
+    except PoolSaturated:
+        LOGINS.labels('busy').inc()
+        return _busy()
+
+    if user is None:
+        LOGINS.labels('failure').inc()
+        return JsonResponse({"non_field_errors": ["Invalid Credentials"]}, status=status.HTTP_400_BAD_REQUEST)
+    LOGINS.labels('success').inc()
+    refresh = tokens_for(user)
+    return JsonResponse({
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+        'user': UserSerializer(user).data
+    })
+
+
+@csrf_exempt
+@require_POST
+async def register_view(request):
+    data = _request_data(request)
+    if data is None:
+        return _bad_json()
+    serializer = RegistrationSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        password_hash = await get_pool().run(make_password, serializer.validated_data['password'])
+    except PoolSaturated:
+        return _busy()
+    user = await sync_to_async(serializer.save)(password_hash=password_hash)
+    return JsonResponse(UserSerializer(user).data, status=status.HTTP_201_CREATED)
+